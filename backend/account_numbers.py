@@ -0,0 +1,126 @@
+# Account number allocation
+# Numbers come from a counter in storage, but not one round trip per number:
+# each process reserves a block of ACCOUNT_NUMBER_BLOCK_SIZE (default 1000)
+# sequence values with one atomic increment and serves them locally. Blocks
+# never overlap, so numbers are unique without a retry loop; values left in a
+# block when a process exits are simply skipped.
+#
+# Format: ACCOUNT_NUMBER_PREFIX (default 2001) + 8-digit sequence + Luhn check
+# digit, 13 digits like the earlier time-based numbers (which all start with
+# 1001, so the two ranges never meet).
+
+import os
+import threading
+
+SEQUENCE_NAME = 'account_number'
+SEQUENCE_DIGITS = 8
+DEFAULT_PREFIX = '2001'
+DEFAULT_BLOCK_SIZE = 1000
+
+
+class SequenceExhausted(Exception):
+    """The counter has passed the largest sequence value the format can hold"""
+
+
+def luhn_check_digit(digits):
+    total = 0
+    # Doubling starts from the rightmost payload digit, which sits next to
+    # the check digit
+    for i, char in enumerate(reversed(digits)):
+        value = int(char)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def is_valid(account_number):
+    """True for a well-formed allocated number (Luhn check digit matches)"""
+    if not account_number.isdigit() or len(account_number) < 2:
+        return False
+    return luhn_check_digit(account_number[:-1]) == account_number[-1]
+
+
+def format_account_number(prefix, sequence):
+    payload = f'{prefix}{sequence:0{SEQUENCE_DIGITS}d}'
+    return payload + luhn_check_digit(payload)
+
+
+class AccountNumberAllocator:
+    """Hands out account numbers from blocks reserved in storage
+
+    reserve(count) must atomically advance the counter by count and return
+    the first reserved value (a coroutine function for aallocate()).
+    """
+
+    def __init__(self, reserve, block_size=DEFAULT_BLOCK_SIZE, prefix=DEFAULT_PREFIX):
+        self.reserve = reserve
+        self.block_size = block_size
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = None
+        self._blocks = 0
+
+    @classmethod
+    def from_env(cls, reserve):
+        return cls(
+            reserve,
+            block_size=int(os.getenv('ACCOUNT_NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)),
+            prefix=os.getenv('ACCOUNT_NUMBER_PREFIX', DEFAULT_PREFIX)
+        )
+
+    def _take(self, count):
+        """Numbers from the current block (may be fewer than count)"""
+        if self._pid != os.getpid():
+            # A block reserved before fork would be served by every worker
+            self._next = self._end = 0
+            self._pid = os.getpid()
+        taken = min(count, self._end - self._next)
+        sequences = range(self._next, self._next + taken)
+        self._next += taken
+        return [format_account_number(self.prefix, s) for s in sequences]
+
+    def _add_block(self, start, size):
+        if start + size > 10 ** SEQUENCE_DIGITS:
+            raise SequenceExhausted(f'Account number sequence exhausted for prefix {self.prefix}')
+        self._next, self._end = start, start + size
+        self._blocks += 1
+
+    def allocate(self, count=1):
+        """List of `count` new account numbers"""
+        with self._lock:
+            numbers = self._take(count)
+            while len(numbers) < count:
+                # Bulk requests reserve what they need in one step
+                size = max(self.block_size, count - len(numbers))
+                self._add_block(self.reserve(size), size)
+                numbers += self._take(count - len(numbers))
+            return numbers
+
+    def next(self):
+        return self.allocate(1)[0]
+
+    async def aallocate(self, count=1):
+        """allocate() for a coroutine reserve function"""
+        with self._lock:
+            numbers = self._take(count)
+        while len(numbers) < count:
+            size = max(self.block_size, count - len(numbers))
+            start = await self.reserve(size)
+            with self._lock:
+                # Another task may have refilled meanwhile; the older block's
+                # remainder is skipped
+                self._add_block(start, size)
+                numbers += self._take(count - len(numbers))
+        return numbers
+
+    async def anext(self):
+        return (await self.aallocate(1))[0]
+
+    def stats(self):
+        with self._lock:
+            return {'blocks_reserved': self._blocks, 'block_remaining': self._end - self._next}
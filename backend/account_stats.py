@@ -0,0 +1,125 @@
+# Running per-account transaction statistics
+# Lifetime and monthly totals/counts per transaction type live in the
+# account document under 'stats' and are incremented in the same
+# find_one_and_update that changes the balance, so the dashboard reads
+# them in O(1) instead of scanning history.
+#
+# Rebuild from transactions_collection (run while writes are paused):
+#   python account_stats.py rebuild
+
+import os
+import sys
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+
+STAT_TYPES = ('deposit', 'withdrawal', 'transfer_out', 'transfer_in')
+
+# Dashboard field name for each transaction type
+SUMMARY_FIELDS = {
+    'deposit': 'total_deposits',
+    'withdrawal': 'total_withdrawals',
+    'transfer_out': 'total_transfers_out',
+    'transfer_in': 'total_transfers_in'
+}
+
+
+def month_key(when):
+    return when.strftime('%Y-%m')
+
+
+def stats_increment(txn_type, amount, when):
+    """$inc fields that record one transaction in the running aggregates"""
+    month = month_key(when)
+    return {
+        f'stats.{txn_type}.total': amount,
+        f'stats.{txn_type}.count': 1,
+        f'stats.monthly.{month}.{txn_type}.total': amount,
+        f'stats.monthly.{month}.{txn_type}.count': 1
+    }
+
+
+def merge_increments(increments):
+    """Sum several stats_increment() results into one $inc document"""
+    merged = {}
+    for inc in increments:
+        for field, value in inc.items():
+            merged[field] = merged.get(field, 0) + value
+    return merged
+
+
+def summarize(account):
+    stats = account.get('stats', {})
+    summary = {}
+    count = 0
+    for txn_type, field in SUMMARY_FIELDS.items():
+        bucket = stats.get(txn_type, {})
+        summary[field] = bucket.get('total', 0)
+        count += bucket.get('count', 0)
+    summary['transaction_count'] = count
+    return summary
+
+
+def monthly(account, month):
+    return account.get('stats', {}).get('monthly', {}).get(month, {})
+
+
+def rebuild(accounts_collection, transactions_collection, batch_size=1000):
+    """Recompute every account's stats from the transaction history"""
+    pipeline = [
+        {'$group': {
+            '_id': {
+                'account_id': '$account_id',
+                'type': '$type',
+                'month': {'$dateToString': {'format': '%Y-%m', 'date': '$timestamp'}}
+            },
+            'total': {'$sum': '$amount'},
+            'count': {'$sum': 1}
+        }},
+        {'$sort': {'_id.account_id': 1}}
+    ]
+
+    updates = []
+    rebuilt = 0
+    current_id = None
+    stats = None
+
+    def queue_current():
+        if current_id is not None:
+            updates.append(UpdateOne({'_id': current_id}, {'$set': {'stats': stats}}))
+
+    for row in transactions_collection.aggregate(pipeline, allowDiskUse=True):
+        key = row['_id']
+        if key['account_id'] != current_id:
+            queue_current()
+            current_id, stats = key['account_id'], {'monthly': {}}
+            rebuilt += 1
+            if len(updates) >= batch_size:
+                accounts_collection.bulk_write(updates, ordered=False)
+                updates.clear()
+
+        lifetime = stats.setdefault(key['type'], {'total': 0, 'count': 0})
+        lifetime['total'] += row['total']
+        lifetime['count'] += row['count']
+        stats['monthly'].setdefault(key['month'], {})[key['type']] = {
+            'total': row['total'], 'count': row['count']
+        }
+
+    queue_current()
+    if updates:
+        accounts_collection.bulk_write(updates, ordered=False)
+
+    # Accounts without any transactions
+    accounts_collection.update_many({'stats': {'$exists': False}}, {'$set': {'stats': {'monthly': {}}}})
+    return rebuilt
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python account_stats.py rebuild")
+        sys.exit(1)
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGODB_URI'))
+    db = client[os.getenv('DATABASE_NAME', 'banking_system')]
+    count = rebuild(db['accounts'], db['transactions'])
+    print(f"[OK] Rebuilt statistics for {count} account(s)")
@@ -3,21 +3,45 @@
 
 import os
 import time
-import random
-import string
+from functools import wraps
 from datetime import datetime
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, Response, stream_with_context, g, send_from_directory
 from flask_cors import CORS
-from pymongo import MongoClient
-from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
+import logs
+import metrics
+from storage import create_storage, backend_from_env, is_duplicate_email
+from balance_engine import AccountNotFound, InsufficientFunds
+import history
+import account_stats
+import dashboard
+import onboarding
+import statements
+import idempotency
+import money
+import static_assets
+import json_provider
+from sessions import SessionStore
+from account_numbers import AccountNumberAllocator, SEQUENCE_NAME
+from hashing import PasswordHasher, HasherBusy
+from batch import BatchRejected, BatchConflict, parse_batch
+from validation import (
+    ValidationError, validate_registration, validate_login,
+    validate_deposit, validate_withdraw, validate_transfer
+)
 
 # Load environment variables
 load_dotenv()
 
+logs.configure()
+log = logs.get_logger()
+
 # Initialize Flask app
 app = Flask(__name__)
+# orjson-backed jsonify, same output as Flask's default (json_provider.py)
+app.json = json_provider.JSONProvider(app)
 app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 
 # Session configuration for same-origin cookies
@@ -30,104 +54,240 @@ app.config['SESSION_COOKIE_PATH'] = '/'
 CORS(app, 
      supports_credentials=True, 
      origins=['http://localhost:8000', 'http://127.0.0.1:8000', 'http://localhost:5000'],
-     allow_headers=['Content-Type', 'Authorization'],
-     expose_headers=['Set-Cookie'],
+     allow_headers=['Content-Type', 'Authorization', 'Idempotency-Key'],
+     expose_headers=['Set-Cookie', 'Idempotent-Replayed'],
      max_age=3600)
 
-# MongoDB Connection
-try:
-    mongo_uri = os.getenv('MONGODB_URI')
-    if not mongo_uri or 'mongodb+srv://' not in mongo_uri:
-        print("[WARN] MongoDB Atlas connection string not configured!")
-        print("\n[INFO] SETUP INSTRUCTIONS:")
-        print("  1. Create MongoDB Atlas account at https://cloud.mongodb.com")
-        print("  2. Create a cluster")
-        print("  3. Create a database user")
-        print("  4. Whitelist your IP (0.0.0.0/0 for all IPs)")
-        print("  5. Update MONGODB_URI in backend/.env with your connection string\n")
-        exit(1)
-    
-    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-    client.admin.command('ping')
-    db = client[os.getenv('DATABASE_NAME', 'banking_system')]
-    
-    users_collection = db['users']
-    accounts_collection = db['accounts']
-    transactions_collection = db['transactions']
-    
-    users_collection.create_index('email', unique=True)
-    accounts_collection.create_index('account_number', unique=True)
-    accounts_collection.create_index('user_id')
-    transactions_collection.create_index('account_id')
-    transactions_collection.create_index('timestamp')
-    
-    print("[OK] MongoDB Atlas connected successfully!")
-    print(f"[OK] Database: {os.getenv('DATABASE_NAME', 'banking_system')}")
-except Exception as e:
-    print(f"[ERROR] MongoDB Atlas connection error: {e}")
-    print("\n[TIP] Make sure you've:")
-    print("   - Created a MongoDB Atlas account")
-    print("   - Set up a cluster")
-    print("   - Updated the MONGODB_URI in backend/.env")
-    print("   - Whitelisted your IP address (0.0.0.0/0 for all IPs)")
+# Storage backend
+# STORAGE_BACKEND=mongo (default) uses MongoDB; STORAGE_BACKEND=memory runs
+# everything in-process (memory_storage.py) for offline load tests.
+# The Mongo client is created with connect=False: no sockets are opened at
+# import, so the module can be imported in a pre-fork master (gunicorn
+# preload_app). init_app() connects, ensures indexes and pre-warms the pool
+# in each process.
+storage_backend = backend_from_env()
+mongo_uri = os.getenv('MONGODB_URI')
+if storage_backend == 'mongo' and (not mongo_uri or not mongo_uri.startswith(('mongodb+srv://', 'mongodb://'))):
+    print("[WARN] MongoDB Atlas connection string not configured!")
+    print("\n[INFO] SETUP INSTRUCTIONS:")
+    print("  1. Create MongoDB Atlas account at https://cloud.mongodb.com")
+    print("  2. Create a cluster")
+    print("  3. Create a database user")
+    print("  4. Whitelist your IP (0.0.0.0/0 for all IPs)")
+    print("  5. Update MONGODB_URI in backend/.env with your connection string")
+    print("  (or set STORAGE_BACKEND=memory to run without a database)\n")
     exit(1)
 
-def generate_account_number():
-    timestamp = str(int(time.time()))[-5:]
-    random_num = ''.join(random.choices(string.digits, k=4))
-    return f"1001{timestamp}{random_num}"
+storage = create_storage(storage_backend, mongo_uri, os.getenv('DATABASE_NAME', 'banking_system'))
+
+password_hasher = PasswordHasher.from_env()
+account_number_allocator = AccountNumberAllocator.from_env(
+    lambda count: storage.reserve_sequence(SEQUENCE_NAME, count)
+)
+statement_close_delay = statements.close_delay_from_env()
+idempotency_keys = idempotency.Idempotency.from_env(storage)
+
+# Server-side sessions (sessions.py); SESSION_STORE=cookie keeps signed cookies
+session_store = SessionStore.from_env(storage)
+if session_store is not None:
+    app.session_interface = session_store
+
+# Frontend files (static_assets.py): fingerprinted, precompressed and served
+# from memory ahead of Flask; STATIC_ASSETS=disk leaves them to serve_static()
+frontend_dir = static_assets.FRONTEND_DIR
+frontend_assets = None
+if os.getenv('STATIC_ASSETS', 'memory') != 'disk':
+    frontend_assets = static_assets.StaticAssets.from_env().build()
+    app.wsgi_app = static_assets.StaticMiddleware(app.wsgi_app, frontend_assets)
+
+for prefix, documentation, source in storage.metric_sources():
+    metrics.registry.add_stats(prefix, documentation, source)
+metrics.registry.add_stats('password_hasher', 'Password hashing pool', password_hasher.stats)
+metrics.registry.add_stats('account_numbers', 'Account number allocator', account_number_allocator.stats)
+metrics.registry.add_stats('idempotency', 'Idempotency keys', idempotency_keys.stats)
+if session_store is not None:
+    metrics.registry.add_stats('sessions', 'Session store', session_store.stats)
+if frontend_assets is not None:
+    metrics.registry.add_stats('static', 'Static assets', frontend_assets.stats)
+
+def init_app(prewarm_connections=None):
+    """Connect, ensure indexes and pre-warm the connection pool for this process"""
+    if prewarm_connections is None:
+        prewarm_connections = int(os.getenv('MONGO_PREWARM_CONNECTIONS', 0))
+    try:
+        storage.init(prewarm_connections)
+        if session_store is not None:
+            session_store.init()
+        idempotency_keys.init()
+        
+        if storage.name == 'memory':
+            log.info('Using in-memory storage', extra={'pid': os.getpid()})
+        else:
+            log.info('MongoDB Atlas connected', extra={
+                'pid': os.getpid(), 'database': os.getenv('DATABASE_NAME', 'banking_system')
+            })
+    except Exception as e:
+        log.error('MongoDB Atlas connection error: %s', e)
+        logs.flush()
+        print("\n[TIP] Make sure you've:")
+        print("   - Created a MongoDB Atlas account")
+        print("   - Set up a cluster")
+        print("   - Updated the MONGODB_URI in backend/.env")
+        print("   - Whitelisted your IP address (0.0.0.0/0 for all IPs)")
+        exit(1)
+
+def find_account_by_user(user_id):
+    return storage.find_account_by_user(ObjectId(user_id))
+
+def find_account_by_number(account_number):
+    return storage.find_account_by_number(account_number)
+
+def balance_to_report(balance_after):
+    """The balance to answer with: a change to a hot account reports none
+    (hot_accounts.py), so the account is read back"""
+    if balance_after is not None:
+        return balance_after
+    return find_account_by_user(session['user_id'])['balance']
+
+def remember_account(account):
+    """Keep the resolved account in the session for later requests"""
+    session['account_id'] = str(account['_id'])
+    session['account_number'] = account['account_number']
+
+def session_account_query():
+    """Query for the logged-in user's account, without a lookup when the session knows it"""
+    if 'account_id' in session:
+        return {'_id': ObjectId(session['account_id'])}
+    return {'user_id': ObjectId(session['user_id'])}
+
+def session_account():
+    """(account _id, account_number) of the logged-in user, or None"""
+    if 'account_id' in session:
+        return ObjectId(session['account_id']), session['account_number']
+    account = find_account_by_user(session['user_id'])
+    if not account:
+        return None
+    remember_account(account)
+    return account['_id'], account['account_number']
+
+def busy_response(e):
+    response = jsonify({'success': False, 'error': str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def money_moved():
+    """Called by a view once its balance change is applied: from then on the
+    response is stored under the Idempotency-Key whatever its status"""
+    g.money_moved = True
+
+def idempotent(view):
+    """Run the view once per Idempotency-Key; retries get the stored response"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(idempotency.HEADER)
+        if not key or 'user_id' not in session:
+            return view(*args, **kwargs)
+        if len(key) > idempotency.MAX_KEY_LENGTH:
+            return jsonify({'success': False, 'error': 'Idempotency-Key is too long'}), 400
+        
+        # Keys are per user; the fingerprint catches a key reused for another request
+        scoped_key = f"{session['user_id']}:{key}"
+        request_hash = idempotency.fingerprint(request.method, request.path, request.get_data())
+        try:
+            stored = idempotency_keys.begin(scoped_key, request_hash)
+        except idempotency.KeyReused as e:
+            return jsonify({'success': False, 'error': str(e)}), 422
+        except idempotency.RequestInProgress as e:
+            response = jsonify({'success': False, 'error': str(e)})
+            response.headers['Retry-After'] = '1'
+            return response, 409
+        
+        if stored is not None:
+            response = Response(stored['body'], status=stored['status'], content_type=stored['content_type'])
+            response.headers[idempotency.REPLAYED_HEADER] = 'true'
+            return response
+        
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except BaseException:
+            if g.get('money_moved'):
+                # Running the request again would move the money twice
+                idempotency_keys.complete(scoped_key, request_hash, 500, idempotency.INTERRUPTED_BODY,
+                                          'application/json')
+            else:
+                idempotency_keys.release(scoped_key)
+            raise
+        if idempotency.is_final(response.status_code) or g.get('money_moved'):
+            idempotency_keys.complete(scoped_key, request_hash, response.status_code,
+                                      response.get_data(), response.content_type)
+        else:
+            # Errors before any balance changed and "busy, retry" answers are
+            # not replayed; a retry runs the request again
+            idempotency_keys.release(scoped_key)
+        return response
+    return wrapper
+
+# ==================== INSTRUMENTATION ====================
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    metrics.http_in_flight.inc()
+
+@app.after_request
+def record_request(response):
+    # Streaming responses are timed to the first byte
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.http_latency.observe(time.perf_counter() - g.request_started, route=route, method=request.method)
+    metrics.http_requests.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    if 'request_started' in g:
+        metrics.http_in_flight.dec()
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
 
 # ====================  ROUTES ====================
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
     try:
-        data = request.json
-        name = data.get('name') or data.get('full_name', '').strip()  # Support both name and full_name
-        email = data.get('email', '').strip().lower()
-        phone = data.get('phone', '').strip()
-        password = data.get('password', '')
-        
-        if not all([name, email, phone, password]):
-            return jsonify({'success': False, 'error': 'All fields are required'}), 400
-        
-        if len(password) < 6:
-            return jsonify({'success': False, 'error': 'Password must be at least 6 characters'}), 400
-        
-        if len(phone) != 10 or not phone.isdigit():
-            return jsonify({'success': False, 'error': 'Phone must be 10 digits'}), 400
-        
-        if users_collection.find_one({'email': email}):
+        try:
+            name, email, phone, password = validate_registration(request.json)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        try:
+            password_hash = password_hasher.hash(password)
+        except HasherBusy as e:
+            return busy_response(e)
+        
+        # The user and their banking account are created together; the unique
+        # email index rejects a taken email, so there is no pre-read
+        account_number = account_number_allocator.next()
+        user, account = onboarding.customer_documents(
+            name, email, phone, password_hash, account_number, datetime.utcnow()
+        )
+        try:
+            user_id = storage.create_user_with_account(user, account)
+        except DuplicateKeyError as e:
+            if not is_duplicate_email(e):
+                raise
             return jsonify({'success': False, 'error': 'Email already registered'}), 400
         
-        user = {
-            'name': name,
-            'email': email,
-            'phone': phone,
-            'password': generate_password_hash(password),
-            'created_at': datetime.utcnow()
-        }
-        
-        result = users_collection.insert_one(user)
-        user_id = result.inserted_id
-        
-        # Automatically create a banking account for the new user
-        account_number = generate_account_number()
-        account = {
-            'user_id': user_id,
-            'account_number': account_number,
-            'balance': 0.0,
-            'created_at': datetime.utcnow()
-        }
-        accounts_collection.insert_one(account)
-        
-        # Set session
+        # Set session (cleared first so nothing of a previous login survives)
+        session.clear()
         session['user_id'] = str(user_id)
         session['user_email'] = email
         session['user_name'] = name
+        remember_account(account)
         
-        print(f"[OK] User registered: {email}")
-        print(f"[OK] Banking account created: {account_number}")
+        log.info('User registered', extra={'email': email, 'account_number': account_number})
         
         return jsonify({
             'success': True,
@@ -137,29 +297,44 @@ def register():
         })
     
     except Exception as e:
-        print(f"[ERROR] Registration error: {e}")
+        log.error('Registration error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     try:
-        data = request.json
-        email = data.get('email', '').strip().lower()
-        password = data.get('password', '')
+        try:
+            email, password = validate_login(request.json)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        if not email or not password:
-            return jsonify({'success': False, 'error': 'Email and password required'}), 400
+        user = storage.find_user_by_email(email)
         
-        user = users_collection.find_one({'email': email})
+        try:
+            valid = user is not None and password_hasher.verify(user['password'], password)
+        except HasherBusy as e:
+            return busy_response(e)
         
-        if not user or not check_password_hash(user['password'], password):
+        if not valid:
             return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
         
+        # Transparently upgrade hashes created with older cost parameters
+        if password_hasher.needs_rehash(user['password']):
+            old_hash = user['password']
+            password_hasher.upgrade_later(
+                password, lambda new_hash: storage.replace_password_hash(user['_id'], old_hash, new_hash)
+            )
+        
+        session.clear()
         session['user_id'] = str(user['_id'])
         session['user_email'] = email
         session['user_name'] = user['name']
         
-        print(f"[OK] User logged in: {email}")
+        account = find_account_by_user(str(user['_id']))
+        if account:
+            remember_account(account)
+        
+        log.info('User logged in', extra={'email': email})
         return jsonify({
             'success': True,
             'message': 'Login successful',
@@ -172,7 +347,7 @@ def login():
         })
     
     except Exception as e:
-        print(f"[ERROR] Login error: {e}")
+        log.error('Login error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/auth/logout', methods=['POST'])
@@ -181,7 +356,27 @@ def logout():
         session.clear()
         return jsonify({'success': True, 'message': 'Logout successful'})
     except Exception as e:
-        print(f"[ERROR] Logout error: {e}")
+        log.error('Logout error: %s', e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/auth/logout-all', methods=['POST'])
+def logout_all():
+    """End every session of the user, on all devices"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'error': 'Please login first'}), 401
+        
+        if session_store is None:
+            return jsonify({'success': False, 'error': 'Signed-cookie sessions cannot be revoked'}), 400
+        
+        user_id = session.get('user_id')
+        session_store.revoke_user(user_id)
+        session.clear()
+        
+        log.info('All sessions revoked', extra={'user_id': user_id})
+        return jsonify({'success': True, 'message': 'Logged out on all devices'})
+    except Exception as e:
+        log.error('Logout-all error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/auth/check', methods=['GET'])
@@ -199,7 +394,7 @@ def check_session():
             })
         return jsonify({'success': True, 'logged_in': False})
     except Exception as e:
-        print(f"[ERROR] Session check error: {e}")
+        log.error('Session check error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/account/create', methods=['POST'])
@@ -210,22 +405,23 @@ def create_account():
         
         user_id = session.get('user_id')
         
-        existing = accounts_collection.find_one({'user_id': ObjectId(user_id)})
+        existing = find_account_by_user(user_id)
         if existing:
             return jsonify({'success': False, 'error': 'Account already exists'}), 400
         
-        account_number = generate_account_number()
+        account_number = account_number_allocator.next()
         
         account = {
             'user_id': ObjectId(user_id),
             'account_number': account_number,
-            'balance': 0.0,
+            'balance': money.ZERO,
             'created_at': datetime.utcnow()
         }
         
-        accounts_collection.insert_one(account)
+        storage.insert_account(account)
+        remember_account(account)
         
-        print(f"[OK] Account created: {account_number}")
+        log.info('Account created', extra={'account_number': account_number})
         return jsonify({
             'success': True,
             'message': 'Account created successfully',
@@ -236,7 +432,7 @@ def create_account():
         })
     
     except Exception as e:
-        print(f"[ERROR] Account creation error: {e}")
+        log.error('Account creation error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/account/info', methods=['GET'])
@@ -246,7 +442,7 @@ def get_account_info():
             return jsonify({'success': False, 'error': 'Please login first'}), 401
         
         user_id = session.get('user_id')
-        account = accounts_collection.find_one({'user_id': ObjectId(user_id)})
+        account = find_account_by_user(user_id)
         
         if not account:
             return jsonify({'success': True, 'has_account': False})
@@ -256,12 +452,12 @@ def get_account_info():
             'has_account': True,
             'account': {
                 'account_number': account['account_number'],
-                'balance': account['balance']
+                'balance': money.rupees(account['balance'])
             }
         })
     
     except Exception as e:
-        print(f"[ERROR] Get account info error: {e}")
+        log.error('Get account info error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/account/balance', methods=['GET'])
@@ -271,49 +467,47 @@ def get_balance():
             return jsonify({'success': False, 'error': 'Please login first'}), 401
         
         user_id = session.get('user_id')
-        account = accounts_collection.find_one({'user_id': ObjectId(user_id)})
+        account = find_account_by_user(user_id)
         
         if not account:
             return jsonify({'success': False, 'error': 'No account found'}), 404
         
         return jsonify({
             'success': True,
-            'balance': account['balance'],
+            'balance': money.rupees(account['balance']),
             'account_number': account['account_number']
         })
     
     except Exception as e:
-        print(f"[ERROR] Get balance error: {e}")
+        log.error('Get balance error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/transactions/deposit', methods=['POST'])
+@idempotent
 def deposit():
     try:
         if 'user_id' not in session:
             return jsonify({'success': False, 'error': 'Please login first'}), 401
         
-        data = request.json
-        amount = float(data.get('amount', 0))
-        
-        if amount <= 0:
-            return jsonify({'success': False, 'error': 'Amount must be positive'}), 400
+        try:
+            amount = validate_deposit(request.json)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        if amount > 1000000:
-            return jsonify({'success': False, 'error': 'Maximum deposit amount is Rs.10,00,000'}), 400
+        now = datetime.utcnow()
         
-        user_id = session.get('user_id')
-        account = accounts_collection.find_one({'user_id': ObjectId(user_id)})
-        
-        if not account:
+        try:
+            change = storage.credit(
+                session_account_query(), amount,
+                account_stats.stats_increment('deposit', amount, now)
+            )
+        except AccountNotFound:
             return jsonify({'success': False, 'error': 'No account found'}), 404
+        money_moved()
         
-        old_balance = account['balance']
-        new_balance = old_balance + amount
-        
-        accounts_collection.update_one(
-            {'_id': account['_id']},
-            {'$set': {'balance': new_balance}}
-        )
+        account = change.account
+        old_balance = change.balance_before
+        new_balance = change.balance_after
         
         transaction = {
             'account_id': account['_id'],
@@ -321,55 +515,51 @@ def deposit():
             'amount': amount,
             'balance_before': old_balance,
             'balance_after': new_balance,
-            'timestamp': datetime.utcnow(),
-            'description': f'Deposit of Rs.{amount:,.2f}'
+            'timestamp': now,
+            'description': f'Deposit of {money.format_rupees(amount)}'
         }
         
-        transactions_collection.insert_one(transaction)
+        storage.append_transactions(transaction)
         
-        print(f"[OK] Deposit: Rs.{amount} to {account['account_number']}")
+        log.info('Deposit', extra={'account_number': account['account_number'], 'amount': money.rupees(amount)})
         return jsonify({
             'success': True,
-            'message': f'Successfully deposited Rs.{amount:,.2f}',
-            'new_balance': new_balance
+            'message': f'Successfully deposited {money.format_rupees(amount)}',
+            'new_balance': money.rupees(balance_to_report(new_balance))
         })
     
     except Exception as e:
-        print(f"[ERROR] Deposit error: {e}")
+        log.error('Deposit error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/transactions/withdraw', methods=['POST'])
+@idempotent
 def withdraw():
     try:
         if 'user_id' not in session:
             return jsonify({'success': False, 'error': 'Please login first'}), 401
         
-        data = request.json
-        amount = float(data.get('amount', 0))
+        try:
+            amount = validate_withdraw(request.json)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        if amount <= 0:
-            return jsonify({'success': False, 'error': 'Amount must be positive'}), 400
+        now = datetime.utcnow()
         
-        user_id = session.get('user_id')
-        account = accounts_collection.find_one({'user_id': ObjectId(user_id)})
-        
-        if not account:
+        try:
+            change = storage.debit(
+                session_account_query(), amount,
+                account_stats.stats_increment('withdrawal', amount, now)
+            )
+        except AccountNotFound:
             return jsonify({'success': False, 'error': 'No account found'}), 404
+        except InsufficientFunds as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        money_moved()
         
-        old_balance = account['balance']
-        
-        if amount > old_balance:
-            return jsonify({
-                'success': False,
-                'error': f'Insufficient balance. Available: Rs.{old_balance:,.2f}'
-            }), 400
-        
-        new_balance = old_balance - amount
-        
-        accounts_collection.update_one(
-            {'_id': account['_id']},
-            {'$set': {'balance': new_balance}}
-        )
+        account = change.account
+        old_balance = change.balance_before
+        new_balance = change.balance_after
         
         transaction = {
             'account_id': account['_id'],
@@ -377,73 +567,64 @@ def withdraw():
             'amount': amount,
             'balance_before': old_balance,
             'balance_after': new_balance,
-            'timestamp': datetime.utcnow(),
-            'description': f'Withdrawal of Rs.{amount:,.2f}'
+            'timestamp': now,
+            'description': f'Withdrawal of {money.format_rupees(amount)}'
         }
         
-        transactions_collection.insert_one(transaction)
+        storage.append_transactions(transaction)
         
-        print(f"[OK] Withdrawal: Rs.{amount} from {account['account_number']}")
+        log.info('Withdrawal', extra={'account_number': account['account_number'], 'amount': money.rupees(amount)})
         return jsonify({
             'success': True,
-            'message': f'Successfully withdrew Rs.{amount:,.2f}',
-            'new_balance': new_balance
+            'message': f'Successfully withdrew {money.format_rupees(amount)}',
+            'new_balance': money.rupees(balance_to_report(new_balance))
         })
     
     except Exception as e:
-        print(f"[ERROR] Withdrawal error: {e}")
+        log.error('Withdrawal error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/transactions/transfer', methods=['POST'])
+@idempotent
 def transfer():
     try:
         if 'user_id' not in session:
             return jsonify({'success': False, 'error': 'Please login first'}), 401
         
-        data = request.json
-        to_account_number = data.get('to_account', '').strip()
-        amount = float(data.get('amount', 0))
-        
-        if not to_account_number:
-            return jsonify({'success': False, 'error': 'Recipient account number required'}), 400
-        
-        if amount <= 0:
-            return jsonify({'success': False, 'error': 'Amount must be positive'}), 400
+        try:
+            to_account_number, amount = validate_transfer(request.json)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         user_id = session.get('user_id')
-        from_account = accounts_collection.find_one({'user_id': ObjectId(user_id)})
-        
-        if not from_account:
-            return jsonify({'success': False, 'error': 'No account found'}), 404
-        
-        if from_account['account_number'] == to_account_number:
-            return jsonify({'success': False, 'error': 'Cannot transfer to same account'}), 400
-        
-        to_account = accounts_collection.find_one({'account_number': to_account_number})
+        to_account = find_account_by_number(to_account_number)
         
         if not to_account:
             return jsonify({'success': False, 'error': 'Recipient account not found'}), 404
         
-        from_balance = from_account['balance']
-        
-        if amount > from_balance:
-            return jsonify({
-                'success': False,
-                'error': f'Insufficient balance. Available: Rs.{from_balance:,.2f}'
-            }), 400
-        
-        new_from_balance = from_balance - amount
-        new_to_balance = to_account['balance'] + amount
+        if to_account['user_id'] == ObjectId(user_id):
+            return jsonify({'success': False, 'error': 'Cannot transfer to same account'}), 400
         
-        accounts_collection.update_one(
-            {'_id': from_account['_id']},
-            {'$set': {'balance': new_from_balance}}
-        )
+        now = datetime.utcnow()
+        
+        try:
+            sent, received = storage.transfer(
+                session_account_query(),
+                {'_id': to_account['_id']},
+                amount,
+                account_stats.stats_increment('transfer_out', amount, now),
+                account_stats.stats_increment('transfer_in', amount, now)
+            )
+        except AccountNotFound:
+            return jsonify({'success': False, 'error': 'No account found'}), 404
+        except InsufficientFunds as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        money_moved()
         
-        accounts_collection.update_one(
-            {'_id': to_account['_id']},
-            {'$set': {'balance': new_to_balance}}
-        )
+        from_account = sent.account
+        from_balance = sent.balance_before
+        new_from_balance = sent.balance_after
+        new_to_balance = received.balance_after
         
         from_transaction = {
             'account_id': from_account['_id'],
@@ -452,7 +633,7 @@ def transfer():
             'balance_before': from_balance,
             'balance_after': new_from_balance,
             'to_account': to_account_number,
-            'timestamp': datetime.utcnow(),
+            'timestamp': now,
             'description': f'Transfer to {to_account_number}'
         }
         
@@ -460,24 +641,73 @@ def transfer():
             'account_id': to_account['_id'],
             'type': 'transfer_in',
             'amount': amount,
-            'balance_before': to_account['balance'],
+            'balance_before': received.balance_before,
             'balance_after': new_to_balance,
             'from_account': from_account['account_number'],
-            'timestamp': datetime.utcnow(),
+            'timestamp': now,
             'description': f'Transfer from {from_account["account_number"]}'
         }
         
-        transactions_collection.insert_many([from_transaction, to_transaction])
+        storage.append_transactions(from_transaction, to_transaction)
         
-        print(f"[OK] Transfer: Rs.{amount} from {from_account['account_number']} to {to_account_number}")
+        log.info('Transfer', extra={
+            'from_account': from_account['account_number'], 'to_account': to_account_number, 'amount': money.rupees(amount)
+        })
+        return jsonify({
+            'success': True,
+            'message': f'Successfully transferred {money.format_rupees(amount)} to {to_account_number}',
+            'new_balance': money.rupees(balance_to_report(new_from_balance))
+        })
+    
+    except Exception as e:
+        log.error('Transfer error: %s', e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/transactions/batch', methods=['POST'])
+@idempotent
+def batch_transactions():
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'error': 'Please login first'}), 401
+        
+        try:
+            mode, items = parse_batch(request.json)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        user_id = session.get('user_id')
+        
+        try:
+            result = storage.run_batch(user_id, mode, items, datetime.utcnow())
+        except BatchRejected as e:
+            return jsonify({'success': False, 'error': str(e), 'mode': mode, 'results': e.results}), 400
+        except BatchConflict:
+            return jsonify({'success': False, 'error': 'Account is busy, please retry'}), 409
+        
+        if result is None:
+            return jsonify({'success': False, 'error': 'No account found'}), 404
+        money_moved()
+        
+        if result.transactions:
+            storage.append_transactions(*result.transactions)
+        
+        results = result.results()
+        applied = sum(1 for r in results if r['status'] == 'ok')
+        
+        log.info('Batch', extra={
+            'account_number': result.sender['account_number'], 'applied': applied, 'operations': len(results)
+        })
         return jsonify({
             'success': True,
-            'message': f'Successfully transferred Rs.{amount:,.2f} to {to_account_number}',
-            'new_balance': new_from_balance
+            'mode': mode,
+            'applied': applied,
+            'failed': len(results) - applied,
+            'results': results,
+            'new_balance': money.rupees(balance_to_report(result.balance_after))
         })
     
     except Exception as e:
-        print(f"[ERROR] Transfer error: {e}")
+        log.error('Batch error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/transactions/history', methods=['GET'])
@@ -486,29 +716,127 @@ def get_transaction_history():
         if 'user_id' not in session:
             return jsonify({'success': False, 'error': 'Please login first'}), 401
         
-        user_id = session.get('user_id')
-        account = accounts_collection.find_one({'user_id': ObjectId(user_id)})
+        account = session_account()
         
         if not account:
             return jsonify({'success': False, 'error': 'No account found'}), 404
         
-        transactions = list(transactions_collection.find(
-            {'account_id': account['_id']}
-        ).sort('timestamp', -1).limit(100))
+        account_id, account_number = account
+        limit = history.parse_limit(request.args.get('limit'))
         
-        for t in transactions:
-            t['_id'] = str(t['_id'])
-            t['account_id'] = str(t['account_id'])
-            t['date'] = t['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            filters = history.parse_filter(request.args)
+            transactions, next_cursor = storage.transactions_page(
+                account_id, limit, request.args.get('cursor'), filters
+            )
+        except (history.InvalidCursor, ValidationError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         return jsonify({
             'success': True,
             'transactions': transactions,
-            'account_number': account['account_number']
+            'account_number': account_number,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
+    
+    except Exception as e:
+        log.error('Transaction history error: %s', e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/transactions/export', methods=['GET'])
+def export_transactions():
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'error': 'Please login first'}), 401
+        
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in ('ndjson', 'csv'):
+            return jsonify({'success': False, 'error': 'Format must be ndjson or csv'}), 400
+        
+        account = session_account()
+        
+        if not account:
+            return jsonify({'success': False, 'error': 'No account found'}), 404
+        
+        account_id, account_number = account
+        cursor = storage.iter_transactions(account_id)
+        
+        if export_format == 'csv':
+            rows, mimetype = history.stream_csv(cursor), 'text/csv'
+        else:
+            rows, mimetype = history.stream_ndjson(cursor), 'application/x-ndjson'
+        
+        filename = f"transactions-{account_number}.{export_format}"
+        return Response(
+            stream_with_context(rows),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    
+    except Exception as e:
+        log.error('Transaction export error: %s', e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/statements', methods=['GET'])
+def list_statements():
+    """Closed months with a statement available, newest first"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'error': 'Please login first'}), 401
+        
+        account = find_account_by_user(session.get('user_id'))
+        
+        if not account:
+            return jsonify({'success': False, 'error': 'No account found'}), 404
+        
+        periods = statements.closed_periods(account['created_at'], datetime.utcnow(), statement_close_delay)
+        return jsonify({
+            'success': True,
+            'account_number': account['account_number'],
+            'periods': periods
         })
     
     except Exception as e:
-        print(f"[ERROR] Transaction history error: {e}")
+        log.error('Statement list error: %s', e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/statements/<period>', methods=['GET'])
+def get_statement(period):
+    """Statement of a closed month; immutable, so cached by clients for good"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'error': 'Please login first'}), 401
+        
+        try:
+            statements.parse_period(period)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        account = find_account_by_user(session.get('user_id'))
+        
+        if not account:
+            return jsonify({'success': False, 'error': 'No account found'}), 404
+        
+        if period not in statements.closed_periods(account['created_at'], datetime.utcnow(), statement_close_delay):
+            return jsonify({'success': False, 'error': 'No statement for this period'}), 404
+        
+        # Revalidation needs no storage access: the ETag names the statement
+        etag = statements.etag(account['_id'], period)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            statement = statements.get_statement(storage, account['_id'], period, account['created_at'])
+            response = jsonify({
+                'success': True,
+                'statement': statements.serialize_statement(statement, account['account_number'])
+            })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = statements.CACHE_CONTROL
+        return response
+    
+    except Exception as e:
+        log.error('Statement error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/dashboard/stats', methods=['GET'])
@@ -518,62 +846,83 @@ def get_dashboard_stats():
             return jsonify({'success': False, 'error': 'Please login first'}), 401
         
         user_id = session.get('user_id')
-        account = accounts_collection.find_one({'user_id': ObjectId(user_id)})
+        account = find_account_by_user(user_id)
         
         if not account:
             return jsonify({'success': False, 'error': 'No account found'}), 404
         
-        transactions = list(transactions_collection.find(
-            {'account_id': account['_id']}
-        ).sort('timestamp', -1).limit(10))
-        
-        total_deposits = sum(t['amount'] for t in transactions if t['type'] == 'deposit')
-        total_withdrawals = sum(t['amount'] for t in transactions if t['type'] == 'withdrawal')
-        total_transfers_out = sum(t['amount'] for t in transactions if t['type'] == 'transfer_out')
-        total_transfers_in = sum(t['amount'] for t in transactions if t['type'] == 'transfer_in')
-        
-        for t in transactions:
-            t['_id'] = str(t['_id'])
-            t['account_id'] = str(t['account_id'])
-            t['date'] = t['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+        transactions = storage.recent_transactions(account['_id'], 10)
         
         return jsonify({
             'success': True,
-            'stats': {
-                'balance': account['balance'],
-                'total_deposits': total_deposits,
-                'total_withdrawals': total_withdrawals,
-                'total_transfers_out': total_transfers_out,
-                'total_transfers_in': total_transfers_in,
-                'transaction_count': len(transactions)
-            },
+            'stats': dashboard.stats(account, datetime.utcnow()),
             'recent_transactions': transactions
         })
     
     except Exception as e:
-        print(f"[ERROR] Stats error: {e}")
+        log.error('Stats error: %s', e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Account info, stats and recent transactions in one response (ETag / 304 aware)"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'error': 'Please login first'}), 401
+        
+        try:
+            fields = dashboard.parse_fields(request.args.get('fields'))
+            limit = dashboard.parse_limit(request.args.get('limit'))
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        account = find_account_by_user(session.get('user_id'))
+        if not account:
+            return jsonify({'success': True, 'has_account': False})
+        
+        now = datetime.utcnow()
+        etag = dashboard.etag(account, fields, limit, now)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        transactions = []
+        if 'transactions' in fields:
+            transactions = storage.recent_transactions(account['_id'], limit)
+        safe = dashboard.etag_safe(account, fields, transactions)
+        
+        response = jsonify(dashboard.build(account, fields, transactions, now))
+        if safe:
+            response.set_etag(etag, weak=True)
+        else:
+            response.add_etag()
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+    
+    except Exception as e:
+        log.error('Dashboard error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ==================== SERVE FRONTEND ====================
 
 @app.route('/')
 def serve_index():
-    """Serve the frontend index page"""
-    from flask import send_from_directory
-    frontend_dir = os.path.join(os.path.dirname(__file__), '..', 'frontend')
+    """Serve the frontend index page (STATIC_ASSETS=disk)"""
     return send_from_directory(frontend_dir, 'index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
-    """Serve static frontend files"""
-    from flask import send_from_directory
-    frontend_dir = os.path.join(os.path.dirname(__file__), '..', 'frontend')
+    """Serve static frontend files (STATIC_ASSETS=disk, or added since startup)"""
     return send_from_directory(frontend_dir, path)
 
 if __name__ == '__main__':
     # Get port from environment variable (for deployment) or use 5000 for local
     port = int(os.getenv('PORT', 5000))
     
+    init_app()
+    
     print("\n" + "="*50)
     print("MINI BANKING SYSTEM - BACKEND API")
     print("="*50)
@@ -583,4 +932,5 @@ if __name__ == '__main__':
     print("="*50 + "\n")
     
     # Use Flask's built-in server with threading
+    # For production use gunicorn instead: gunicorn -c gunicorn.conf.py app:app
     app.run(host='0.0.0.0', port=port, debug=False, threaded=True, use_reloader=False)
@@ -0,0 +1,913 @@
+# Mini Banking System - ASGI entry point
+# Serves the same /api/* routes as app.py with async handlers on Motor, so
+# one process can hold thousands of concurrent sessions without a thread
+# per in-flight request.
+#
+# Run (from the backend directory):
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+#
+# Sessions use the same SESSION_STORE as app.py (sessions.py) and the same
+# cookie, so a user logged in through either entry point is logged in on
+# both. With SESSION_STORE=cookie both sign the session with Flask's format
+# and SECRET_KEY. SESSION_STORE=memory is per process and is not shared.
+
+import os
+import time
+import asyncio
+import hashlib
+from datetime import datetime
+from types import SimpleNamespace
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from flask.sessions import session_json_serializer
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse, Response
+from starlette.middleware import Middleware
+from starlette.routing import Route, Mount
+from starlette.staticfiles import StaticFiles
+
+from balance_engine import AccountNotFound, InsufficientFunds
+from hot_accounts import AsyncShardedBalanceEngine
+from ledger_writer import AsyncLedgerWriter
+from hashing import PasswordHasher, HasherBusy
+from account_numbers import AccountNumberAllocator, SEQUENCE_NAME
+from storage import is_duplicate_email
+from sessions import AsyncSessionStore
+from batch import AsyncBatchProcessor, BatchRejected, BatchConflict, parse_batch
+from validation import (
+    ValidationError, validate_registration, validate_login,
+    validate_deposit, validate_withdraw, validate_transfer
+)
+import history
+import idempotency
+import account_stats
+import dashboard
+import onboarding
+import statements
+import money
+import mongo
+import static_assets
+import logs
+import metrics
+import json_provider
+
+load_dotenv()
+
+logs.configure()
+log = logs.get_logger('asgi')
+
+SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+SESSION_COOKIE = 'session'
+SESSION_MAX_AGE = 31 * 24 * 3600
+
+# Same serializer settings as Flask's SecureCookieSessionInterface
+session_serializer = URLSafeTimedSerializer(
+    SECRET_KEY,
+    salt='cookie-session',
+    serializer=session_json_serializer,
+    signer_kwargs={'key_derivation': 'hmac', 'digest_method': hashlib.sha1}
+)
+
+state = SimpleNamespace()
+
+# ==================== HELPERS ====================
+
+class ApiResponse(JSONResponse):
+    def render(self, content):
+        # Same encoder (and output) as the Flask app's JSON provider
+        return json_provider.dumps(content)
+
+
+async def load_session(request):
+    cookie = request.cookies.get(SESSION_COOKIE)
+    if not cookie:
+        return {}
+    if state.sessions is not None:
+        return await state.sessions.load(cookie) or {}
+    try:
+        return session_serializer.loads(cookie, max_age=SESSION_MAX_AGE)
+    except BadSignature:
+        return {}
+
+
+async def start_session(request, data):
+    """Cookie value for a new login: a fresh session id, or the signed data"""
+    if state.sessions is None:
+        return session_serializer.dumps(data)
+    previous = request.cookies.get(SESSION_COOKIE)
+    if previous:
+        # A login never reuses the id it arrived with (no session fixation)
+        await state.sessions.delete(previous)
+    return await state.sessions.create(data)
+
+
+async def end_session(request):
+    cookie = request.cookies.get(SESSION_COOKIE)
+    if cookie and state.sessions is not None:
+        await state.sessions.delete(cookie)
+
+
+def respond(payload, status=200, cookie=None):
+    """JSON response; pass cookie='' to clear the session cookie"""
+    response = ApiResponse(payload, status_code=status)
+    if cookie:
+        max_age = int(state.sessions.ttl) if state.sessions is not None else None
+        response.set_cookie(SESSION_COOKIE, cookie, max_age=max_age,
+                            httponly=True, samesite='lax', path='/')
+    elif cookie is not None:
+        response.delete_cookie(SESSION_COOKIE, path='/')
+    return response
+
+
+def error(message, status):
+    return respond({'success': False, 'error': message}, status)
+
+
+def busy(e):
+    response = error(str(e), 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def api(name):
+    """Wrap a handler with the same catch-all error reporting as app.py"""
+    def decorate(handler):
+        async def endpoint(request):
+            try:
+                return await handler(request)
+            except Exception as e:
+                log.error('%s error: %s', name, e)
+                return error(str(e), 500)
+        return endpoint
+    return decorate
+
+
+class RequestMetrics:
+    """ASGI middleware: in-flight gauge plus per-route latency (to the first byte, like app.py)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        metrics.http_in_flight.inc()
+
+        async def send_with_metrics(message):
+            if message['type'] == 'http.response.start':
+                route = ROUTE_PATHS.get(scope.get('endpoint'), '/<path:path>')
+                method = scope['method']
+                metrics.http_latency.observe(time.perf_counter() - started, route=route, method=method)
+                metrics.http_requests.inc(route=route, method=method, status=message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            metrics.http_in_flight.dec()
+
+
+def money_moved(request):
+    """Called by a handler once its balance change is applied (as app.py)"""
+    request.state.money_moved = True
+
+
+def idempotent(handler):
+    """Run the handler once per Idempotency-Key; retries get the stored response (as app.py)"""
+    async def wrapper(request):
+        key = request.headers.get(idempotency.HEADER)
+        session = await load_session(request)
+        if not key or 'user_id' not in session:
+            return await handler(request)
+        if len(key) > idempotency.MAX_KEY_LENGTH:
+            return error('Idempotency-Key is too long', 400)
+
+        scoped_key = f"{session['user_id']}:{key}"
+        request_hash = idempotency.fingerprint(request.method, request.url.path, await request.body())
+        try:
+            stored = await state.idempotency_keys.begin(scoped_key, request_hash)
+        except idempotency.KeyReused as e:
+            return error(str(e), 422)
+        except idempotency.RequestInProgress as e:
+            response = error(str(e), 409)
+            response.headers['Retry-After'] = '1'
+            return response
+
+        if stored is not None:
+            return Response(stored['body'], status_code=stored['status'], headers={
+                'Content-Type': stored['content_type'], idempotency.REPLAYED_HEADER: 'true'
+            })
+
+        try:
+            response = await handler(request)
+        except BaseException:
+            if getattr(request.state, 'money_moved', False):
+                await state.idempotency_keys.complete(scoped_key, request_hash, 500, idempotency.INTERRUPTED_BODY,
+                                                      'application/json')
+            else:
+                await state.idempotency_keys.release(scoped_key)
+            raise
+        if idempotency.is_final(response.status_code) or getattr(request.state, 'money_moved', False):
+            await state.idempotency_keys.complete(scoped_key, request_hash, response.status_code,
+                                                  response.body, response.headers.get('content-type'))
+        else:
+            await state.idempotency_keys.release(scoped_key)
+        return response
+    return wrapper
+
+
+async def request_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise ValidationError('Invalid JSON body')
+
+
+async def load_account(query):
+    """Account document with any hot-account slot balances folded in"""
+    return await state.balance_engine.view(await state.accounts.find_one(query))
+
+
+async def find_account_by_user(user_id):
+    return await load_account({'user_id': ObjectId(user_id)})
+
+
+async def find_account_by_number(account_number):
+    return await load_account({'account_number': account_number})
+
+
+async def balance_to_report(balance_after, user_id):
+    """The balance to answer with (as app.py): a change to a hot account reports none"""
+    if balance_after is not None:
+        return balance_after
+    return (await find_account_by_user(user_id))['balance']
+
+# ==================== LIFECYCLE ====================
+
+async def reserve_account_numbers(count):
+    counter = await state.counters.find_one_and_update(
+        {'_id': SEQUENCE_NAME}, {'$inc': {'value': count}},
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return counter['value'] - count
+
+
+async def startup():
+    mongo_uri = os.getenv('MONGODB_URI')
+    if not mongo_uri:
+        raise RuntimeError('MONGODB_URI is not configured')
+
+    state.client = AsyncIOMotorClient(mongo_uri, **mongo.client_options())
+    await state.client.admin.command('ping')
+    db = state.client[os.getenv('DATABASE_NAME', 'banking_system')]
+
+    state.users = db['users']
+    state.accounts = db['accounts']
+    state.transactions = db['transactions']
+    state.counters = db['counters']
+    state.statements = statements.AsyncStatementStore(state.transactions, db['statements'])
+    state.statement_close_delay = statements.close_delay_from_env()
+
+    await state.users.create_index('email', unique=True)
+    await state.accounts.create_index('account_number', unique=True)
+    await state.accounts.create_index('user_id')
+    await state.transactions.create_index(history.HISTORY_INDEX)
+    await state.transactions.create_index(history.HISTORY_TYPE_INDEX)
+
+    # Same check as MongoStorage.init_schema(): never $inc paise into float rupees
+    if await state.counters.find_one({'_id': money.LAYOUT_MARKER}) is None:
+        if await state.accounts.find_one({'balance': {'$type': 'double'}}, {'_id': 1}) is not None:
+            raise money.LegacyMoneyLayout('Balances are stored as float rupees; run python migrate_money.py first')
+        await state.counters.update_one(
+            {'_id': money.LAYOUT_MARKER}, {'$setOnInsert': {'value': money.LAYOUT}}, upsert=True
+        )
+
+    state.balance_engine = AsyncShardedBalanceEngine.from_env(state.client, state.accounts, db['balance_slots'])
+    await state.balance_engine.create_indexes()
+    state.batch_processor = AsyncBatchProcessor(state.client, state.accounts)
+    state.ledger = AsyncLedgerWriter(state.transactions)
+    state.idempotency_keys = idempotency.AsyncIdempotency.from_env(db['idempotency_keys'])
+    state.sessions = AsyncSessionStore.from_env(db)
+    if state.sessions is not None:
+        await state.sessions.init()
+    await state.idempotency_keys.init()
+    state.password_hasher = PasswordHasher.from_env()
+    state.account_numbers = AccountNumberAllocator.from_env(reserve_account_numbers)
+
+    metrics.registry.add_stats('password_hasher', 'Password hashing pool', state.password_hasher.stats)
+    metrics.registry.add_stats('account_numbers', 'Account number allocator', state.account_numbers.stats)
+    metrics.registry.add_stats('idempotency', 'Idempotency keys', state.idempotency_keys.stats)
+    metrics.registry.add_stats('hot_accounts', 'Hot account sub-balances', state.balance_engine.stats)
+    metrics.registry.add_stats('ledger', 'Ledger writer', state.ledger.metrics)
+    if state.sessions is not None:
+        metrics.registry.add_stats('sessions', 'Session store', state.sessions.stats)
+
+    log.info('MongoDB connected (async)', extra={'pid': os.getpid()})
+
+
+async def shutdown():
+    state.client.close()
+
+# ==================== ROUTES ====================
+
+@api('Registration')
+async def register(request):
+    try:
+        name, email, phone, password = validate_registration(await request_json(request))
+    except ValidationError as e:
+        return error(str(e), 400)
+
+    try:
+        password_hash = await asyncio.wrap_future(state.password_hasher.submit_hash(password))
+    except HasherBusy as e:
+        return busy(e)
+
+    account_number = await state.account_numbers.anext()
+    user, account = onboarding.customer_documents(
+        name, email, phone, password_hash, account_number, datetime.utcnow()
+    )
+
+    user['_id'] = ObjectId()
+
+    async def create(session):
+        await state.users.insert_one(user, session=session)
+        account['user_id'] = user['_id']
+        await state.accounts.insert_one(account, session=session)
+
+    try:
+        await mongo.run_in_transaction_async(state.client, create)
+    except Exception as e:
+        # Without transaction support the user may already be written
+        await state.users.delete_one({'_id': user['_id']})
+        if isinstance(e, DuplicateKeyError) and is_duplicate_email(e):
+            return error('Email already registered', 400)
+        raise
+    user_id = user['_id']
+
+    return respond({
+        'success': True,
+        'message': 'Registration successful',
+        'user': {'id': str(user_id), 'name': name, 'email': email},
+        'account_number': account_number
+    }, cookie=await start_session(request, {'user_id': str(user_id), 'user_email': email, 'user_name': name}))
+
+
+@api('Login')
+async def login(request):
+    try:
+        email, password = validate_login(await request_json(request))
+    except ValidationError as e:
+        return error(str(e), 400)
+
+    user = await state.users.find_one({'email': email})
+    try:
+        valid = user is not None and await asyncio.wrap_future(
+            state.password_hasher.submit_verify(user['password'], password)
+        )
+    except HasherBusy as e:
+        return busy(e)
+
+    if not valid:
+        return error('Invalid credentials', 401)
+
+    if state.password_hasher.needs_rehash(user['password']):
+        old_hash = user['password']
+        loop = asyncio.get_running_loop()
+        state.password_hasher.upgrade_later(password, lambda new_hash: asyncio.run_coroutine_threadsafe(
+            state.users.update_one({'_id': user['_id'], 'password': old_hash}, {'$set': {'password': new_hash}}),
+            loop
+        ))
+
+    return respond({
+        'success': True,
+        'message': 'Login successful',
+        'user': {
+            'id': str(user['_id']),
+            'name': user['name'],
+            'email': user['email'],
+            'phone': user.get('phone', '')
+        }
+    }, cookie=await start_session(
+        request, {'user_id': str(user['_id']), 'user_email': email, 'user_name': user['name']}
+    ))
+
+
+@api('Logout')
+async def logout(request):
+    await end_session(request)
+    return respond({'success': True, 'message': 'Logout successful'}, cookie='')
+
+
+@api('Logout all')
+async def logout_all(request):
+    """End every session of the user, on all devices"""
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    if state.sessions is None:
+        return error('Signed-cookie sessions cannot be revoked', 400)
+
+    user_id = session['user_id']
+    await state.sessions.revoke_user(user_id)
+    await end_session(request)
+
+    log.info('All sessions revoked', extra={'user_id': user_id})
+    return respond({'success': True, 'message': 'Logged out on all devices'}, cookie='')
+
+
+@api('Session check')
+async def check_session(request):
+    session = await load_session(request)
+    if 'user_id' in session:
+        return respond({
+            'success': True,
+            'logged_in': True,
+            'user': {
+                'id': session.get('user_id'),
+                'name': session.get('user_name'),
+                'email': session.get('user_email')
+            }
+        })
+    return respond({'success': True, 'logged_in': False})
+
+
+@api('Account creation')
+async def create_account(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    user_id = session['user_id']
+    if await find_account_by_user(user_id):
+        return error('Account already exists', 400)
+
+    account_number = await state.account_numbers.anext()
+    await state.accounts.insert_one({
+        'user_id': ObjectId(user_id),
+        'account_number': account_number,
+        'balance': money.ZERO,
+        'created_at': datetime.utcnow()
+    })
+
+    return respond({
+        'success': True,
+        'message': 'Account created successfully',
+        'account': {'account_number': account_number, 'balance': 0.0}
+    })
+
+
+@api('Get account info')
+async def get_account_info(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    account = await find_account_by_user(session['user_id'])
+    if not account:
+        return respond({'success': True, 'has_account': False})
+
+    return respond({
+        'success': True,
+        'has_account': True,
+        'account': {'account_number': account['account_number'], 'balance': money.rupees(account['balance'])}
+    })
+
+
+@api('Get balance')
+async def get_balance(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    account = await find_account_by_user(session['user_id'])
+    if not account:
+        return error('No account found', 404)
+
+    return respond({
+        'success': True,
+        'balance': money.rupees(account['balance']),
+        'account_number': account['account_number']
+    })
+
+
+@api('Deposit')
+@idempotent
+async def deposit(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    try:
+        amount = validate_deposit(await request_json(request))
+    except ValidationError as e:
+        return error(str(e), 400)
+
+    now = datetime.utcnow()
+    try:
+        change = await state.balance_engine.credit(
+            {'user_id': ObjectId(session['user_id'])}, amount,
+            account_stats.stats_increment('deposit', amount, now)
+        )
+    except AccountNotFound:
+        return error('No account found', 404)
+    money_moved(request)
+
+    account = change.account
+
+    await state.ledger.write({
+        'account_id': account['_id'],
+        'type': 'deposit',
+        'amount': amount,
+        'balance_before': change.balance_before,
+        'balance_after': change.balance_after,
+        'timestamp': now,
+        'description': f'Deposit of {money.format_rupees(amount)}'
+    })
+
+    return respond({
+        'success': True,
+        'message': f'Successfully deposited {money.format_rupees(amount)}',
+        'new_balance': money.rupees(await balance_to_report(change.balance_after, session['user_id']))
+    })
+
+
+@api('Withdrawal')
+@idempotent
+async def withdraw(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    try:
+        amount = validate_withdraw(await request_json(request))
+    except ValidationError as e:
+        return error(str(e), 400)
+
+    now = datetime.utcnow()
+    try:
+        change = await state.balance_engine.debit(
+            {'user_id': ObjectId(session['user_id'])}, amount,
+            account_stats.stats_increment('withdrawal', amount, now)
+        )
+    except AccountNotFound:
+        return error('No account found', 404)
+    except InsufficientFunds as e:
+        return error(str(e), 400)
+    money_moved(request)
+
+    account = change.account
+
+    await state.ledger.write({
+        'account_id': account['_id'],
+        'type': 'withdrawal',
+        'amount': amount,
+        'balance_before': change.balance_before,
+        'balance_after': change.balance_after,
+        'timestamp': now,
+        'description': f'Withdrawal of {money.format_rupees(amount)}'
+    })
+
+    return respond({
+        'success': True,
+        'message': f'Successfully withdrew {money.format_rupees(amount)}',
+        'new_balance': money.rupees(await balance_to_report(change.balance_after, session['user_id']))
+    })
+
+
+@api('Transfer')
+@idempotent
+async def transfer(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    try:
+        to_account_number, amount = validate_transfer(await request_json(request))
+    except ValidationError as e:
+        return error(str(e), 400)
+
+    user_id = ObjectId(session['user_id'])
+    to_account = await find_account_by_number(to_account_number)
+    if not to_account:
+        return error('Recipient account not found', 404)
+
+    if to_account['user_id'] == user_id:
+        return error('Cannot transfer to same account', 400)
+
+    now = datetime.utcnow()
+    try:
+        sent, received = await state.balance_engine.transfer(
+            {'user_id': user_id},
+            {'_id': to_account['_id']},
+            amount,
+            account_stats.stats_increment('transfer_out', amount, now),
+            account_stats.stats_increment('transfer_in', amount, now)
+        )
+    except AccountNotFound:
+        return error('No account found', 404)
+    except InsufficientFunds as e:
+        return error(str(e), 400)
+    money_moved(request)
+
+    from_account_number = sent.account['account_number']
+
+    await state.ledger.write(
+        {
+            'account_id': sent.account['_id'],
+            'type': 'transfer_out',
+            'amount': amount,
+            'balance_before': sent.balance_before,
+            'balance_after': sent.balance_after,
+            'to_account': to_account_number,
+            'timestamp': now,
+            'description': f'Transfer to {to_account_number}'
+        },
+        {
+            'account_id': to_account['_id'],
+            'type': 'transfer_in',
+            'amount': amount,
+            'balance_before': received.balance_before,
+            'balance_after': received.balance_after,
+            'from_account': from_account_number,
+            'timestamp': now,
+            'description': f'Transfer from {from_account_number}'
+        }
+    )
+
+    return respond({
+        'success': True,
+        'message': f'Successfully transferred {money.format_rupees(amount)} to {to_account_number}',
+        'new_balance': money.rupees(await balance_to_report(sent.balance_after, session['user_id']))
+    })
+
+
+@api('Batch')
+@idempotent
+async def batch_transactions(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    try:
+        mode, items = parse_batch(await request_json(request))
+    except ValidationError as e:
+        return error(str(e), 400)
+
+    user_id = session['user_id']
+    hot = await state.balance_engine.lookup({'user_id': ObjectId(user_id)})
+    if hot is not None:
+        # Batches plan against the account document's balance alone
+        await state.balance_engine.consolidate(hot[0])
+
+    try:
+        result = await state.batch_processor.run(user_id, mode, items, datetime.utcnow())
+    except BatchRejected as e:
+        return respond({'success': False, 'error': str(e), 'mode': mode, 'results': e.results}, 400)
+    except BatchConflict:
+        return error('Account is busy, please retry', 409)
+
+    if result is None:
+        return error('No account found', 404)
+    money_moved(request)
+
+    if result.transactions:
+        await state.ledger.write(*result.transactions)
+
+    results = result.results()
+    applied = sum(1 for r in results if r['status'] == 'ok')
+    return respond({
+        'success': True,
+        'mode': mode,
+        'applied': applied,
+        'failed': len(results) - applied,
+        'results': results,
+        'new_balance': money.rupees(await balance_to_report(result.balance_after, session['user_id']))
+    })
+
+
+@api('Transaction history')
+async def get_transaction_history(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    account = await find_account_by_user(session['user_id'])
+    if not account:
+        return error('No account found', 404)
+
+    limit = history.parse_limit(request.query_params.get('limit'))
+    try:
+        filters = history.parse_filter(request.query_params)
+        pipeline = history.page_pipeline(account['_id'], limit, request.query_params.get('cursor'), filters)
+    except (history.InvalidCursor, ValidationError) as e:
+        return error(str(e), 400)
+
+    rows = await state.transactions.aggregate(pipeline).to_list(None)
+    rows, next_cursor = history.finish_page(rows, limit)
+
+    return respond({
+        'success': True,
+        'transactions': rows,
+        'account_number': account['account_number'],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    })
+
+
+@api('Transaction export')
+async def export_transactions(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    export_format = request.query_params.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return error('Format must be ndjson or csv', 400)
+
+    account = await find_account_by_user(session['user_id'])
+    if not account:
+        return error('No account found', 404)
+
+    cursor = history.export_cursor(state.transactions, account['_id'])
+
+    async def rows():
+        if export_format == 'csv':
+            yield history.csv_header()
+        format_row = history.csv_row if export_format == 'csv' else history.ndjson_row
+        async for t in cursor:
+            yield format_row(t)
+
+    filename = f"transactions-{account['account_number']}.{export_format}"
+    return StreamingResponse(
+        rows(),
+        media_type='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@api('Statement list')
+async def list_statements(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    account = await find_account_by_user(session['user_id'])
+    if not account:
+        return error('No account found', 404)
+
+    periods = statements.closed_periods(account['created_at'], datetime.utcnow(), state.statement_close_delay)
+    return respond({
+        'success': True,
+        'account_number': account['account_number'],
+        'periods': periods
+    })
+
+
+@api('Statement')
+async def get_statement(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    period = request.path_params['period']
+    try:
+        statements.parse_period(period)
+    except ValidationError as e:
+        return error(str(e), 400)
+
+    account = await find_account_by_user(session['user_id'])
+    if not account:
+        return error('No account found', 404)
+
+    if period not in statements.closed_periods(account['created_at'], datetime.utcnow(), state.statement_close_delay):
+        return error('No statement for this period', 404)
+
+    # Revalidation needs no database access: the ETag names the statement
+    etag = statements.etag(account['_id'], period)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': statements.CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    statement = await statements.get_statement_async(
+        state.statements, account['_id'], period, account['created_at']
+    )
+    response = respond({
+        'success': True,
+        'statement': statements.serialize_statement(statement, account['account_number'])
+    })
+    response.headers.update(headers)
+    return response
+
+
+@api('Stats')
+async def get_dashboard_stats(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    account = await find_account_by_user(session['user_id'])
+    if not account:
+        return error('No account found', 404)
+
+    transactions = await state.transactions.aggregate(history.recent_pipeline(account['_id'], 10)).to_list(None)
+
+    return respond({
+        'success': True,
+        'stats': dashboard.stats(account, datetime.utcnow()),
+        'recent_transactions': transactions
+    })
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('if-none-match', '')
+    return any(tag.strip().removeprefix('W/') == f'"{etag}"' for tag in header.split(','))
+
+
+@api('Dashboard')
+async def get_dashboard(request):
+    session = await load_session(request)
+    if 'user_id' not in session:
+        return error('Please login first', 401)
+
+    try:
+        fields = dashboard.parse_fields(request.query_params.get('fields'))
+        limit = dashboard.parse_limit(request.query_params.get('limit'))
+    except ValidationError as e:
+        return error(str(e), 400)
+
+    account = await find_account_by_user(session['user_id'])
+    if not account:
+        return respond({'success': True, 'has_account': False})
+
+    now = datetime.utcnow()
+    etag = dashboard.etag(account, fields, limit, now)
+    headers = {'ETag': f'W/"{etag}"', 'Cache-Control': 'private, no-cache'}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    transactions = []
+    if 'transactions' in fields:
+        transactions = await state.transactions.aggregate(
+            history.recent_pipeline(account['_id'], limit)
+        ).to_list(None)
+
+    safe = dashboard.etag_safe(account, fields, transactions)
+
+    response = respond(dashboard.build(account, fields, transactions, now))
+    if not safe:
+        etag = hashlib.sha1(response.body).hexdigest()
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'})
+        headers['ETag'] = f'"{etag}"'
+    response.headers.update(headers)
+    return response
+
+async def get_metrics(request):
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+# ==================== APP ====================
+
+frontend_dir = static_assets.FRONTEND_DIR
+
+routes = [
+    Route('/api/auth/register', register, methods=['POST']),
+    Route('/api/auth/login', login, methods=['POST']),
+    Route('/api/auth/logout', logout, methods=['POST']),
+    Route('/api/auth/logout-all', logout_all, methods=['POST']),
+    Route('/api/auth/check', check_session, methods=['GET']),
+    Route('/api/account/create', create_account, methods=['POST']),
+    Route('/api/account/info', get_account_info, methods=['GET']),
+    Route('/api/account/balance', get_balance, methods=['GET']),
+    Route('/api/transactions/deposit', deposit, methods=['POST']),
+    Route('/api/transactions/withdraw', withdraw, methods=['POST']),
+    Route('/api/transactions/transfer', transfer, methods=['POST']),
+    Route('/api/transactions/batch', batch_transactions, methods=['POST']),
+    Route('/api/transactions/history', get_transaction_history, methods=['GET']),
+    Route('/api/transactions/export', export_transactions, methods=['GET']),
+    Route('/api/statements', list_statements, methods=['GET']),
+    Route('/api/statements/{period}', get_statement, methods=['GET']),
+    Route('/api/dashboard/stats', get_dashboard_stats, methods=['GET']),
+    Route('/api/dashboard', get_dashboard, methods=['GET']),
+    Route('/metrics', get_metrics, methods=['GET']),
+    Mount('/', StaticFiles(directory=frontend_dir, html=True), name='frontend')
+]
+
+ROUTE_PATHS = {route.endpoint: route.path for route in routes if isinstance(route, Route)}
+
+# Same in-memory frontend table as app.py; StaticFiles keeps STATIC_ASSETS=disk
+# and files added since startup working
+middleware = [Middleware(RequestMetrics)]
+if os.getenv('STATIC_ASSETS', 'memory') != 'disk':
+    frontend_assets = static_assets.StaticAssets.from_env().build()
+    middleware.insert(0, Middleware(static_assets.StaticASGIMiddleware, assets=frontend_assets))
+    metrics.registry.add_stats('static', 'Static assets', frontend_assets.stats)
+
+app = Starlette(routes=routes, middleware=middleware,
+                on_startup=[startup], on_shutdown=[shutdown])
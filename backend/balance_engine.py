@@ -0,0 +1,132 @@
+# Balance mutation engine
+# Every balance change is a single conditional $inc applied with
+# find_one_and_update, so concurrent requests never lose updates and the
+# before/after balances come back from the same round trip.
+
+from collections import namedtuple
+from pymongo import ReturnDocument
+
+import money
+
+BalanceChange = namedtuple('BalanceChange', ['account', 'balance_before', 'balance_after'])
+
+
+class AccountNotFound(Exception):
+    """No account matched the query"""
+
+
+class InsufficientFunds(Exception):
+    """The guarded debit did not match because the balance is too low"""
+
+    def __init__(self, available):
+        super().__init__(f'Insufficient balance. Available: {money.format_rupees(available)}')
+        self.available = available
+
+
+def apply_inc(doc, inc):
+    # Mirror a dotted-path $inc on a local copy of the pre-image
+    for path, value in inc.items():
+        target = doc
+        *parents, leaf = path.split('.')
+        for key in parents:
+            target = target.setdefault(key, {})
+        target[leaf] = target.get(leaf, 0) + value
+
+
+class BalanceEngine:
+    """Applies credits and debits to accounts_collection atomically"""
+
+    def __init__(self, accounts_collection):
+        self.accounts = accounts_collection
+
+    def _apply(self, query, delta, inc=None):
+        # The pre-image is returned so that balance_after is computed with the
+        # exact same addition the server performed for $inc. Extra $inc fields
+        # (running statistics) ride along in the same atomic write.
+        account = self.accounts.find_one_and_update(
+            query,
+            {'$inc': dict(inc or {}, balance=delta)},
+            return_document=ReturnDocument.BEFORE
+        )
+        if account is None:
+            return None
+        before = account['balance']
+        after = before + delta
+        apply_inc(account, inc or {})
+        account['balance'] = after
+        return BalanceChange(account, before, after)
+
+    def credit(self, query, amount, inc=None):
+        change = self._apply(query, amount, inc)
+        if change is None:
+            raise AccountNotFound()
+        return change
+
+    def debit(self, query, amount, inc=None):
+        change = self._apply(dict(query, balance={'$gte': amount}), -amount, inc)
+        if change is None:
+            # Only the failure path pays for a second read, to tell a missing
+            # account apart from an insufficient balance
+            current = self.accounts.find_one(query, {'balance': 1})
+            if current is None:
+                raise AccountNotFound()
+            raise InsufficientFunds(current['balance'])
+        return change
+
+    def transfer(self, from_query, to_query, amount, from_inc=None, to_inc=None):
+        sent = self.debit(from_query, amount, from_inc)
+        try:
+            received = self.credit(to_query, amount, to_inc)
+        except AccountNotFound:
+            # Recipient disappeared between lookup and credit; refund the sender
+            # and back out its statistics
+            refund = {field: -value for field, value in (from_inc or {}).items()}
+            self.credit({'_id': sent.account['_id']}, amount, refund)
+            raise
+        return sent, received
+
+
+class AsyncBalanceEngine:
+    """BalanceEngine for an asyncio (Motor) accounts collection"""
+
+    def __init__(self, accounts_collection):
+        self.accounts = accounts_collection
+
+    async def _apply(self, query, delta, inc=None):
+        account = await self.accounts.find_one_and_update(
+            query,
+            {'$inc': dict(inc or {}, balance=delta)},
+            return_document=ReturnDocument.BEFORE
+        )
+        if account is None:
+            return None
+        before = account['balance']
+        after = before + delta
+        apply_inc(account, inc or {})
+        account['balance'] = after
+        return BalanceChange(account, before, after)
+
+    async def credit(self, query, amount, inc=None):
+        change = await self._apply(query, amount, inc)
+        if change is None:
+            raise AccountNotFound()
+        return change
+
+    async def debit(self, query, amount, inc=None):
+        change = await self._apply(dict(query, balance={'$gte': amount}), -amount, inc)
+        if change is None:
+            current = await self.accounts.find_one(query, {'balance': 1})
+            if current is None:
+                raise AccountNotFound()
+            raise InsufficientFunds(current['balance'])
+        return change
+
+    async def transfer(self, from_query, to_query, amount, from_inc=None, to_inc=None):
+        sent = await self.debit(from_query, amount, from_inc)
+        try:
+            received = await self.credit(to_query, amount, to_inc)
+        except AccountNotFound:
+            refund = {field: -value for field, value in (from_inc or {}).items()}
+            await self.credit({'_id': sent.account['_id']}, amount, refund)
+            raise
+        return sent, received
@@ -0,0 +1,422 @@
+# Batch money movements for POST /api/transactions/batch
+# All operations debit or credit the caller's own account, so the batch is
+# first simulated against a balance snapshot and then applied as ONE
+# guarded $inc on the sender plus one $inc per recipient, inside a
+# multi-document transaction where the deployment supports it. Each
+# recipient's $inc returns its post-update balance, so the ledger rows chain
+# on exactly what this batch did even with concurrent credits.
+#
+# Without transactions (standalone server) the writes commit one by one: a
+# recipient deleted after it was resolved makes the batch back out what it
+# already applied, like BalanceEngine.transfer refunds the sender, before the
+# batch is re-planned without that recipient (an atomic batch is rejected).
+#
+# Modes:
+#   atomic      - every operation must be valid and fundable, or nothing is applied
+#   best_effort - invalid or unfundable operations are reported and skipped
+#
+# BatchProcessor runs on pymongo; AsyncBatchProcessor is its Motor twin for
+# asgi_app.py and shares parsing, planning and the result documents.
+
+from collections import OrderedDict
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+
+import mongo
+import money
+import account_stats
+from balance_engine import apply_inc
+from validation import ValidationError, validate_deposit, validate_withdraw, validate_transfer
+
+MAX_BATCH_OPERATIONS = 500
+MODES = ('atomic', 'best_effort')
+MAX_ATTEMPTS = 3
+
+# Operation type -> transaction type recorded on the caller's account
+OPERATIONS = {
+    'deposit': 'deposit',
+    'withdraw': 'withdrawal',
+    'transfer': 'transfer_out'
+}
+
+
+class BatchRejected(Exception):
+    """Atomic batch refused; results holds the per-item outcome"""
+
+    def __init__(self, message, results):
+        super().__init__(message)
+        self.results = results
+
+
+class BatchConflict(Exception):
+    """The sender's balance changed under the batch; re-plan and retry"""
+
+
+class RecipientMissing(Exception):
+    """A recipient account was deleted after the batch resolved it"""
+
+    def __init__(self, recipient_id):
+        super().__init__('A recipient account disappeared during the batch')
+        self.recipient_id = recipient_id
+
+
+class BatchItem:
+    __slots__ = ('index', 'op', 'txn_type', 'amount', 'to_account', 'recipient', 'error', 'unfunded')
+
+    def __init__(self, index, op):
+        self.index = index
+        self.op = op
+        self.txn_type = OPERATIONS.get(op)
+        self.amount = None
+        self.to_account = None
+        self.recipient = None
+        self.error = None       # invalid request or unknown recipient
+        self.unfunded = None    # insufficient balance at planning time
+
+    def result(self):
+        if self.error or self.unfunded:
+            return {'index': self.index, 'type': self.op, 'status': 'failed',
+                    'error': self.error or self.unfunded}
+        return {'index': self.index, 'type': self.op, 'status': 'ok', 'amount': money.rupees(self.amount)}
+
+
+def parse_batch(data):
+    """Validate the request body; returns (mode, items) with per-item errors set"""
+    data = data or {}
+    mode = data.get('mode', 'atomic')
+    if mode not in MODES:
+        raise ValidationError('Mode must be atomic or best_effort')
+
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        raise ValidationError('operations must be a non-empty list')
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValidationError(f'A batch can hold at most {MAX_BATCH_OPERATIONS} operations')
+
+    items = []
+    for index, operation in enumerate(operations):
+        operation = operation if isinstance(operation, dict) else {}
+        item = BatchItem(index, operation.get('type'))
+        try:
+            if item.op == 'deposit':
+                item.amount = validate_deposit(operation)
+            elif item.op == 'withdraw':
+                item.amount = validate_withdraw(operation)
+            elif item.op == 'transfer':
+                item.to_account, item.amount = validate_transfer(operation)
+            else:
+                raise ValidationError('Type must be deposit, withdraw or transfer')
+        except ValidationError as e:
+            item.error = str(e)
+        items.append(item)
+    return mode, items
+
+
+class BatchResult:
+    def __init__(self, items, sender, balance_before, balance_after, credits, transactions):
+        self.items = items
+        self.sender = sender                # post-update sender account document
+        self.balance_before = balance_before
+        self.balance_after = balance_after
+        self.credits = credits              # recipient _id -> post-update balance (None when hot)
+        self.transactions = transactions    # transaction documents to write to the ledger
+
+    def results(self):
+        return [item.result() for item in self.items]
+
+
+def check_batch(mode, items):
+    """Atomic batches with invalid operations are refused before touching any account"""
+    if mode == 'atomic' and any(item.error for item in items):
+        raise BatchRejected('Batch rejected: one or more operations are invalid', [i.result() for i in items])
+
+
+def assign_recipient(item, recipient, user_id):
+    if recipient is None:
+        item.error = 'Recipient account not found'
+    elif recipient['user_id'] == user_id:
+        item.error = 'Cannot transfer to same account'
+    else:
+        item.recipient = recipient
+
+
+def drop_recipient(items, recipient_id):
+    for item in items:
+        if item.recipient is not None and item.recipient['_id'] == recipient_id:
+            item.recipient = None
+            item.error = 'Recipient account not found'
+
+
+def plan(items, balance, mode):
+    """Simulate the batch in order; returns (accepted, net delta, required starting balance)"""
+    accepted = []
+    net = 0
+    required = 0
+    for item in items:
+        item.unfunded = None
+        if item.error:
+            continue
+        if item.op == 'deposit':
+            net += item.amount
+        else:
+            if balance + net < item.amount:
+                item.unfunded = f'Insufficient balance. Available: {money.format_rupees(balance + net)}'
+                continue
+            net -= item.amount
+            # Lowest point of the running balance decides the guard
+            required = max(required, -net)
+        accepted.append(item)
+
+    if mode == 'atomic' and len(accepted) != len(items):
+        raise BatchRejected('Batch rejected: one or more operations failed', [i.result() for i in items])
+    return accepted, net, required
+
+
+def increments(accepted, now):
+    """Stats $inc for the sender, and recipient _id -> {'amount', 'inc'} credits"""
+    sender_inc = account_stats.merge_increments(
+        account_stats.stats_increment(item.txn_type, item.amount, now) for item in accepted
+    )
+    credits = OrderedDict()
+    for item in accepted:
+        if item.op == 'transfer':
+            rid = item.recipient['_id']
+            entry = credits.setdefault(rid, {'amount': 0, 'inc': []})
+            entry['amount'] += item.amount
+            entry['inc'].append(account_stats.stats_increment('transfer_in', item.amount, now))
+    return sender_inc, credits
+
+
+def credit_inc(entry):
+    """The $inc applying one recipient's credits and statistics"""
+    return dict(account_stats.merge_increments(entry['inc']), balance=entry['amount'])
+
+
+def reverse(inc):
+    return {field: -value for field, value in inc.items()}
+
+
+def build_result(items, accepted, sender, net, sender_inc, credits, post_balances, now, batch_id):
+    """Transaction documents and balance chains; sender is the pre-update document
+
+    A hot account (hot_accounts.py) has no running balance: its rows record
+    None, as its post_balances entry does."""
+    hot = bool(sender.get('balance_slots'))
+    balance_before = sender['balance']
+    running = balance_before
+    recipient_running = {
+        rid: post_balances[rid] - entry['amount']
+        for rid, entry in credits.items() if post_balances[rid] is not None
+    }
+    transactions = []
+
+    for item in accepted:
+        before = running
+        if item.op == 'deposit':
+            running += item.amount
+            description = f'Deposit of {money.format_rupees(item.amount)}'
+        elif item.op == 'withdraw':
+            running -= item.amount
+            description = f'Withdrawal of {money.format_rupees(item.amount)}'
+        else:
+            running -= item.amount
+            description = f'Transfer to {item.to_account}'
+
+        transaction = {
+            'account_id': sender['_id'],
+            'type': item.txn_type,
+            'amount': item.amount,
+            'balance_before': None if hot else before,
+            'balance_after': None if hot else running,
+            'timestamp': now,
+            'description': description,
+            'batch_id': batch_id
+        }
+        if item.op == 'transfer':
+            transaction['to_account'] = item.to_account
+            rid = item.recipient['_id']
+            recipient_before = recipient_running.get(rid)
+            if recipient_before is not None:
+                recipient_running[rid] += item.amount
+            transactions.append(transaction)
+            transaction = {
+                'account_id': rid,
+                'type': 'transfer_in',
+                'amount': item.amount,
+                'balance_before': recipient_before,
+                'balance_after': recipient_running.get(rid),
+                'from_account': sender['account_number'],
+                'timestamp': now,
+                'description': f'Transfer from {sender["account_number"]}',
+                'batch_id': batch_id
+            }
+        transactions.append(transaction)
+
+    apply_inc(sender, sender_inc)
+    sender['balance'] = balance_before + net
+    if hot:
+        return BatchResult(items, sender, None, None, post_balances, transactions)
+    return BatchResult(items, sender, balance_before, sender['balance'], post_balances, transactions)
+
+
+class BatchProcessor:
+    def __init__(self, client, accounts_collection):
+        self.client = client
+        self.accounts = accounts_collection
+
+    def _resolve_recipients(self, user_id, items):
+        numbers = {item.to_account for item in items if item.op == 'transfer' and not item.error}
+        if not numbers:
+            return
+        found = {
+            account['account_number']: account
+            for account in self.accounts.find(
+                {'account_number': {'$in': list(numbers)}},
+                {'_id': 1, 'user_id': 1, 'account_number': 1}
+            )
+        }
+        for item in items:
+            if item.op == 'transfer' and not item.error:
+                assign_recipient(item, found.get(item.to_account), user_id)
+
+    def run(self, user_id, mode, items, now, batch_id=None):
+        user_id = ObjectId(user_id)
+        batch_id = batch_id or ObjectId()
+
+        check_batch(mode, items)
+        self._resolve_recipients(user_id, items)
+
+        conflicts = 0
+        while True:
+            snapshot = self.accounts.find_one({'user_id': user_id}, {'balance': 1})
+            if snapshot is None:
+                return None
+            accepted, net, required = plan(items, snapshot['balance'], mode)
+            try:
+                return self._apply(user_id, items, accepted, net, required, now, batch_id)
+            except BatchConflict:
+                conflicts += 1
+                if conflicts == MAX_ATTEMPTS:
+                    raise
+            except RecipientMissing as e:
+                # Nothing of the attempt is left applied; an atomic batch is
+                # now rejected, a best_effort one goes on without the recipient
+                drop_recipient(items, e.recipient_id)
+                check_batch(mode, items)
+
+    def _apply(self, user_id, items, accepted, net, required, now, batch_id):
+        sender_inc, credits = increments(accepted, now)
+
+        def callback(session):
+            sender = self.accounts.find_one_and_update(
+                {'user_id': user_id, 'balance': {'$gte': required}},
+                {'$inc': dict(sender_inc, balance=net)},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if sender is None:
+                raise BatchConflict()
+
+            post_balances = {}
+            for rid, entry in credits.items():
+                recipient = self.accounts.find_one_and_update(
+                    {'_id': rid}, {'$inc': credit_inc(entry)},
+                    projection={'balance': 1, 'balance_slots': 1}, return_document=ReturnDocument.AFTER, session=session
+                )
+                if recipient is None:
+                    if session is None:
+                        # No transaction to abort: back out this attempt's writes
+                        self._undo(sender['_id'], dict(sender_inc, balance=net), credits, post_balances)
+                    raise RecipientMissing(rid)
+                post_balances[rid] = None if recipient.get('balance_slots') else recipient['balance']
+            return sender, post_balances
+
+        sender, post_balances = mongo.run_in_transaction(self.client, callback)
+        return build_result(items, accepted, sender, net, sender_inc, credits, post_balances, now, batch_id)
+
+    def _undo(self, sender_id, sender_update, credits, applied):
+        for rid in applied:
+            self.accounts.update_one({'_id': rid}, {'$inc': reverse(credit_inc(credits[rid]))})
+        self.accounts.update_one({'_id': sender_id}, {'$inc': reverse(sender_update)})
+
+
+class AsyncBatchProcessor:
+    """BatchProcessor for a Motor client and accounts collection"""
+
+    def __init__(self, client, accounts_collection):
+        self.client = client
+        self.accounts = accounts_collection
+
+    async def _resolve_recipients(self, user_id, items):
+        numbers = {item.to_account for item in items if item.op == 'transfer' and not item.error}
+        if not numbers:
+            return
+        found = {
+            account['account_number']: account
+            async for account in self.accounts.find(
+                {'account_number': {'$in': list(numbers)}},
+                {'_id': 1, 'user_id': 1, 'account_number': 1}
+            )
+        }
+        for item in items:
+            if item.op == 'transfer' and not item.error:
+                assign_recipient(item, found.get(item.to_account), user_id)
+
+    async def run(self, user_id, mode, items, now, batch_id=None):
+        user_id = ObjectId(user_id)
+        batch_id = batch_id or ObjectId()
+
+        check_batch(mode, items)
+        await self._resolve_recipients(user_id, items)
+
+        conflicts = 0
+        while True:
+            snapshot = await self.accounts.find_one({'user_id': user_id}, {'balance': 1})
+            if snapshot is None:
+                return None
+            accepted, net, required = plan(items, snapshot['balance'], mode)
+            try:
+                return await self._apply(user_id, items, accepted, net, required, now, batch_id)
+            except BatchConflict:
+                conflicts += 1
+                if conflicts == MAX_ATTEMPTS:
+                    raise
+            except RecipientMissing as e:
+                # Nothing of the attempt is left applied; an atomic batch is
+                # now rejected, a best_effort one goes on without the recipient
+                drop_recipient(items, e.recipient_id)
+                check_batch(mode, items)
+
+    async def _apply(self, user_id, items, accepted, net, required, now, batch_id):
+        sender_inc, credits = increments(accepted, now)
+
+        async def callback(session):
+            sender = await self.accounts.find_one_and_update(
+                {'user_id': user_id, 'balance': {'$gte': required}},
+                {'$inc': dict(sender_inc, balance=net)},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if sender is None:
+                raise BatchConflict()
+
+            post_balances = {}
+            for rid, entry in credits.items():
+                recipient = await self.accounts.find_one_and_update(
+                    {'_id': rid}, {'$inc': credit_inc(entry)},
+                    projection={'balance': 1, 'balance_slots': 1}, return_document=ReturnDocument.AFTER, session=session
+                )
+                if recipient is None:
+                    if session is None:
+                        await self._undo(sender['_id'], dict(sender_inc, balance=net), credits, post_balances)
+                    raise RecipientMissing(rid)
+                post_balances[rid] = None if recipient.get('balance_slots') else recipient['balance']
+            return sender, post_balances
+
+        sender, post_balances = await mongo.run_in_transaction_async(self.client, callback)
+        return build_result(items, accepted, sender, net, sender_inc, credits, post_balances, now, batch_id)
+
+    async def _undo(self, sender_id, sender_update, credits, applied):
+        for rid in applied:
+            await self.accounts.update_one({'_id': rid}, {'$inc': reverse(credit_inc(credits[rid]))})
+        await self.accounts.update_one({'_id': sender_id}, {'$inc': reverse(sender_update)})
@@ -0,0 +1,78 @@
+# Concurrency benchmark: read-modify-write vs atomic $inc balance updates
+#
+# Usage (from the backend directory):
+#   python benchmarks/bench_balance_engine.py --threads 32 --ops 200
+#
+# Uses MONGODB_URI (any mongodb:// or mongodb+srv:// URI) and a throwaway
+# database. Every thread deposits 1.0 into the same hot account, so the
+# final balance must equal threads * ops; anything less is a lost update.
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from balance_engine import BalanceEngine
+
+
+def legacy_deposit(accounts, account_id, amount):
+    account = accounts.find_one({'_id': account_id})
+    accounts.update_one({'_id': account_id}, {'$set': {'balance': account['balance'] + amount}})
+
+
+def engine_deposit(engine, account_id, amount):
+    engine.credit({'_id': account_id}, amount)
+
+
+def run(name, accounts, deposit, threads, ops):
+    account_id = accounts.insert_one({'account_number': f'bench-{name}', 'balance': 0}).inserted_id
+
+    def worker(_):
+        for _ in range(ops):
+            deposit(account_id, 1)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - started
+
+    expected = threads * ops
+    actual = accounts.find_one({'_id': account_id})['balance']
+    print(f"{name:<22} {expected / elapsed:>10.1f} ops/s   "
+          f"expected={expected:.0f} actual={actual:.0f} lost={expected - actual:.0f}")
+    return expected / elapsed
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Balance update concurrency benchmark')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--ops', type=int, default=200, help='deposits per thread')
+    parser.add_argument('--uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri, maxPoolSize=args.threads)
+    db_name = 'bench_balance_engine'
+    client.drop_database(db_name)
+    accounts = client[db_name]['accounts']
+    engine = BalanceEngine(accounts)
+
+    try:
+        legacy = run('read-modify-write', accounts,
+                     lambda account_id, amount: legacy_deposit(accounts, account_id, amount),
+                     args.threads, args.ops)
+        atomic = run('atomic $inc', accounts,
+                     lambda account_id, amount: engine_deposit(engine, account_id, amount),
+                     args.threads, args.ops)
+        print(f"speedup: {atomic / legacy:.2f}x")
+    finally:
+        client.drop_database(db_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Hot-account benchmark: credits to one account document vs sharded slots
+#
+# Usage (from the backend directory):
+#   python benchmarks/bench_hot_account.py --threads 32 --ops 200 --slots 8
+#
+# Uses MONGODB_URI (any mongodb:// or mongodb+srv:// URI) and a throwaway
+# database. Every thread credits 1.0 to the same account, first as an
+# ordinary account and then with --slots sub-balances; after compaction the
+# balance must equal threads * ops in both runs.
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from hot_accounts import ShardedBalanceEngine
+
+
+def run(name, engine, slots, threads, ops):
+    accounts = engine.accounts
+    account_number = f'bench-{name}'
+    account_id = accounts.insert_one({'account_number': account_number, 'balance': 0}).inserted_id
+    if slots > 1:
+        engine.enable(account_number, slots)
+    engine._refresh()
+
+    def worker(_):
+        for _ in range(ops):
+            engine.credit({'_id': account_id}, 1)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - started
+
+    engine.consolidate(account_id)
+    expected = threads * ops
+    actual = accounts.find_one({'_id': account_id})['balance']
+    print(f"{name:<14} {expected / elapsed:>10.1f} credits/s   expected={expected:.0f} actual={actual:.0f}")
+    return expected / elapsed
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Hot account credit throughput benchmark')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--ops', type=int, default=200, help='credits per thread')
+    parser.add_argument('--slots', type=int, default=8)
+    parser.add_argument('--uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri, maxPoolSize=args.threads)
+    db_name = 'bench_hot_account'
+    client.drop_database(db_name)
+    db = client[db_name]
+    engine = ShardedBalanceEngine(client, db['accounts'], db['balance_slots'])
+    engine.create_indexes()
+
+    try:
+        single = run('single', engine, 1, args.threads, args.ops)
+        sharded = run(f'{args.slots} slots', engine, args.slots, args.threads, args.ops)
+        print(f"speedup: {sharded / single:.2f}x")
+    finally:
+        client.drop_database(db_name)
+
+
+if __name__ == '__main__':
+    main()
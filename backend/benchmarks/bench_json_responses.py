@@ -0,0 +1,158 @@
+# Serialization cost of a history page, per response
+#
+# Usage (from the backend directory):
+#   python benchmarks/bench_json_responses.py --rows 100 --repeat 2000
+#   python benchmarks/bench_json_responses.py --mongo      # also time the two query paths
+#
+# Builds one page of --rows transaction documents and times turning it into
+# response bytes three ways:
+#   before      per-row str()/strftime/rupees in Python, then Flask's default
+#               (stdlib) provider, as app.py did
+#   stdlib      rows already shaped by the query (ROW_PROJECTION), stdlib json
+#   orjson      rows already shaped by the query, orjson (json_provider.py)
+# All three must decode to the same rows (the bytes may differ, e.g. 1e16
+# vs 1e+16; see json_provider.py). With --mongo the page is also fetched
+# from a throwaway database (bench_json_responses) with find() + Python
+# shaping and with the $project pipeline, to include the query side.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bson.objectid import ObjectId
+from bson.int64 import Int64
+from dotenv import load_dotenv
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import history
+import json_provider
+
+
+def make_documents(rows, seed):
+    rng = random.Random(seed)
+    account_id = ObjectId()
+    balance = 0
+    now = datetime(2026, 10, 1)
+    documents = []
+    for _ in range(rows):
+        amount = rng.randint(100, 5000000)
+        txn_type = rng.choice(['deposit', 'withdrawal', 'transfer_in', 'transfer_out'])
+        sign = 1 if txn_type in ('deposit', 'transfer_in') else -1
+        document = {
+            '_id': ObjectId(), 'account_id': account_id, 'type': txn_type, 'amount': Int64(amount),
+            'balance_before': Int64(balance), 'balance_after': Int64(balance + sign * amount),
+            'timestamp': now, 'description': f'{txn_type} of Rs.{amount / 100:,.2f}'
+        }
+        if txn_type == 'transfer_out':
+            document['to_account'] = '2001000000014'
+        elif txn_type == 'transfer_in':
+            document['from_account'] = '2001000000022'
+        balance += sign * amount
+        now -= timedelta(minutes=rng.randint(1, 600), milliseconds=rng.randint(0, 999))
+        documents.append(document)
+    return documents
+
+
+def before(documents, provider):
+    """The pre-projection path: mutate every document, then the stdlib encoder"""
+    rows = []
+    for t in documents:
+        t = dict(t)
+        t['_id'] = str(t['_id'])
+        t['account_id'] = str(t['account_id'])
+        for field in history.MONEY_FIELDS:
+            t[field] = t[field] / 100
+        t['date'] = t['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+        rows.append(t)
+    return provider.dumps({'success': True, 'transactions': rows}).encode('utf-8')
+
+
+def stdlib(rows):
+    return json.dumps({'success': True, 'transactions': rows}, default=json_provider._default,
+                      sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def fast(rows):
+    return json_provider.dumps({'success': True, 'transactions': rows})
+
+
+def per_call(repeat, fn, *args):
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn(*args)
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+
+def bench_mongo(uri, documents, repeat):
+    from pymongo import MongoClient
+
+    client = MongoClient(uri)
+    db_name = 'bench_json_responses'
+    collection = client[db_name]['transactions']
+    try:
+        collection.drop()
+        collection.create_index(history.HISTORY_INDEX)
+        collection.insert_many([dict(d) for d in documents])
+        account_id = documents[0]['account_id']
+        limit = len(documents)
+
+        def find_and_shape():
+            return [history.serialize_transaction(t) for t in
+                    collection.find({'account_id': account_id}).sort(history.HISTORY_SORT).limit(limit)]
+
+        def project():
+            return history.fetch_recent(collection, account_id, limit)
+
+        assert find_and_shape() == project()
+        for name, fn in (('find + Python', find_and_shape), ('$project', project)):
+            print(f"{name:<16} {per_call(repeat, fn) * 1e6:>10.1f} us/page")
+    finally:
+        client.drop_database(db_name)
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='History page serialization benchmark')
+    parser.add_argument('--rows', type=int, default=history.DEFAULT_PAGE_SIZE)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mongo', action='store_true', help='also time find() vs the $project pipeline')
+    parser.add_argument('--uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    args = parser.parse_args()
+
+    documents = make_documents(args.rows, args.seed)
+    shaped = [history.serialize_transaction(t) for t in documents]
+    provider = DefaultJSONProvider(Flask(__name__))
+    provider.compact = True
+
+    outputs = {'before': before(documents, provider), 'stdlib': stdlib(shaped), 'orjson': fast(shaped)}
+    expected = [{k: v for k, v in row.items() if k != 'account_id'}
+                for row in json.loads(outputs['before'])['transactions']]
+    for name, body in outputs.items():
+        assert [{k: v for k, v in row.items() if k != 'account_id'}
+                for row in json.loads(body)['transactions']] == expected, name
+
+    print(f"{args.rows} rows per response, {len(outputs['orjson']):,} bytes"
+          f" (orjson {'installed' if json_provider.orjson is not None else 'NOT installed'})")
+    baseline = per_call(args.repeat, before, documents, provider)
+    print(f"{'before':<16} {baseline * 1e6:>10.1f} us/response")
+    for name, fn in (('stdlib', stdlib), ('orjson', fast)):
+        seconds = per_call(args.repeat, fn, shaped)
+        print(f"{name:<16} {seconds * 1e6:>10.1f} us/response  ({baseline / seconds:.1f}x)")
+
+    if args.mongo:
+        bench_mongo(args.uri, documents, max(1, args.repeat // 10))
+
+
+if __name__ == '__main__':
+    main()
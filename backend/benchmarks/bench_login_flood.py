@@ -0,0 +1,134 @@
+# Balance-endpoint latency during a login flood
+#
+# Start the server (python app.py, gunicorn or uvicorn asgi_app:app), then
+# run (from the backend directory):
+#   python benchmarks/bench_login_flood.py --readers 50 --flooders 200 --duration 15
+#
+# Phase 1 measures GET /api/account/balance alone; phase 2 repeats it while
+# --flooders sessions hammer POST /api/auth/login. With the bounded hashing
+# pool the balance p99 should stay close to the baseline, and excess logins
+# should come back as fast 503s instead of queueing.
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from http_load import AsyncSession, summarize, timed
+
+PASSWORD = 'bench-password'
+
+
+async def seed_user(base_url):
+    session = AsyncSession(base_url)
+    email = f'flood-{uuid.uuid4().hex[:8]}@example.com'
+    status, _, body = await session.request('POST', '/api/auth/register', {
+        'name': 'Flood Bench',
+        'email': email,
+        'phone': '9000000000',
+        'password': PASSWORD
+    })
+    await session.close()
+    if status != 200:
+        raise RuntimeError(f'Registration failed: {body[:200]!r}')
+    return email, session.cookie
+
+
+async def read_balances(base_url, cookie, readers, deadline):
+    latencies = []
+    errors = 0
+
+    async def reader():
+        nonlocal errors
+        session = AsyncSession(base_url)
+        session.cookie = cookie
+        try:
+            while time.perf_counter() < deadline:
+                elapsed, status, _ = await timed(session, 'GET', '/api/account/balance')
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            errors += 1
+        finally:
+            await session.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(reader() for _ in range(readers)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def flood_logins(base_url, email, flooders, deadline):
+    counts = {'ok': 0, 'busy': 0, 'other': 0}
+    latencies = []
+
+    async def flooder():
+        session = AsyncSession(base_url)
+        try:
+            while time.perf_counter() < deadline:
+                elapsed, status, _ = await timed(session, 'POST', '/api/auth/login',
+                                                 {'email': email, 'password': PASSWORD})
+                latencies.append(elapsed)
+                if status == 200:
+                    counts['ok'] += 1
+                elif status in (429, 503):
+                    counts['busy'] += 1
+                else:
+                    counts['other'] += 1
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            counts['other'] += 1
+        finally:
+            await session.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(flooder() for _ in range(flooders)))
+    result = summarize(latencies, counts['other'], time.perf_counter() - started)
+    result.update(logins_ok=counts['ok'], logins_rejected=counts['busy'])
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Balance latency with and without a login flood')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--readers', type=int, default=50, help='concurrent balance readers')
+    parser.add_argument('--flooders', type=int, default=200, help='concurrent login sessions')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds per phase')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    email, cookie = await seed_user(args.url)
+
+    baseline = await read_balances(args.url, cookie, args.readers, time.perf_counter() + args.duration)
+
+    deadline = time.perf_counter() + args.duration
+    flooded, logins = await asyncio.gather(
+        read_balances(args.url, cookie, args.readers, deadline),
+        flood_logins(args.url, email, args.flooders, deadline)
+    )
+
+    for name, r in (('baseline', baseline), ('during flood', flooded)):
+        print(f"balance {name}: {r['throughput_rps']:.1f} req/s  p50={r['p50_ms']:.1f}ms  "
+              f"p99={r['p99_ms']:.1f}ms  errors={r['errors']}")
+    print(f"logins: {logins['logins_ok']} ok  {logins['logins_rejected']} rejected (503)  "
+          f"p99={logins['p99_ms']:.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'readers': args.readers,
+                'flooders': args.flooders,
+                'duration': args.duration,
+                'baseline': baseline,
+                'flood': flooded,
+                'logins': logins
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+# Server-side money aggregation: float rupees vs int64 paise vs Decimal128
+#
+# Usage (from the backend directory):
+#   python benchmarks/bench_money_aggregation.py --docs 500000 --accounts 1000
+#
+# Writes the same seeded transactions three times into a throwaway database
+# (bench_money_aggregation): amounts as float rupees (the old layout), as
+# int64 paise and as Decimal128 rupees. Then times a per-account $group/$sum
+# (as account_stats.py rebuild runs) and a grand total on each. Reports the
+# best of --repeat runs, the collection size, and how far each grand total is
+# from the exact one. Only the float layout drifts.
+
+import os
+import sys
+import time
+import random
+import argparse
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from bson.decimal128 import Decimal128
+from bson.int64 import Int64
+
+LAYOUTS = {
+    'float rupees': lambda paise: paise / 100,
+    'int64 paise': lambda paise: Int64(paise),
+    'Decimal128 rupees': lambda paise: Decimal128(Decimal(paise).scaleb(-2)),
+}
+INSERT_BATCH = 10000
+
+
+def seed_amounts(docs, accounts, seed):
+    rng = random.Random(seed)
+    # Up to Rs.50,000.00 with arbitrary paise
+    return [(rng.randrange(accounts), rng.randint(1, 5000000)) for _ in range(docs)]
+
+
+def load(collection, amounts, to_stored):
+    collection.drop()
+    batch = []
+    for account, paise in amounts:
+        batch.append({'account_id': account, 'type': 'deposit', 'amount': to_stored(paise)})
+        if len(batch) >= INSERT_BATCH:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def best_of(repeat, fn):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def as_decimal(value):
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(repr(value))
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Money aggregation benchmark by storage layout')
+    parser.add_argument('--docs', type=int, default=200000)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark database')
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    db_name = 'bench_money_aggregation'
+    db = client[db_name]
+
+    amounts = seed_amounts(args.docs, args.accounts, args.seed)
+    exact = Decimal(sum(paise for _, paise in amounts)).scaleb(-2)
+    per_account = [{'$group': {'_id': '$account_id', 'total': {'$sum': '$amount'}, 'count': {'$sum': 1}}}]
+    grand_total = [{'$group': {'_id': None, 'total': {'$sum': '$amount'}}}]
+
+    print(f"{args.docs:,} transactions over {args.accounts:,} accounts, exact total Rs.{exact:,}")
+    print(f"{'layout':<18} {'group (s)':>10} {'docs/s':>12} {'total (s)':>10} {'MB':>8}   error vs exact")
+    try:
+        for name, to_stored in LAYOUTS.items():
+            collection = db[name.replace(' ', '_')]
+            load(collection, amounts, to_stored)
+            group_seconds, groups = best_of(args.repeat, lambda: list(collection.aggregate(per_account)))
+            total_seconds, rows = best_of(args.repeat, lambda: list(collection.aggregate(grand_total)))
+
+            total = as_decimal(rows[0]['total'])
+            if name == 'int64 paise':
+                total = total.scaleb(-2)
+            size_mb = db.command('collStats', collection.name)['size'] / 1e6
+            print(f"{name:<18} {group_seconds:>10.3f} {args.docs / group_seconds:>12,.0f} "
+                  f"{total_seconds:>10.3f} {size_mb:>8.1f}   {total - exact:+}  ({len(groups):,} groups)")
+    finally:
+        if not args.keep:
+            client.drop_database(db_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# Reconciliation throughput by worker count
+#
+# Usage (from the backend directory):
+#   python benchmarks/bench_reconcile.py --accounts 20000 --transactions 2000000 --workers 1 4 8
+#
+# Seeds a throwaway database (bench_reconcile) with a consistent ledger:
+# deposits, withdrawals and transfers between random accounts, each row with
+# its balance_before/balance_after chain, and the final balances on the
+# accounts. Then runs reconcile.py with each --workers value and reports
+# rows/s. A clean ledger must give zero discrepancies; --corrupt N breaks N
+# random balances first, and exactly N balance findings are expected.
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from bson.int64 import Int64
+
+import reconcile
+from history import HISTORY_INDEX
+
+INSERT_BATCH = 10000
+
+
+def seed(db, accounts, transactions, seed_value):
+    rng = random.Random(seed_value)
+    db['accounts'].drop()
+    db['transactions'].drop()
+    db['balance_slots'].drop()
+    db['transactions'].create_index(HISTORY_INDEX)
+
+    numbers = [f'2001{i:08d}0' for i in range(accounts)]
+    ids = db['accounts'].insert_many([{'account_number': number, 'balance': Int64(0)} for number in numbers]).inserted_ids
+    numbers = dict(zip(ids, numbers))
+    balances = dict.fromkeys(ids, 0)
+    now = datetime(2026, 1, 1)
+    batch = []
+
+    def row(account_id, txn_type, amount, sign, **extra):
+        before = balances[account_id]
+        balances[account_id] = before + sign * amount
+        batch.append(dict(extra, account_id=account_id, type=txn_type, amount=Int64(amount),
+                          balance_before=Int64(before), balance_after=Int64(balances[account_id]),
+                          timestamp=now))
+
+    written = 0
+    while written < transactions:
+        now += timedelta(milliseconds=rng.randint(1, 50))
+        account_id = rng.choice(ids)
+        amount = rng.randint(100, 500000)
+        kind = rng.random()
+        if kind < 0.5 or balances[account_id] < amount:
+            row(account_id, 'deposit', amount, 1)
+            written += 1
+        elif kind < 0.7:
+            row(account_id, 'withdrawal', amount, -1)
+            written += 1
+        else:
+            recipient = rng.choice(ids)
+            if recipient == account_id:
+                continue
+            row(account_id, 'transfer_out', amount, -1, to_account=numbers[recipient])
+            row(recipient, 'transfer_in', amount, 1, from_account=numbers[account_id])
+            written += 2
+        if len(batch) >= INSERT_BATCH:
+            db['transactions'].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db['transactions'].insert_many(batch, ordered=False)
+
+    for account_id, balance in balances.items():
+        db['accounts'].update_one({'_id': account_id}, {'$set': {'balance': Int64(balance)}})
+    return ids
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Reconciliation throughput benchmark')
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--transactions', type=int, default=500000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--shard-size', type=int, default=reconcile.DEFAULT_SHARD_SIZE)
+    parser.add_argument('--corrupt', type=int, default=0, help='balances to break before auditing')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark database')
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    db_name = 'bench_reconcile'
+    db = client[db_name]
+    try:
+        started = time.perf_counter()
+        ids = seed(db, args.accounts, args.transactions, args.seed)
+        print(f"Seeded {args.accounts:,} accounts and {args.transactions:,} transactions "
+              f"in {time.perf_counter() - started:.1f}s")
+        for account_id in random.Random(args.seed).sample(ids, args.corrupt):
+            db['accounts'].update_one({'_id': account_id}, {'$inc': {'balance': 1}})
+
+        print(f"{'workers':>8} {'seconds':>10} {'rows/s':>12}   discrepancies")
+        for workers in args.workers:
+            report = reconcile.reconcile(db, workers, args.uri, db_name, shard_size=args.shard_size)
+            found = {check: count for check, count in report['discrepancies'].items() if count}
+            print(f"{workers:>8} {report['seconds']:>10.2f} "
+                  f"{report['transactions'] / report['seconds']:>12,.0f}   {found or 'none'}")
+    finally:
+        if not args.keep:
+            client.drop_database(db_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Registration throughput and account number uniqueness
+#
+# Usage (from the backend directory):
+#   python benchmarks/bench_registrations.py --local --count 2000 --concurrency 32
+#   python benchmarks/bench_registrations.py --url http://127.0.0.1:5000 --count 2000
+#
+# Registers --count new users from --concurrency concurrent sessions and
+# reports registrations per second, latency percentiles, and how many of the
+# returned account numbers were duplicates or failed their check digit (both
+# must be 0). 503s from the password hashing pool are retried and counted.
+# --local spawns app.py on the in-memory backend with cheap password hashes,
+# so the number measures the registration path itself.
+#
+# --allocator-only skips HTTP and measures AccountNumberAllocator against the
+# in-memory counter, reporting numbers per second and counter round trips.
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from http_load import AsyncSession, summarize, timed
+from load_test import start_local_server, free_port
+from account_numbers import AccountNumberAllocator, is_valid
+
+
+async def register_all(base_url, count, concurrency):
+    run_id = uuid.uuid4().hex[:8]
+    latencies = []
+    numbers = []
+    errors = 0
+    busy = 0
+    remaining = iter(range(count))
+
+    async def worker():
+        nonlocal errors, busy
+        for i in remaining:
+            session = AsyncSession(base_url)
+            try:
+                while True:
+                    elapsed, status, body = await timed(session, 'POST', '/api/auth/register', {
+                        'name': f'Reg {i}', 'email': f'reg-{run_id}-{i}@example.com',
+                        'phone': '9000000000', 'password': 'bench-password'
+                    })
+                    if status != 503:
+                        break
+                    # The hashing pool is full; back off as Retry-After asks
+                    busy += 1
+                    await asyncio.sleep(0.05)
+            finally:
+                await session.close()
+            if status == 200:
+                latencies.append(elapsed)
+                numbers.append(json.loads(body)['account_number'])
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed), numbers, busy
+
+
+def bench_allocator(count, threads, block_size):
+    counter = {'value': 0, 'round_trips': 0}
+
+    def reserve(size):
+        counter['round_trips'] += 1
+        start = counter['value']
+        counter['value'] += size
+        return start
+
+    allocator = AccountNumberAllocator(reserve, block_size=block_size)
+    per_thread = count // threads
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        batches = list(pool.map(lambda _: [allocator.next() for _ in range(per_thread)], range(threads)))
+    elapsed = time.perf_counter() - started
+
+    numbers = [n for batch in batches for n in batch]
+    print(f"allocated {len(numbers)} numbers in {elapsed:.3f}s ({len(numbers) / elapsed:,.0f}/s), "
+          f"{counter['round_trips']} counter round trips, "
+          f"duplicates={len(numbers) - len(set(numbers))}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Registration throughput benchmark')
+    parser.add_argument('--url', help='server to register against')
+    parser.add_argument('--local', action='store_true', help='spawn app.py with STORAGE_BACKEND=memory')
+    parser.add_argument('--count', type=int, default=1000, help='registrations')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--allocator-only', action='store_true')
+    parser.add_argument('--block-size', type=int, default=1000, help='allocator block size (--allocator-only)')
+    args = parser.parse_args()
+
+    if args.allocator_only:
+        bench_allocator(args.count, args.concurrency, args.block_size)
+        return 0
+    if not args.url and not args.local:
+        parser.error('pass --url, --local or --allocator-only')
+
+    server = None
+    if args.local:
+        server, args.url = start_local_server(free_port())
+    try:
+        result, numbers, busy = await register_all(args.url, args.count, args.concurrency)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    duplicates = len(numbers) - len(set(numbers))
+    invalid = sum(1 for n in numbers if not is_valid(n))
+    print(f"registrations/s {result['throughput_rps']:.1f}   p50 {result['p50_ms']:.2f} ms   "
+          f"p99 {result['p99_ms']:.2f} ms   errors {result['errors']}   503 retries {busy}")
+    print(f"account numbers: {len(numbers)} issued, duplicates={duplicates}, bad check digit={invalid}")
+    return 1 if duplicates or invalid else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,98 @@
+# Load-test comparison: threaded WSGI (app.py) vs async ASGI (asgi_app.py)
+#
+# Start both servers against the same database, e.g.
+#   python app.py                                      # :5000
+#   uvicorn asgi_app:app --port 8000
+# then run (from the backend directory):
+#   python benchmarks/compare_wsgi_asgi.py --sessions 1000 --duration 20
+#
+# A handful of users are registered per target (password hashing is
+# deliberately slow); every simulated session reuses one of their cookies
+# and loops over GET /api/account/balance (80%) and POST deposit (20%).
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from http_load import AsyncSession, summarize, timed
+
+
+async def seed_cookies(base_url, users):
+    cookies = []
+    run_id = uuid.uuid4().hex[:8]
+    for i in range(users):
+        session = AsyncSession(base_url)
+        status, _, body = await session.request('POST', '/api/auth/register', {
+            'name': f'Bench {i}',
+            'email': f'bench-{run_id}-{i}@example.com',
+            'phone': '9000000000',
+            'password': 'bench-password'
+        })
+        if status != 200:
+            raise RuntimeError(f'Registration failed on {base_url}: {body[:200]!r}')
+        cookies.append(session.cookie)
+        await session.close()
+    return cookies
+
+
+async def drive(base_url, cookies, sessions, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def user(cookie):
+        nonlocal errors
+        session = AsyncSession(base_url)
+        session.cookie = cookie
+        try:
+            while time.perf_counter() < deadline:
+                if random.random() < 0.8:
+                    elapsed, status, _ = await timed(session, 'GET', '/api/account/balance')
+                else:
+                    elapsed, status, _ = await timed(session, 'POST', '/api/transactions/deposit', {'amount': 1})
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            errors += 1
+        finally:
+            await session.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(cookies[i % len(cookies)]) for i in range(sessions)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Compare WSGI and ASGI entry points under load')
+    parser.add_argument('--wsgi-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--asgi-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--sessions', type=int, default=500, help='concurrent simulated sessions')
+    parser.add_argument('--users', type=int, default=10, help='registered users shared by the sessions')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per target')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for name, url in (('wsgi', args.wsgi_url), ('asgi', args.asgi_url)):
+        cookies = await seed_cookies(url, args.users)
+        results[name] = await drive(url, cookies, args.sessions, args.duration)
+        r = results[name]
+        print(f"{name}: {r['throughput_rps']:.1f} req/s  p50={r['p50_ms']:.1f}ms  "
+              f"p99={r['p99_ms']:.1f}ms  errors={r['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'sessions': args.sessions, 'duration': args.duration, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
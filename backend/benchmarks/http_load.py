@@ -0,0 +1,117 @@
+# Minimal asyncio HTTP/1.1 load generator (stdlib only)
+# One AsyncSession per simulated user, each with its own keep-alive
+# connection and session cookie, so thousands of concurrent sessions can be
+# driven from a single process.
+
+import json
+import time
+import asyncio
+from urllib.parse import urlsplit
+
+
+class AsyncSession:
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.cookie = None
+        self._reader = None
+        self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._writer = None
+
+    async def request(self, method, path, payload=None, headers=None):
+        """Return (status, headers, body bytes)"""
+        body = json.dumps(payload).encode() if payload is not None else b''
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                 f'Content-Length: {len(body)}']
+        if payload is not None:
+            lines.append('Content-Type: application/json')
+        if self.cookie:
+            lines.append(f'Cookie: session={self.cookie}')
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}')
+        raw = ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+        for attempt in range(2):
+            if self._writer is None:
+                await self._connect()
+            try:
+                self._writer.write(raw)
+                await self._writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Server closed an idle keep-alive connection; retry once
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _read_response(self):
+        status_line = await self._reader.readuntil(b'\r\n')
+        version, status = status_line.decode().split(' ', 2)[:2]
+        headers = {}
+        while True:
+            line = await self._reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, value = line.decode().split(':', 1)
+            name = name.strip().lower()
+            value = value.strip()
+            if name == 'set-cookie' and value.startswith('session='):
+                self.cookie = value.split(';', 1)[0][len('session='):] or None
+            headers[name] = value
+
+        if headers.get('transfer-encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int((await self._reader.readuntil(b'\r\n')).strip(), 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                body += chunk[:-2]
+        elif 'content-length' in headers:
+            body = await self._reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self._reader.read()
+
+        if version == 'HTTP/1.0' or headers.get('connection', '').lower() == 'close' \
+                or 'content-length' not in headers and 'transfer-encoding' not in headers:
+            await self.close()
+        return int(status), headers, body
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    """latencies: list of seconds; returns a JSON-friendly dict (ms)"""
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput_rps': len(ordered) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': (ordered[-1] if ordered else 0.0) * 1000
+    }
+
+
+async def timed(session, method, path, payload=None, headers=None):
+    started = time.perf_counter()
+    status, response_headers, body = await session.request(method, path, payload, headers)
+    return time.perf_counter() - started, status, body
@@ -0,0 +1,261 @@
+# Reproducible API load test
+#
+# Seeds --users users (each with a funded account), then --concurrency
+# sessions drive a weighted mix of endpoints for --duration seconds and the
+# per-endpoint throughput and p50/p95/p99 latencies are printed and saved.
+#
+# Against the in-process stand-in (spawns `python app.py` with
+# STORAGE_BACKEND=memory on a free port):
+#   python benchmarks/load_test.py --local --users 50 --concurrency 32 --output before.json
+# Against any running server:
+#   python benchmarks/load_test.py --url http://127.0.0.1:5000 --output after.json
+# Compare two runs (exit status 1 when a p99 regressed beyond --max-regression):
+#   python benchmarks/load_test.py --compare before.json after.json
+#
+# --seed fixes the operation sequence of every session, so two runs issue
+# the same requests in the same order.
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.request
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from http_load import AsyncSession, summarize, timed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'bench-password'
+SEED_BALANCE = 1000000
+
+DEFAULT_MIX = 'login=5,balance=40,deposit=20,transfer=15,history=20'
+ENDPOINTS = ('login', 'balance', 'deposit', 'transfer', 'history')
+
+
+def parse_mix(value):
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'unknown endpoint {name!r}; choose from {", ".join(ENDPOINTS)}')
+        weights[name] = float(weight or 1)
+    return weights
+
+
+# ==================== LOCAL SERVER ====================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(port):
+    env = dict(os.environ,
+               STORAGE_BACKEND='memory',
+               PORT=str(port),
+               LOG_LEVEL='WARNING',
+               # Seeding registers every user; keep hashing cheap on the stand-in
+               PASSWORD_HASH_METHOD=os.getenv('BENCH_PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000'))
+    # The dev server logs every request to stderr; a file never fills up like a pipe
+    log_file = tempfile.TemporaryFile()
+    server = subprocess.Popen([sys.executable, 'app.py'], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=log_file)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if server.poll() is not None:
+            log_file.seek(0)
+            raise RuntimeError(f'Local server exited: {log_file.read().decode()[-2000:]}')
+        try:
+            urllib.request.urlopen(f'{url}/api/auth/check', timeout=1).read()
+            return server, url
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('Local server did not start within 30 seconds')
+
+
+# ==================== SEEDING ====================
+
+async def seed_users(base_url, count):
+    run_id = uuid.uuid4().hex[:8]
+    users = []
+    for i in range(count):
+        session = AsyncSession(base_url)
+        email = f'load-{run_id}-{i}@example.com'
+        status, _, body = await session.request('POST', '/api/auth/register', {
+            'name': f'Load {i}', 'email': email, 'phone': '9000000000', 'password': PASSWORD
+        })
+        if status != 200:
+            raise RuntimeError(f'Registration failed: {body[:200]!r}')
+        account_number = json.loads(body)['account_number']
+        await session.request('POST', '/api/transactions/deposit', {'amount': SEED_BALANCE})
+        users.append({'email': email, 'account_number': account_number, 'cookie': session.cookie})
+        await session.close()
+    return users
+
+
+# ==================== LOAD ====================
+
+async def run_load(base_url, users, concurrency, duration, weights, seed):
+    latencies = {name: [] for name in weights}
+    errors = {name: 0 for name in weights}
+    names = list(weights)
+    cumulative = list(weights.values())
+    deadline = time.perf_counter() + duration
+
+    async def worker(index):
+        rng = random.Random(seed * 1000003 + index)
+        user = users[index % len(users)]
+        session = AsyncSession(base_url)
+        session.cookie = user['cookie']
+        op = names[0]
+        try:
+            while time.perf_counter() < deadline:
+                op = rng.choices(names, cumulative)[0]
+                if op == 'login':
+                    request = ('POST', '/api/auth/login', {'email': user['email'], 'password': PASSWORD})
+                elif op == 'balance':
+                    request = ('GET', '/api/account/balance', None)
+                elif op == 'deposit':
+                    request = ('POST', '/api/transactions/deposit', {'amount': 1})
+                elif op == 'transfer':
+                    other = users[rng.randrange(len(users))]
+                    if other is user:
+                        other = users[(users.index(user) + 1) % len(users)]
+                    request = ('POST', '/api/transactions/transfer',
+                               {'to_account': other['account_number'], 'amount': 1})
+                else:
+                    request = ('GET', '/api/transactions/history?limit=20', None)
+
+                elapsed, status, _ = await timed(session, *request)
+                if status == 200:
+                    latencies[op].append(elapsed)
+                else:
+                    errors[op] += 1
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            errors[op] += 1
+        finally:
+            await session.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    endpoints = {name: summarize(latencies[name], errors[name], elapsed) for name in names}
+    overall = summarize([v for values in latencies.values() for v in values], sum(errors.values()), elapsed)
+    return endpoints, overall
+
+
+# ==================== RESULTS ====================
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'endpoint':<10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    rows = list(results['endpoints'].items()) + [('overall', results['overall'])]
+    for name, r in rows:
+        print(f"{name:<10} {r['throughput_rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['p99_ms']:>8.2f} {r['errors']:>7}")
+
+
+def compare(before_path, after_path, max_regression):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"{before.get('git_revision') or before_path} -> {after.get('git_revision') or after_path}")
+    print(f"{'endpoint':<10} {'req/s':>16} {'p50 ms':>18} {'p99 ms':>18}")
+    regressions = []
+    names = [n for n in after['endpoints'] if n in before['endpoints']] + ['overall']
+    for name in names:
+        b = before['overall'] if name == 'overall' else before['endpoints'][name]
+        a = after['overall'] if name == 'overall' else after['endpoints'][name]
+
+        def change(key):
+            return (a[key] - b[key]) / b[key] if b[key] else 0.0
+
+        print(f"{name:<10} {a['throughput_rps']:>8.1f} ({change('throughput_rps'):+6.1%}) "
+              f"{a['p50_ms']:>8.2f} ({change('p50_ms'):+6.1%}) {a['p99_ms']:>8.2f} ({change('p99_ms'):+6.1%})")
+        if change('p99_ms') > max_regression:
+            regressions.append(name)
+
+    if regressions:
+        print(f"p99 regressed by more than {max_regression:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Seeded load test for the banking API')
+    parser.add_argument('--url', help='server to test (default with --local: a spawned in-memory server)')
+    parser.add_argument('--local', action='store_true', help='spawn app.py with STORAGE_BACKEND=memory')
+    parser.add_argument('--users', type=int, default=20, help='users to seed')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent sessions')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds of load')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'endpoint weights (default {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the operation sequence')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='allowed relative p99 increase in --compare mode (default 0.2)')
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare, args.max_regression)
+    if not args.url and not args.local:
+        parser.error('pass --url or --local')
+
+    server = None
+    if args.local:
+        server, args.url = start_local_server(free_port())
+    try:
+        users = await seed_users(args.url, args.users)
+        endpoints, overall = await run_load(args.url, users, args.concurrency, args.duration, args.mix, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = {
+        'git_revision': git_revision(),
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'target': 'local-memory' if args.local else args.url,
+        'python': platform.python_version(),
+        'config': {
+            'users': args.users, 'concurrency': args.concurrency, 'duration': args.duration,
+            'mix': args.mix, 'seed': args.seed
+        },
+        'endpoints': endpoints,
+        'overall': overall
+    }
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
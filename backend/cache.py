@@ -0,0 +1,105 @@
+# Cache building blocks
+# A per-process LRU with TTL, and an optional shared key/value backend
+# (sessions.py keeps sessions in it).
+#
+# Accounts are not cached: a cached balance is stale in every other worker
+# until its TTL runs out, and an identity-only entry saves nothing on the
+# endpoints that need the balance anyway. MongoDB serves account lookups
+# from the user_id and account_number indexes.
+#
+# The shared backend follows the redis-py get/set/delete API, so a
+# real Redis client can be dropped in; LocalSharedStore is an in-process
+# stand-in with the same interface for development and benchmarks.
+
+import time
+import threading
+from collections import OrderedDict
+
+import logs
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry time to live"""
+
+    def __init__(self, maxsize=10000, ttl=10.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedStore:
+    """In-process stand-in for a Redis server (bytes values, px expiry)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, px=None):
+        expires = time.monotonic() + px / 1000 if px else None
+        with self._lock:
+            self._data[name] = (value, expires)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+
+def shared_store_from_url(url):
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return LocalSharedStore()
+    if url.startswith(('redis://', 'rediss://')):
+        try:
+            import redis
+        except ImportError:
+            logs.get_logger('cache').warning('redis package not installed; shared store disabled')
+            return None
+        return redis.Redis.from_url(url)
+    raise ValueError(f'Unsupported shared cache URL: {url}')
@@ -0,0 +1,87 @@
+# Consolidated dashboard payload for GET /api/dashboard
+# Account info, running stats and recent transactions from one account
+# lookup, with optional field selection:
+#   /api/dashboard?fields=account,stats,transactions&limit=10
+#
+# The ETag is derived from the account document alone (balance, transaction
+# count, current month), so an unchanged dashboard is answered with 304
+# before the transactions collection is queried. It is only handed out when
+# the recent list already reflects the account's latest write (the ledger row
+# lands just after the balance update); otherwise callers fall back to an
+# ETag of the response body.
+
+import hashlib
+
+import money
+import history
+import account_stats
+from validation import ValidationError
+
+FIELDS = ('account', 'stats', 'transactions')
+DEFAULT_RECENT = 10
+MAX_RECENT = 50
+
+
+def parse_fields(value):
+    if not value:
+        return FIELDS
+    fields = tuple(f.strip() for f in value.split(',') if f.strip())
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown or not fields:
+        raise ValidationError(f'fields must be a comma-separated subset of: {", ".join(FIELDS)}')
+    # Canonical order so equivalent requests share an ETag
+    return tuple(f for f in FIELDS if f in fields)
+
+
+def parse_limit(value):
+    try:
+        limit = int(value) if value is not None else DEFAULT_RECENT
+    except ValueError:
+        raise ValidationError('limit must be an integer')
+    return max(1, min(limit, MAX_RECENT))
+
+
+def etag(account, fields, limit, now):
+    """Changes whenever anything the payload shows can change"""
+    summary = account_stats.summarize(account)
+    version = (
+        str(account['_id']), account['balance'], summary['transaction_count'],
+        account_stats.month_key(now), fields, limit
+    )
+    return hashlib.sha1(repr(version).encode()).hexdigest()
+
+
+def etag_safe(account, fields, transactions):
+    """True when the fetched rows (history rows) are as new as the account document"""
+    if 'transactions' not in fields:
+        return True
+    if not transactions:
+        return account_stats.summarize(account)['transaction_count'] == 0
+    return transactions[0]['balance_after'] == money.rupees(account['balance'])
+
+
+def account_info(account):
+    return {'account_number': account['account_number'], 'balance': money.rupees(account['balance'])}
+
+
+def stats(account, now):
+    summary = account_stats.summarize(account)
+    for field in account_stats.SUMMARY_FIELDS.values():
+        summary[field] = money.rupees(summary[field])
+    summary['balance'] = money.rupees(account['balance'])
+    summary['this_month'] = {
+        txn_type: {'total': money.rupees(bucket['total']), 'count': bucket['count']}
+        for txn_type, bucket in account_stats.monthly(account, account_stats.month_key(now)).items()
+    }
+    return summary
+
+
+def build(account, fields, transactions, now):
+    payload = {'success': True, 'has_account': True}
+    if 'account' in fields:
+        payload['account'] = account_info(account)
+    if 'stats' in fields:
+        payload['stats'] = stats(account, now)
+    if 'transactions' in fields:
+        payload['recent_transactions'] = transactions
+    return payload
@@ -0,0 +1,45 @@
+# Gunicorn configuration for the Flask (WSGI) app
+#
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# For the async entry point use uvicorn workers instead:
+#   GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi_app:app
+#
+# The app is imported once in the master (preload_app) to share memory
+# copy-on-write; the MongoDB client is created with connect=False, and each
+# worker connects and pre-warms its own pool after fork in post_worker_init.
+
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = 1000
+
+accesslog = None
+errorlog = '-'
+
+
+def is_asgi_worker(name):
+    return 'uvicorn' in name.lower()
+
+
+def post_worker_init(worker):
+    # ASGI workers build their Motor client in the app's startup hook; every
+    # other class (gthread, sync, gevent, ...) serves app.py and needs init_app
+    if is_asgi_worker(worker_class):
+        return
+    import app
+    # One pooled connection per worker thread (sync workers have one)
+    default_prewarm = threads if worker_class == 'gthread' else 1
+    app.init_app(prewarm_connections=int(os.getenv('MONGO_PREWARM_CONNECTIONS', default_prewarm)))
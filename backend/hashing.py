@@ -0,0 +1,127 @@
+# Password hashing on a bounded process pool
+# Hashing is deliberately CPU-expensive. Running it in worker processes keeps
+# it off the request threads (and outside the GIL), and a cap on pending jobs
+# turns a login storm into fast 503s instead of starving every endpoint.
+#
+# PASSWORD_HASH_WORKERS=0 hashes inline on the request thread.
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+DEFAULT_METHOD = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+
+
+class HasherBusy(Exception):
+    """Too many hashing jobs are pending; the caller should retry later"""
+
+
+def normalize_method(method):
+    """Expand werkzeug shorthands so stored hash prefixes can be compared"""
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        digest = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = parts[2] if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{digest}:{iterations}'
+    if parts[0] == 'scrypt':
+        n, r, p = (parts[1:] + ['32768', '8', '1'][len(parts) - 1:])[:3]
+        return f'scrypt:{n}:{r}:{p}'
+    return method
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, workers=2, max_pending=8):
+        self.method = normalize_method(method)
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'rejected': 0, 'rehashed': 0, 'pending': 0}
+
+    @classmethod
+    def from_env(cls):
+        workers = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+        return cls(
+            method=os.getenv('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+            workers=workers,
+            max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', max(1, workers) * 4))
+        )
+
+    def _executor(self):
+        # Created lazily and again after fork: pools do not survive fork
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pid = os.getpid()
+        return self._pool
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HasherBusy('Server busy, please retry')
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._stats['pending'] += 1
+
+        if self.workers <= 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            try:
+                future = self._executor().submit(fn, *args)
+            except Exception:
+                self._release()
+                raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._stats['pending'] -= 1
+        self._slots.release()
+
+    def submit_hash(self, password):
+        return self._submit(generate_password_hash, password, self.method)
+
+    def submit_verify(self, pwhash, password):
+        return self._submit(check_password_hash, pwhash, password)
+
+    def hash(self, password):
+        return self.submit_hash(password).result()
+
+    def verify(self, pwhash, password):
+        return self.submit_verify(pwhash, password).result()
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def upgrade_later(self, password, on_hashed):
+        """Re-hash with the current parameters in the background; skipped when busy"""
+        try:
+            future = self.submit_hash(password)
+        except HasherBusy:
+            return False
+
+        def done(f):
+            if f.exception() is None:
+                on_hashed(f.result())
+                with self._lock:
+                    self._stats['rehashed'] += 1
+        future.add_done_callback(done)
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['workers'] = self.workers
+        stats['max_pending'] = self.max_pending
+        stats['method'] = self.method
+        return stats
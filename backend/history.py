@@ -0,0 +1,269 @@
+# Transaction history helpers
+# Keyset pagination on (timestamp, _id) with opaque cursor tokens, optional
+# from/to/type filters, and streaming NDJSON/CSV export straight from the
+# Mongo cursor.
+#
+# A date range is a bounded scan of the (account_id, timestamp, _id) index;
+# with a type it uses (account_id, type, timestamp, _id), equality fields
+# first, so only that type's rows inside the range are read.
+#
+# Pages and the dashboard's recent list come back from MongoDB already in
+# their response shape (ROW_PROJECTION: string ids, rupees, formatted
+# dates), so no per-row Python runs between the cursor and the encoder.
+# serialize_transaction() builds the same rows from whole documents.
+
+import io
+import csv
+import json
+import base64
+from collections import namedtuple
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from werkzeug.http import http_date
+
+import money
+from account_stats import STAT_TYPES
+from validation import ValidationError
+
+# Matches the compound (account_id, timestamp, _id) index
+HISTORY_SORT = [('timestamp', -1), ('_id', -1)]
+HISTORY_INDEX = [('account_id', 1), ('timestamp', -1), ('_id', -1)]
+HISTORY_TYPE_INDEX = [('account_id', 1), ('type', 1), ('timestamp', -1), ('_id', -1)]
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FIELDS = ['_id', 'timestamp', 'type', 'amount', 'balance_before', 'balance_after',
+                 'description', 'to_account', 'from_account']
+# Stored as paise, reported in rupees
+MONEY_FIELDS = ('amount', 'balance_before', 'balance_after')
+
+_EPOCH = datetime(1970, 1, 1)
+
+ROW_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Carries the raw timestamp of a page's rows for the next cursor; removed
+# before the rows are returned
+CURSOR_FIELD = '_cursor_timestamp'
+
+
+# start inclusive, end exclusive, type one of STAT_TYPES; None means unbounded
+HistoryFilter = namedtuple('HistoryFilter', ['start', 'end', 'type'])
+NO_FILTER = HistoryFilter(None, None, None)
+
+
+class InvalidCursor(ValueError):
+    """The pagination cursor could not be decoded"""
+
+
+def encode_cursor(transaction):
+    # MongoDB stores datetimes with millisecond precision
+    delta = transaction['timestamp'] - _EPOCH
+    millis = delta.days * 86400000 + delta.seconds * 1000 + delta.microseconds // 1000
+    payload = json.dumps({'t': millis, 'id': str(transaction['_id'])}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return _EPOCH + timedelta(milliseconds=int(payload['t'])), ObjectId(payload['id'])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def _parse_time(value, name, end=False):
+    """YYYY-MM-DD or an ISO datetime (UTC); a bare `to` date includes that whole day"""
+    try:
+        if len(value) == 10:
+            parsed = datetime.strptime(value, '%Y-%m-%d')
+            return parsed + timedelta(days=1) if end else parsed
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValidationError(f"'{name}' must be a date (YYYY-MM-DD) or an ISO datetime")
+    if parsed.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def parse_filter(args):
+    """HistoryFilter from query parameters from, to and type; raises ValidationError"""
+    start = _parse_time(args['from'], 'from') if args.get('from') else None
+    end = _parse_time(args['to'], 'to', end=True) if args.get('to') else None
+    if start is not None and end is not None and start >= end:
+        raise ValidationError("'from' must be before 'to'")
+    txn_type = args.get('type') or None
+    if txn_type is not None and txn_type not in STAT_TYPES:
+        raise ValidationError(f"'type' must be one of: {', '.join(STAT_TYPES)}")
+    return HistoryFilter(start, end, txn_type)
+
+
+def filter_query(account_id, filters=NO_FILTER):
+    query = {'account_id': account_id}
+    if filters.type is not None:
+        query['type'] = filters.type
+    if filters.start is not None or filters.end is not None:
+        query['timestamp'] = {}
+        if filters.start is not None:
+            query['timestamp']['$gte'] = filters.start
+        if filters.end is not None:
+            query['timestamp']['$lt'] = filters.end
+    return query
+
+
+def page_filter(account_id, cursor=None, filters=NO_FILTER):
+    query = filter_query(account_id, filters)
+    if cursor:
+        timestamp, last_id = decode_cursor(cursor)
+        query['$or'] = [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': last_id}}
+        ]
+    return query
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        limit = int(value) if value is not None else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+# ==================== ROWS ====================
+
+_DAYS = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
+_MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def _rupees_expr(field):
+    return {'$divide': [f'${field}', money.PAISE_PER_RUPEE]}
+
+
+def _http_date_expr(field):
+    """The timestamp as werkzeug's http_date() writes it (what jsonify always sent)"""
+    return {'$concat': [
+        {'$arrayElemAt': [_DAYS, {'$subtract': [{'$dayOfWeek': f'${field}'}, 1]}]},
+        {'$dateToString': {'format': ', %d ', 'date': f'${field}'}},
+        {'$arrayElemAt': [_MONTHS, {'$subtract': [{'$month': f'${field}'}, 1]}]},
+        {'$dateToString': {'format': ' %Y %H:%M:%S GMT', 'date': f'${field}'}},
+    ]}
+
+
+# A history row: the document minus account_id (the same on every row)
+ROW_PROJECTION = {
+    '_id': {'$toString': '$_id'},
+    'type': 1,
+    'description': 1,
+    'to_account': 1,
+    'from_account': 1,
+    'batch_id': {'$cond': [{'$ifNull': ['$batch_id', False]}, {'$toString': '$batch_id'}, '$$REMOVE']},
+    'amount': _rupees_expr('amount'),
+    'balance_before': _rupees_expr('balance_before'),
+    'balance_after': _rupees_expr('balance_after'),
+    'timestamp': _http_date_expr('timestamp'),
+    'date': {'$dateToString': {'format': ROW_DATE_FORMAT, 'date': '$timestamp'}},
+}
+
+
+def serialize_transaction(t):
+    """ROW_PROJECTION applied to a whole transaction document"""
+    row = {'_id': str(t['_id'])}
+    for field in ('type', 'description', 'to_account', 'from_account'):
+        if field in t:
+            row[field] = t[field]
+    if t.get('batch_id') is not None:
+        row['batch_id'] = str(t['batch_id'])
+    for field in MONEY_FIELDS:
+        row[field] = money.rupees(t[field]) if t.get(field) is not None else None
+    row['timestamp'] = http_date(t['timestamp'])
+    row['date'] = t['timestamp'].strftime(ROW_DATE_FORMAT)
+    return row
+
+
+def page_pipeline(account_id, limit, cursor=None, filters=NO_FILTER):
+    """One page plus one row to tell whether there is a next page"""
+    return [
+        {'$match': page_filter(account_id, cursor, filters)},
+        {'$sort': dict(HISTORY_SORT)},
+        {'$limit': limit + 1},
+        {'$project': dict(ROW_PROJECTION, **{CURSOR_FIELD: '$timestamp'})},
+    ]
+
+
+def recent_pipeline(account_id, limit):
+    return [
+        {'$match': {'account_id': account_id}},
+        {'$sort': dict(HISTORY_SORT)},
+        {'$limit': limit},
+        {'$project': ROW_PROJECTION},
+    ]
+
+
+def finish_page(rows, limit):
+    """(rows, next_cursor) from the output of page_pipeline()"""
+    rows = rows[:limit + 1]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor({'timestamp': last[CURSOR_FIELD], '_id': last['_id']})
+        del rows[limit]
+    for row in rows:
+        del row[CURSOR_FIELD]
+    return rows, next_cursor
+
+
+def fetch_page(collection, account_id, limit, cursor=None, filters=NO_FILTER):
+    """Return (transactions, next_cursor); next_cursor is None on the last page"""
+    return finish_page(list(collection.aggregate(page_pipeline(account_id, limit, cursor, filters))), limit)
+
+
+def fetch_recent(collection, account_id, limit):
+    return list(collection.aggregate(recent_pipeline(account_id, limit)))
+
+
+def _export_row(t):
+    row = {field: t.get(field) for field in EXPORT_FIELDS}
+    row['_id'] = str(t['_id'])
+    row['timestamp'] = t['timestamp'].isoformat() + 'Z'
+    for field in MONEY_FIELDS:
+        if row[field] is not None:
+            row[field] = money.rupees(row[field])
+    return row
+
+
+def ndjson_row(t):
+    return json.dumps(_export_row(t)) + '\n'
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def csv_header():
+    return _csv_line(EXPORT_FIELDS)
+
+
+def csv_row(t):
+    row = _export_row(t)
+    return _csv_line(['' if row[field] is None else row[field] for field in EXPORT_FIELDS])
+
+
+def stream_ndjson(cursor):
+    for t in cursor:
+        yield ndjson_row(t)
+
+
+def stream_csv(cursor):
+    yield csv_header()
+    for t in cursor:
+        yield csv_row(t)
+
+
+def export_cursor(collection, account_id):
+    return collection.find({'account_id': account_id}).sort(HISTORY_SORT).batch_size(EXPORT_BATCH_SIZE)
@@ -0,0 +1,480 @@
+# Sharded sub-balances for high-volume ("hot") accounts
+# Every credit to an ordinary account is a $inc on its one document, so a
+# merchant receiving thousands of transfers a minute serializes on it. A hot
+# account (balance_slots: N on the account document) takes its credits in N
+# slot documents of balance_slots instead, each credit in a randomly picked
+# slot and in one round trip.
+#
+# A slot's balance only grows. The account document records in slots_folded
+# how much of each slot it has already taken in, and its balance is its own
+# plus whatever every slot holds beyond that. Folding a slot is therefore one
+# guarded $inc on the account document (balance and marker together): it
+# needs no transaction, a crash cannot lose or double it, and a repeated or
+# concurrent fold matches nothing.
+#
+# Debits stay on the account document with the usual $gte guard. When that
+# guard fails the slots are consolidated into the account document and the
+# debit is retried once, so the account never goes negative. A background
+# compactor folds the slots periodically.
+#
+# Credits land in the slots in no particular order, so a hot account has no
+# single running balance to place one change in: its BalanceChange carries
+# None for balance_before/balance_after and its ledger rows record none.
+#
+# asgi_app.py uses AsyncShardedBalanceEngine, the same rules on Motor. It
+# has no compactor of its own: the WSGI workers (or the compact command)
+# run it, and its debits consolidate on demand.
+#
+#   HOT_ACCOUNT_COMPACT_INTERVAL   seconds between compactions (default 30, 0 = off)
+#   HOT_ACCOUNT_REFRESH_INTERVAL   seconds between reloads of the hot list (default 10)
+#
+# Manage hot accounts:
+#   python hot_accounts.py enable <account_number> [slots]
+#   python hot_accounts.py disable <account_number>
+#   python hot_accounts.py compact
+
+import os
+import sys
+import time
+import random
+import threading
+from pymongo.errors import BulkWriteError
+
+import logs
+import mongo
+from balance_engine import BalanceEngine, AsyncBalanceEngine, BalanceChange, InsufficientFunds, apply_inc
+
+log = logs.get_logger('hot_accounts')
+
+DEFAULT_SLOTS = 8
+MAX_SLOTS = 64
+LOOKUP_FIELDS = ('_id', 'user_id', 'account_number')
+
+
+def slot_id(account_id, slot):
+    return f'{account_id}:{slot}'
+
+
+def fold_key(slot):
+    return f's{slot}'
+
+
+def fold_path(slot):
+    """Where the account document records how much of a slot it has taken in"""
+    return f'slots_folded.{fold_key(slot)}'
+
+
+def flatten(doc, prefix):
+    """Nested numeric sub-document -> dotted $inc fields"""
+    fields = {}
+    for key, value in doc.items():
+        path = f'{prefix}.{key}'
+        if isinstance(value, dict):
+            fields.update(flatten(value, path))
+        else:
+            fields[path] = value
+    return fields
+
+
+def pending(slot, folds):
+    """(balance, stats $inc) a slot holds beyond what the account took in"""
+    folded = folds.get(fold_key(slot['slot']), {})
+    stats = flatten(slot.get('stats', {}), 'stats')
+    taken = flatten(folded.get('stats', {}), 'stats')
+    stats = {path: value - taken.get(path, 0) for path, value in stats.items() if value != taken.get(path, 0)}
+    return slot['balance'] - folded.get('balance', 0), stats
+
+
+def add_pending(account, slots):
+    """Fold the slots' pending balances and statistics into an account document"""
+    folds = account.pop('slots_folded', {})
+    for slot in slots:
+        balance, stats = pending(slot, folds)
+        account['balance'] += balance
+        apply_inc(account, stats)
+    return account
+
+
+def fold_update(slot, folds):
+    """(amount, filter, update) taking a slot's pending amount into its account
+
+    The filter matches only while the marker still says what folds was read
+    with, so the update applies at most once."""
+    balance, stats = pending(slot, folds)
+    path = fold_path(slot['slot'])
+    folded = folds.get(fold_key(slot['slot']))
+    guard = {f'{path}.balance': folded['balance']} if folded else {path: {'$exists': False}}
+    inc = dict(stats, balance=balance)
+    inc[f'{path}.balance'] = balance
+    inc.update({f'{path}.{field}': value for field, value in stats.items()})
+    return balance, dict(guard, _id=slot['account_id']), {'$inc': inc}
+
+
+def unchained(change):
+    """A change that reached a hot account's document has no place in a running balance"""
+    account = change.account
+    account.pop('slots_folded', None)
+    if account.get('balance_slots'):
+        return BalanceChange(account, None, None)
+    return change
+
+
+SLOT_FIELDS = {'account_id': 1, 'slot': 1, 'balance': 1, 'stats': 1}
+
+
+class ShardedBalanceEngine(BalanceEngine):
+    """BalanceEngine that spreads credits to hot accounts over slot documents"""
+
+    def __init__(self, client, accounts_collection, slots_collection, refresh_interval=10.0):
+        super().__init__(accounts_collection)
+        self.client = client
+        self.slots = slots_collection
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._hot = {}
+        self._identities = {}
+        self._loaded_at = None
+        self._stats = {'slot_credits': 0, 'consolidations': 0, 'compactions': 0, 'folded_slots': 0}
+
+    @classmethod
+    def from_env(cls, client, accounts_collection, slots_collection):
+        return cls(client, accounts_collection, slots_collection,
+                   refresh_interval=float(os.getenv('HOT_ACCOUNT_REFRESH_INTERVAL', 10)))
+
+    def create_indexes(self):
+        self.accounts.create_index('balance_slots', sparse=True)
+        self.slots.create_index('account_id')
+
+    # ---------- hot list ----------
+
+    def _refresh(self):
+        hot = {}
+        identities = {}
+        for account in self.accounts.find(
+            {'balance_slots': {'$gt': 1}},
+            {'_id': 1, 'user_id': 1, 'account_number': 1, 'balance_slots': 1}
+        ):
+            entry = (account['_id'], account['balance_slots'])
+            for field in LOOKUP_FIELDS:
+                hot[(field, account.get(field))] = entry
+            identities[account['_id']] = {field: account.get(field) for field in LOOKUP_FIELDS}
+        # Identities first: a credit finding an account in _hot looks it up there
+        self._identities = identities
+        self._hot = hot
+        self._loaded_at = time.monotonic()
+
+    def lookup(self, query):
+        """(account_id, slots) when the single-field query names a hot account"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            # One thread reloads; the others keep using the previous list
+            if self._lock.acquire(blocking=self._loaded_at is None):
+                try:
+                    self._refresh()
+                finally:
+                    self._lock.release()
+        if len(query) != 1:
+            return None
+        (field, value), = query.items()
+        return self._hot.get((field, value))
+
+    def hot_accounts(self):
+        return set(self._hot.values())
+
+    # ---------- reads ----------
+
+    def view(self, account):
+        """Fold pending slot balances and statistics into an account document"""
+        if account is None:
+            return None
+        if not account.get('balance_slots'):
+            account.pop('slots_folded', None)
+            return account
+        return add_pending(account, self.slots.find({'account_id': account['_id']}, SLOT_FIELDS))
+
+    # ---------- writes ----------
+
+    def credit(self, query, amount, inc=None):
+        hot = self.lookup(query)
+        if hot is not None:
+            account_id, slots = hot
+            # A slot per credit, so concurrent credits spread evenly
+            result = self.slots.update_one(
+                {'_id': slot_id(account_id, random.randrange(slots)), 'retired': {'$ne': True}},
+                {'$inc': dict(inc or {}, balance=amount)}
+            )
+            if result.matched_count:
+                with self._lock:
+                    self._stats['slot_credits'] += 1
+                return BalanceChange(dict(self._identities[account_id]), None, None)
+            # The slot was retired after the hot list was loaded
+        return unchained(super().credit(query, amount, inc))
+
+    def debit(self, query, amount, inc=None):
+        hot = self.lookup(query)
+        try:
+            change = super().debit(query, amount, inc)
+        except InsufficientFunds:
+            if hot is None or not self.consolidate(hot[0]):
+                raise
+            with self._lock:
+                self._stats['consolidations'] += 1
+            change = super().debit(query, amount, inc)
+        return unchained(change)
+
+    # ---------- consolidation ----------
+
+    def _fold(self, slot, folds):
+        """Take one slot's pending balance and statistics into its account document"""
+        amount, query, update = fold_update(slot, folds)
+        if not amount:
+            # Every credit adds to the balance: nothing pending
+            return 0
+        # Matches nothing when a concurrent fold of the slot got there first
+        return amount if self.accounts.update_one(query, update).modified_count else 0
+
+    def consolidate(self, account_id):
+        """Fold every slot of the account; returns the amount moved"""
+        account = self.accounts.find_one({'_id': account_id}, {'slots_folded': 1})
+        if account is None:
+            return 0
+        folds = account.get('slots_folded', {})
+        moved = 0
+        for slot in self.slots.find({'account_id': account_id}, SLOT_FIELDS):
+            folded = self._fold(slot, folds)
+            if folded:
+                moved += folded
+                with self._lock:
+                    self._stats['folded_slots'] += 1
+        return moved
+
+    def _retire(self, slot):
+        """Close a slot to credits, take in what it holds, then remove it"""
+        self.slots.update_one({'_id': slot['_id']}, {'$set': {'retired': True}})
+        self.consolidate(slot['account_id'])
+        # The slot goes before its marker: a marker without its slot is
+        # ignored, a slot without its marker would be counted again
+        self.slots.delete_one({'_id': slot['_id']})
+        self.accounts.update_one({'_id': slot['account_id']}, {'$unset': {fold_path(slot['slot']): ''}})
+
+    def compact(self):
+        """Consolidate every hot account; returns how many were visited"""
+        self._refresh()
+        accounts = {account_id for account_id, _ in self.hot_accounts()}
+        for account_id in accounts:
+            self.consolidate(account_id)
+        with self._lock:
+            self._stats['compactions'] += 1
+        return len(accounts)
+
+    def start_compactor(self, interval):
+        if interval <= 0:
+            return None
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.compact()
+                except Exception as e:
+                    log.error('Hot account compaction failed: %s', e)
+
+        thread = threading.Thread(target=run, name='hot-account-compactor', daemon=True)
+        thread.start()
+        return thread
+
+    # ---------- administration ----------
+
+    def enable(self, account_number, slots=DEFAULT_SLOTS):
+        slots = max(2, min(int(slots), MAX_SLOTS))
+        account = self.accounts.find_one({'account_number': account_number}, {'_id': 1, 'balance_slots': 1})
+        if account is None:
+            return None
+        # A marker left behind by an interrupted retirement must not count
+        # against the new slot of the same number
+        existing = {slot['slot'] for slot in self.slots.find({'account_id': account['_id']}, {'slot': 1})}
+        stale = {fold_path(i): '' for i in range(slots) if i not in existing}
+        if stale:
+            self.accounts.update_one({'_id': account['_id']}, {'$unset': stale})
+        try:
+            self.slots.insert_many([
+                {'_id': slot_id(account['_id'], i), 'account_id': account['_id'], 'slot': i,
+                 'balance': 0, 'stats': {}}
+                for i in range(slots)
+            ], ordered=False)
+        except BulkWriteError as e:
+            # Re-enabling keeps the slots that already exist
+            if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                raise
+        self.accounts.update_one({'_id': account['_id']}, {'$set': {'balance_slots': slots}})
+
+        # Shrinking: new credits already go to the lower slots
+        for slot in self.slots.find({'account_id': account['_id'], 'slot': {'$gte': slots}}, SLOT_FIELDS):
+            self._retire(slot)
+        return slots
+
+    def disable(self, account_number):
+        account = self.accounts.find_one({'account_number': account_number}, {'_id': 1})
+        if account is None:
+            return False
+        # Slots go first: credits to a retired slot fall back to the account
+        # document, and reads keep summing the slots until the flag is gone
+        for slot in self.slots.find({'account_id': account['_id']}, SLOT_FIELDS):
+            self._retire(slot)
+        self.accounts.update_one({'_id': account['_id']}, {'$unset': {'balance_slots': '', 'slots_folded': ''}})
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hot_accounts'] = len(self.hot_accounts())
+        return stats
+
+
+class AsyncShardedBalanceEngine(AsyncBalanceEngine):
+    """ShardedBalanceEngine for asyncio (Motor) collections"""
+
+    def __init__(self, client, accounts_collection, slots_collection, refresh_interval=10.0):
+        super().__init__(accounts_collection)
+        self.client = client
+        self.slots = slots_collection
+        self.refresh_interval = refresh_interval
+
+        self._hot = {}
+        self._identities = {}
+        self._loaded_at = None
+        self._refreshing = False
+        self._stats = {'slot_credits': 0, 'consolidations': 0, 'folded_slots': 0}
+
+    @classmethod
+    def from_env(cls, client, accounts_collection, slots_collection):
+        return cls(client, accounts_collection, slots_collection,
+                   refresh_interval=float(os.getenv('HOT_ACCOUNT_REFRESH_INTERVAL', 10)))
+
+    async def create_indexes(self):
+        await self.accounts.create_index('balance_slots', sparse=True)
+        await self.slots.create_index('account_id')
+
+    async def _refresh(self):
+        hot = {}
+        identities = {}
+        async for account in self.accounts.find(
+            {'balance_slots': {'$gt': 1}},
+            {'_id': 1, 'user_id': 1, 'account_number': 1, 'balance_slots': 1}
+        ):
+            entry = (account['_id'], account['balance_slots'])
+            for field in LOOKUP_FIELDS:
+                hot[(field, account.get(field))] = entry
+            identities[account['_id']] = {field: account.get(field) for field in LOOKUP_FIELDS}
+        # Identities first: a credit finding an account in _hot looks it up there
+        self._identities = identities
+        self._hot = hot
+        self._loaded_at = time.monotonic()
+
+    async def lookup(self, query):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            # One task reloads; the others keep using the previous list
+            if not self._refreshing:
+                self._refreshing = True
+                try:
+                    await self._refresh()
+                finally:
+                    self._refreshing = False
+        if len(query) != 1:
+            return None
+        (field, value), = query.items()
+        return self._hot.get((field, value))
+
+    async def view(self, account):
+        if account is None:
+            return None
+        if not account.get('balance_slots'):
+            account.pop('slots_folded', None)
+            return account
+        slots = await self.slots.find({'account_id': account['_id']}, SLOT_FIELDS).to_list(None)
+        return add_pending(account, slots)
+
+    async def credit(self, query, amount, inc=None):
+        hot = await self.lookup(query)
+        if hot is not None:
+            account_id, slots = hot
+            result = await self.slots.update_one(
+                {'_id': slot_id(account_id, random.randrange(slots)), 'retired': {'$ne': True}},
+                {'$inc': dict(inc or {}, balance=amount)}
+            )
+            if result.matched_count:
+                self._stats['slot_credits'] += 1
+                return BalanceChange(dict(self._identities[account_id]), None, None)
+        return unchained(await super().credit(query, amount, inc))
+
+    async def debit(self, query, amount, inc=None):
+        hot = await self.lookup(query)
+        try:
+            change = await super().debit(query, amount, inc)
+        except InsufficientFunds:
+            if hot is None or not await self.consolidate(hot[0]):
+                raise
+            self._stats['consolidations'] += 1
+            change = await super().debit(query, amount, inc)
+        return unchained(change)
+
+    async def _fold(self, slot, folds):
+        amount, query, update = fold_update(slot, folds)
+        if not amount:
+            return 0
+        result = await self.accounts.update_one(query, update)
+        return amount if result.modified_count else 0
+
+    async def consolidate(self, account_id):
+        account = await self.accounts.find_one({'_id': account_id}, {'slots_folded': 1})
+        if account is None:
+            return 0
+        folds = account.get('slots_folded', {})
+        moved = 0
+        async for slot in self.slots.find({'account_id': account_id}, SLOT_FIELDS):
+            folded = await self._fold(slot, folds)
+            if folded:
+                moved += folded
+                self._stats['folded_slots'] += 1
+        return moved
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['hot_accounts'] = len(set(self._hot.values()))
+        return stats
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    commands = ('enable', 'disable', 'compact')
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("Usage: python hot_accounts.py enable <account_number> [slots]")
+        print("       python hot_accounts.py disable <account_number>")
+        print("       python hot_accounts.py compact")
+        sys.exit(1)
+
+    load_dotenv()
+    logs.configure()
+    client = mongo.create_client(os.getenv('MONGODB_URI'))
+    db = client[os.getenv('DATABASE_NAME', 'banking_system')]
+    engine = ShardedBalanceEngine(client, db['accounts'], db['balance_slots'])
+    engine.create_indexes()
+
+    command = sys.argv[1]
+    if command == 'compact':
+        print(f"[OK] Compacted {engine.compact()} hot account(s)")
+    elif len(sys.argv) < 3:
+        print(f"Usage: python hot_accounts.py {command} <account_number>")
+        sys.exit(1)
+    elif command == 'enable':
+        slots = engine.enable(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else DEFAULT_SLOTS)
+        if slots is None:
+            print(f"[ERROR] Account {sys.argv[2]} not found")
+            sys.exit(1)
+        print(f"[OK] Account {sys.argv[2]} now takes credits in {slots} slots")
+    else:
+        if not engine.disable(sys.argv[2]):
+            print(f"[ERROR] Account {sys.argv[2]} not found")
+            sys.exit(1)
+        print(f"[OK] Account {sys.argv[2]} is back to a single balance")
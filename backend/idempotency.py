@@ -0,0 +1,564 @@
+# Idempotency-Key support for money-movement requests
+# A client that retries a POST with the same Idempotency-Key header gets the
+# first attempt's response back instead of moving the money again. The first
+# request claims the key in a store (a Mongo collection with a TTL index, or
+# a dict with the memory backend) and saves its response there; replays are
+# answered from that record, or from a per-process LRU of recently completed
+# keys, without touching the accounts.
+#
+# Errors are not stored, so a retry runs the request again, unless the
+# request had already moved money: the handler says so (money_moved() in
+# app.py and asgi_app.py) and its response is then stored whatever its status.
+#
+# A duplicate that arrives while the first request is still running waits
+# for it: on an in-process event when both are in this worker, otherwise by
+# polling the store. Each claim carries an owner token: only the request
+# that holds the key can complete or release it, and while it runs a
+# background renewer keeps moving its lease forward. A claim whose owner died
+# (and so stopped renewing) is taken over once its lease runs out.
+#
+# asgi_app.py uses the async twins (AsyncMongoIdempotencyStore,
+# AsyncIdempotency) on Motor with the same records and rules.
+#
+#   IDEMPOTENCY_TTL           seconds a key is remembered (default 86400)
+#   IDEMPOTENCY_LEASE         seconds a claim survives without being renewed
+#                             (renewed every third of it; default 30)
+#   IDEMPOTENCY_WAIT_TIMEOUT  seconds a duplicate waits before giving up with
+#                             409 (default 10)
+#   IDEMPOTENCY_CACHE_TTL     seconds a completed response stays in the
+#                             per-process cache (default 300)
+
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+
+import logs
+from cache import LRUCache, _MISSING
+
+log = logs.get_logger('idempotency')
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+PENDING = 'pending'
+COMPLETED = 'completed'
+
+# Answers that say "try again" rather than what the request did: the key is
+# released so the retry runs the request again
+RETRYABLE_STATUSES = (408, 409, 425, 429)
+
+# Stored when a handler died after moving money without producing a response
+INTERRUPTED_BODY = b'{"error":"The request was interrupted after the balance changed","success":false}'
+
+
+class KeyReused(Exception):
+    """The key was already used for a different request"""
+
+
+class RequestInProgress(Exception):
+    """The first request with this key is still running"""
+
+
+def fingerprint(method, path, body):
+    return hashlib.sha256(method.encode() + b' ' + path.encode() + b'\n' + body).hexdigest()
+
+
+def is_final(status):
+    """Whether a response that moved no money is stored and replayed: 2xx and deterministic 4xx"""
+    return status < 500 and status not in RETRYABLE_STATUSES
+
+
+# ==================== STORES ====================
+
+class MemoryIdempotencyStore:
+    """Keys in this process (STORAGE_BACKEND=memory)"""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, request_hash, lease, ttl, owner):
+        """None when the key is now held by owner, else the record holding it"""
+        now = time.time()
+        with self._lock:
+            record = self._data.get(key)
+            if record is not None and record['expires_at'] < now:
+                record = None
+            if record is not None and not (record['state'] == PENDING and record['locked_until'] < now):
+                return dict(record)
+            self._data.pop(key, None)
+            self._data[key] = {
+                'state': PENDING, 'fingerprint': request_hash, 'owner': owner,
+                'locked_until': now + lease, 'expires_at': now + ttl
+            }
+            if len(self._data) > self.maxsize:
+                self._evict(now)
+            return None
+
+    def _evict(self, now):
+        # Oldest first, completed or expired records only: a pending claim's
+        # request is still running, and dropping it would let a retry in
+        excess = len(self._data) - self.maxsize
+        victims = []
+        for key, record in self._data.items():
+            if len(victims) == excess:
+                break
+            if record['state'] == COMPLETED or record['expires_at'] < now:
+                victims.append(key)
+        for key in victims:
+            del self._data[key]
+
+    def get(self, key):
+        with self._lock:
+            record = self._data.get(key)
+            if record is None or record['expires_at'] < time.time():
+                return None
+            return dict(record)
+
+    def renew(self, key, owner, lease):
+        """Move the lease of a claim still held by owner; False when it is not"""
+        with self._lock:
+            record = self._data.get(key)
+            if record is None or record['state'] != PENDING or record['owner'] != owner:
+                return False
+            record['locked_until'] = time.time() + lease
+            return True
+
+    def complete(self, key, owner, response):
+        """Store the response if owner still holds the key; False when it does not"""
+        with self._lock:
+            record = self._data.get(key)
+            if record is None or record['state'] != PENDING or record['owner'] != owner:
+                return False
+            record.update(response, state=COMPLETED)
+            return True
+
+    def release(self, key, owner):
+        with self._lock:
+            record = self._data.get(key)
+            if record is not None and record['state'] == PENDING and record['owner'] == owner:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MongoIdempotencyStore:
+    """One document per key; a TTL index removes expired ones"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def init(self):
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def claim(self, key, request_hash, lease, ttl, owner):
+        while True:
+            now = datetime.utcnow()
+            try:
+                self.collection.insert_one({
+                    '_id': key, 'state': PENDING, 'fingerprint': request_hash, 'owner': owner,
+                    'locked_until': now + timedelta(seconds=lease),
+                    'expires_at': now + timedelta(seconds=ttl)
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+            record = self.collection.find_one({'_id': key})
+            if record is None:
+                # Released or expired in between
+                continue
+            if record['expires_at'] < now:
+                # Not yet removed by the TTL monitor (it runs about once a minute)
+                self.collection.delete_one({'_id': key, 'expires_at': record['expires_at']})
+                continue
+            if record['state'] == PENDING and record['locked_until'] < now:
+                # The owner died mid-request; whoever moves the lease takes over
+                taken = self.collection.update_one(
+                    {'_id': key, 'state': PENDING, 'locked_until': record['locked_until']},
+                    {'$set': {'fingerprint': request_hash, 'owner': owner,
+                              'locked_until': now + timedelta(seconds=lease)}}
+                )
+                if taken.modified_count == 1:
+                    return None
+                continue
+            return record
+
+    def get(self, key):
+        return self.collection.find_one({'_id': key, 'expires_at': {'$gt': datetime.utcnow()}})
+
+    def renew(self, key, owner, lease):
+        renewed = self.collection.update_one(
+            {'_id': key, 'state': PENDING, 'owner': owner},
+            {'$set': {'locked_until': datetime.utcnow() + timedelta(seconds=lease)}}
+        )
+        return renewed.matched_count == 1
+
+    def complete(self, key, owner, response):
+        completed = self.collection.update_one(
+            {'_id': key, 'state': PENDING, 'owner': owner}, {'$set': dict(response, state=COMPLETED)}
+        )
+        return completed.matched_count == 1
+
+    def release(self, key, owner):
+        self.collection.delete_one({'_id': key, 'state': PENDING, 'owner': owner})
+
+
+class AsyncMongoIdempotencyStore:
+    """MongoIdempotencyStore on a Motor collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def init(self):
+        await self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    async def claim(self, key, request_hash, lease, ttl, owner):
+        while True:
+            now = datetime.utcnow()
+            try:
+                await self.collection.insert_one({
+                    '_id': key, 'state': PENDING, 'fingerprint': request_hash, 'owner': owner,
+                    'locked_until': now + timedelta(seconds=lease),
+                    'expires_at': now + timedelta(seconds=ttl)
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+            record = await self.collection.find_one({'_id': key})
+            if record is None:
+                continue
+            if record['expires_at'] < now:
+                await self.collection.delete_one({'_id': key, 'expires_at': record['expires_at']})
+                continue
+            if record['state'] == PENDING and record['locked_until'] < now:
+                taken = await self.collection.update_one(
+                    {'_id': key, 'state': PENDING, 'locked_until': record['locked_until']},
+                    {'$set': {'fingerprint': request_hash, 'owner': owner,
+                              'locked_until': now + timedelta(seconds=lease)}}
+                )
+                if taken.modified_count == 1:
+                    return None
+                continue
+            return record
+
+    async def get(self, key):
+        return await self.collection.find_one({'_id': key, 'expires_at': {'$gt': datetime.utcnow()}})
+
+    async def renew(self, key, owner, lease):
+        renewed = await self.collection.update_one(
+            {'_id': key, 'state': PENDING, 'owner': owner},
+            {'$set': {'locked_until': datetime.utcnow() + timedelta(seconds=lease)}}
+        )
+        return renewed.matched_count == 1
+
+    async def complete(self, key, owner, response):
+        completed = await self.collection.update_one(
+            {'_id': key, 'state': PENDING, 'owner': owner}, {'$set': dict(response, state=COMPLETED)}
+        )
+        return completed.matched_count == 1
+
+    async def release(self, key, owner):
+        await self.collection.delete_one({'_id': key, 'state': PENDING, 'owner': owner})
+
+
+# ==================== KEYS ====================
+
+def _settings_from_env():
+    return {
+        'ttl': float(os.getenv('IDEMPOTENCY_TTL', 86400)),
+        'lease': float(os.getenv('IDEMPOTENCY_LEASE', 30)),
+        'wait_timeout': float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', 10)),
+        'cache_ttl': float(os.getenv('IDEMPOTENCY_CACHE_TTL', 300))
+    }
+
+
+class Idempotency:
+    """Claim / complete / release of keys over one of the stores above"""
+
+    def __init__(self, store, ttl=86400.0, lease=30.0, wait_timeout=10.0, cache_ttl=300.0):
+        self.store = store
+        self.ttl = ttl
+        self.lease = lease
+        self.wait_timeout = wait_timeout
+        # key -> completed response, in front of the store
+        self.cache = LRUCache(maxsize=10000, ttl=min(cache_ttl, ttl)) if cache_ttl > 0 else None
+        # key -> Event set when this process's request with the key finishes
+        self._running = {}
+        # key -> owner token of the claims this process holds, renewed by _renewer
+        self._owners = {}
+        self._renewer = None
+        self._lock = threading.Lock()
+        self._counters = {'executed': 0, 'replayed': 0, 'cache_hits': 0, 'waited': 0,
+                          'conflicts': 0, 'timeouts': 0, 'lost_claims': 0}
+
+    @classmethod
+    def from_env(cls, storage):
+        if storage.name == 'mongo':
+            store = MongoIdempotencyStore(storage.db['idempotency_keys'])
+        else:
+            store = MemoryIdempotencyStore()
+        return cls(store, **_settings_from_env())
+
+    def init(self):
+        if hasattr(self.store, 'init'):
+            self.store.init()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _replay(self, record, request_hash):
+        if record['fingerprint'] != request_hash:
+            self._count('conflicts')
+            raise KeyReused('Idempotency-Key was already used with a different request')
+        self._count('replayed')
+        return record
+
+    def _finish(self, key):
+        with self._lock:
+            event = self._running.pop(key, None)
+            self._owners.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _owner(self, key):
+        with self._lock:
+            return self._owners.get(key)
+
+    def _lost(self, key, owner):
+        """Count a claim taken over while this process still held it"""
+        with self._lock:
+            if self._owners.get(key) != owner:
+                # Finished in the meantime
+                return
+            self._counters['lost_claims'] += 1
+        log.warning('Idempotency claim lost to another request', extra={'key': key})
+
+    def _hold(self, key, owner):
+        with self._lock:
+            self._owners[key] = owner
+            if self._renewer is None or not self._renewer.is_alive():
+                # One renewer per process while claims are held; restarted after fork
+                self._renewer = threading.Thread(target=self._renew, name='idempotency-lease', daemon=True)
+                self._renewer.start()
+
+    def _held(self):
+        """Claims to renew, or None (and the renewer stops) when there are none"""
+        with self._lock:
+            if not self._owners:
+                self._renewer = None
+                return None
+            return list(self._owners.items())
+
+    def _renew(self):
+        while True:
+            time.sleep(self.lease / 3)
+            held = self._held()
+            if held is None:
+                return
+            for key, owner in held:
+                try:
+                    renewed = self.store.renew(key, owner, self.lease)
+                except Exception as e:
+                    log.warning('Idempotency lease renewal failed: %s', e)
+                    continue
+                if not renewed:
+                    self._lost(key, owner)
+
+    def begin(self, key, request_hash):
+        """The stored response to replay, or None when the caller now owns the key
+        and must call complete() or release(). Raises KeyReused or RequestInProgress."""
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.02
+        waited = False
+        while True:
+            if self.cache is not None:
+                record = self.cache.get(key)
+                if record is not _MISSING:
+                    self._count('cache_hits')
+                    return self._replay(record, request_hash)
+
+            with self._lock:
+                event = self._running.get(key)
+                if event is None:
+                    self._running[key] = threading.Event()
+            if event is not None:
+                # A request in this process holds the key
+                if not waited:
+                    waited = True
+                    self._count('waited')
+                if not event.wait(max(0.0, deadline - time.monotonic())):
+                    self._count('timeouts')
+                    raise RequestInProgress('A request with this Idempotency-Key is still in progress')
+                continue
+
+            owner = uuid.uuid4().hex
+            try:
+                record = self.store.claim(key, request_hash, self.lease, self.ttl, owner)
+            except Exception:
+                self._finish(key)
+                raise
+            if record is None:
+                self._hold(key, owner)
+                self._count('executed')
+                return None
+            self._finish(key)
+            if record['state'] == COMPLETED:
+                if self.cache is not None:
+                    self.cache.set(key, record)
+                return self._replay(record, request_hash)
+
+            # Running in another process: poll until it completes
+            if record['fingerprint'] != request_hash:
+                self._count('conflicts')
+                raise KeyReused('Idempotency-Key was already used with a different request')
+            if not waited:
+                waited = True
+                self._count('waited')
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count('timeouts')
+                raise RequestInProgress('A request with this Idempotency-Key is still in progress')
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+
+    def complete(self, key, request_hash, status, body, content_type):
+        response = {'status': status, 'body': body, 'content_type': content_type}
+        owner = self._owner(key)
+        try:
+            if not self.store.complete(key, owner, response):
+                # Another request took the key over; its outcome stands
+                self._lost(key, owner)
+            elif self.cache is not None:
+                self.cache.set(key, dict(response, state=COMPLETED, fingerprint=request_hash))
+        finally:
+            self._finish(key)
+
+    def release(self, key):
+        """Forget a claim whose request failed, so a retry runs it again"""
+        try:
+            self.store.release(key, self._owner(key))
+        finally:
+            self._finish(key)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['running'] = len(self._running)
+            stats['held'] = len(self._owners)
+        stats['cached_responses'] = len(self.cache) if self.cache is not None else 0
+        return stats
+
+
+class AsyncIdempotency(Idempotency):
+    """Idempotency for asyncio handlers over AsyncMongoIdempotencyStore.
+    Duplicates in this process wait on an asyncio.Event; the counters, cache
+    and replay rules are shared with Idempotency."""
+
+    @classmethod
+    def from_env(cls, collection):
+        return cls(AsyncMongoIdempotencyStore(collection), **_settings_from_env())
+
+    async def init(self):
+        await self.store.init()
+
+    def _hold(self, key, owner):
+        with self._lock:
+            self._owners[key] = owner
+            if self._renewer is None or self._renewer.done():
+                self._renewer = asyncio.get_running_loop().create_task(self._renew())
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            held = self._held()
+            if held is None:
+                return
+            for key, owner in held:
+                try:
+                    renewed = await self.store.renew(key, owner, self.lease)
+                except Exception as e:
+                    log.warning('Idempotency lease renewal failed: %s', e)
+                    continue
+                if not renewed:
+                    self._lost(key, owner)
+
+    async def begin(self, key, request_hash):
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.02
+        waited = False
+        while True:
+            if self.cache is not None:
+                record = self.cache.get(key)
+                if record is not _MISSING:
+                    self._count('cache_hits')
+                    return self._replay(record, request_hash)
+
+            with self._lock:
+                event = self._running.get(key)
+                if event is None:
+                    self._running[key] = asyncio.Event()
+            if event is not None:
+                if not waited:
+                    waited = True
+                    self._count('waited')
+                try:
+                    await asyncio.wait_for(event.wait(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self._count('timeouts')
+                    raise RequestInProgress('A request with this Idempotency-Key is still in progress')
+                continue
+
+            owner = uuid.uuid4().hex
+            try:
+                record = await self.store.claim(key, request_hash, self.lease, self.ttl, owner)
+            except BaseException:
+                self._finish(key)
+                raise
+            if record is None:
+                self._hold(key, owner)
+                self._count('executed')
+                return None
+            self._finish(key)
+            if record['state'] == COMPLETED:
+                if self.cache is not None:
+                    self.cache.set(key, record)
+                return self._replay(record, request_hash)
+
+            if record['fingerprint'] != request_hash:
+                self._count('conflicts')
+                raise KeyReused('Idempotency-Key was already used with a different request')
+            if not waited:
+                waited = True
+                self._count('waited')
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count('timeouts')
+                raise RequestInProgress('A request with this Idempotency-Key is still in progress')
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+
+    async def complete(self, key, request_hash, status, body, content_type):
+        response = {'status': status, 'body': body, 'content_type': content_type}
+        owner = self._owner(key)
+        try:
+            if not await self.store.complete(key, owner, response):
+                self._lost(key, owner)
+            elif self.cache is not None:
+                self.cache.set(key, dict(response, state=COMPLETED, fingerprint=request_hash))
+        finally:
+            self._finish(key)
+
+    async def release(self, key):
+        try:
+            await self.store.release(key, self._owner(key))
+        finally:
+            self._finish(key)
@@ -0,0 +1,87 @@
+# JSON encoding for API responses
+# Uses orjson when it is installed: it encodes straight to bytes and is
+# several times faster than the stdlib encoder on the 100-row history pages.
+# Without it the stdlib json module is used with the same settings. Either
+# way the output decodes to the same value as Flask's default provider
+# (sorted keys, compact, datetimes as HTTP dates), and ObjectIds are written
+# as their hex string instead of failing.
+#
+# The bytes are not always identical to the stdlib's. orjson:
+#   - writes exponents without a '+' (1e16, not 1e+16)
+#   - writes non-ASCII text as UTF-8, not \u escapes
+#   - writes NaN and Infinity as null
+# Integers beyond 64 bits, which orjson rejects, go to the stdlib encoder.
+#
+# app.py installs JSONProvider as app.json; asgi_app.py renders with dumps().
+
+import json
+import uuid
+import decimal
+import dataclasses
+from datetime import date
+from bson.objectid import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Datetimes go through _default so they keep Flask's HTTP date format
+    _OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    _SORTED_OPTIONS = _OPTIONS | orjson.OPT_SORT_KEYS
+
+
+def _default(value):
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(obj, sort_keys=True):
+    """Compact JSON as bytes"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default, option=_SORTED_OPTIONS if sort_keys else _OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits; a truly unserializable value fails again below
+            pass
+    return json.dumps(obj, default=_default, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumps()/loads()"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Explicit json.dumps arguments (indent, cls, ...) need the stdlib
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, self.sort_keys).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # Indented output for debugging
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, self.sort_keys), mimetype=self.mimetype)
@@ -0,0 +1,297 @@
+# Write-behind ledger for transaction documents
+# Transaction documents are queued in-process and flushed to MongoDB with
+# unordered insert_many in batches bounded by size and by time.
+#
+# Durability modes:
+#   group - write() returns once the batch holding its documents has been
+#           flushed (group commit), waiting at most LEDGER_WAIT_TIMEOUT_MS
+#   async - write() returns as soon as the documents are queued
+#
+# write() runs after the balance change has committed, so it never raises:
+# the caller's money has already moved and its answer must say so. Documents
+# whose flush failed are spooled and retried by the flusher with backoff
+# until they are written (a duplicate _id on a retry means an earlier attempt
+# already wrote the row). write() returns the ticket; ticket.error says the
+# documents are spooled, and the spooled_documents gauge counts them.
+#
+# AsyncLedgerWriter is the asgi_app.py counterpart: rows are inserted inline
+# on Motor and, on failure, spooled and retried the same way.
+
+import os
+import time
+import queue
+import asyncio
+import atexit
+import threading
+from pymongo.errors import BulkWriteError
+
+import logs
+
+log = logs.get_logger('ledger')
+
+DURABILITY_MODES = ('group', 'async')
+
+
+SPOOL_RETRY_MIN = 0.5
+SPOOL_RETRY_MAX = 30.0
+
+
+class _Ticket:
+    __slots__ = ('docs', 'done', 'error')
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.done = threading.Event()
+        self.error = None
+
+
+class LedgerWriter:
+    """Queues transaction documents and flushes them in batches"""
+
+    def __init__(self, collection, batch_size=500, flush_interval=0.005,
+                 durability='group', max_retries=3, wait_timeout=5.0):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'Unknown ledger durability mode: {durability}')
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.max_retries = max_retries
+        self.wait_timeout = wait_timeout
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        # Documents whose flush failed, retried from the flusher thread
+        self._spool = []
+        self._spool_delay = SPOOL_RETRY_MIN
+        self._spool_retry_at = 0.0
+        self._stats = {
+            'batches': 0,
+            'documents': 0,
+            'failed_documents': 0,
+            'late_writes': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_max': 0.0,
+            'last_flush_seconds': 0.0,
+            'last_batch_size': 0
+        }
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, collection):
+        return cls(
+            collection,
+            batch_size=int(os.getenv('LEDGER_BATCH_SIZE', 500)),
+            flush_interval=float(os.getenv('LEDGER_FLUSH_INTERVAL_MS', 5)) / 1000,
+            durability=os.getenv('LEDGER_DURABILITY', 'group'),
+            wait_timeout=float(os.getenv('LEDGER_WAIT_TIMEOUT_MS', 5000)) / 1000
+        )
+
+    # ---------- producer side ----------
+
+    def write(self, *docs):
+        """Queue transaction documents; in group mode wait (bounded) for the flush"""
+        ticket = _Ticket(list(docs))
+        self._ensure_started()
+        self._queue.put(ticket)
+        if self.durability == 'group' and not ticket.done.wait(self.wait_timeout):
+            # Still queued or being flushed; it is written when the flusher gets to it
+            with self._lock:
+                self._stats['late_writes'] += 1
+            log.warning('Ledger flush is taking longer than %.1fs; not waiting for it', self.wait_timeout)
+        return ticket
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written"""
+        if self._thread is None:
+            return True
+        marker = _Ticket([])
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self):
+        if self._thread is not None and self._pid == os.getpid():
+            # One last attempt at the spool, without waiting for its backoff
+            self._spool_retry_at = 0.0
+            self.flush(timeout=10)
+            if self._spool:
+                log.error('Ledger closing with %d unwritten document(s): %s',
+                          len(self._spool), [str(doc.get('_id')) for doc in self._spool])
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['spooled_documents'] = len(self._spool)
+        stats['durability'] = self.durability
+        stats['flush_seconds_avg'] = (
+            stats['flush_seconds_total'] / stats['batches'] if stats['batches'] else 0.0
+        )
+        return stats
+
+    # ---------- flusher side ----------
+
+    def _ensure_started(self):
+        # Started lazily and restarted after fork, since threads do not
+        # survive into worker processes
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                if self._pid is not None:
+                    # The parent's queue and spool are the parent's to write
+                    self._queue = queue.Queue()
+                    self._spool = []
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='ledger-writer', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        timeout = None
+        if self._spool:
+            # Wake up for the next spool retry even when nothing new arrives
+            timeout = max(0.0, self._spool_retry_at - time.monotonic())
+        try:
+            tickets = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        count = len(tickets[0].docs)
+        deadline = time.monotonic() + self.flush_interval
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                ticket = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            tickets.append(ticket)
+            count += len(ticket.docs)
+        return tickets
+
+    def _run(self):
+        while True:
+            tickets = self._collect()
+            retried = []
+            if self._spool and time.monotonic() >= self._spool_retry_at:
+                retried, self._spool = self._spool, []
+            docs = retried + [doc for ticket in tickets for doc in ticket.docs]
+            failed = self._insert(docs, len(retried)) if docs else {}
+
+            if failed:
+                self._spool.extend(docs[i] for i in sorted(failed))
+                self._spool_retry_at = time.monotonic() + self._spool_delay
+                self._spool_delay = min(self._spool_delay * 2, SPOOL_RETRY_MAX)
+                log.error('Ledger write failed for %d document(s), spooled for retry: %s',
+                          len(failed), next(iter(failed.values())))
+            elif retried:
+                self._spool_delay = SPOOL_RETRY_MIN
+                log.info('Ledger spool written', extra={'documents': len(retried)})
+
+            position = len(retried)
+            for ticket in tickets:
+                errors = [failed[i] for i in range(position, position + len(ticket.docs)) if i in failed]
+                position += len(ticket.docs)
+                if errors:
+                    ticket.error = errors[0]
+                ticket.done.set()
+
+    def _insert(self, docs, retried=0):
+        """Write one batch; returns {index: error message} for failed documents.
+        The first `retried` documents come from the spool."""
+        started = time.perf_counter()
+        failed = {}
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.collection.insert_many(docs, ordered=False)
+                failed = {}
+                break
+            except BulkWriteError as e:
+                # Unordered: everything except the reported indexes was written.
+                # On a retry, duplicate _id errors are rows the failed attempt
+                # already wrote (insert_many keeps the _id it assigned).
+                failed = {
+                    err['index']: err.get('errmsg', 'write error')
+                    for err in e.details.get('writeErrors', [])
+                    if not ((attempt or err['index'] < retried) and err.get('code') == 11000)
+                }
+                break
+            except Exception as e:
+                failed = {i: str(e) for i in range(len(docs))}
+                if attempt < self.max_retries:
+                    time.sleep(0.05 * (2 ** attempt))
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['documents'] += len(docs) - len(failed)
+            self._stats['failed_documents'] += len(failed)
+            self._stats['flush_seconds_total'] += elapsed
+            self._stats['flush_seconds_max'] = max(self._stats['flush_seconds_max'], elapsed)
+            self._stats['last_flush_seconds'] = elapsed
+            self._stats['last_batch_size'] = len(docs)
+        return failed
+
+
+class AsyncLedgerWriter:
+    """Ledger writes for asgi_app.py on a Motor collection
+
+    Documents are inserted inline; a failed insert spools them to a
+    background task that retries with the same backoff as LedgerWriter,
+    so write() never raises either.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._spool = []
+        self._task = None
+        self._stats = {'documents': 0, 'failed_documents': 0}
+
+    async def write(self, *docs):
+        docs = list(docs)
+        try:
+            await self.collection.insert_many(docs, ordered=False)
+            self._stats['documents'] += len(docs)
+            return
+        except Exception as e:
+            unwritten = _unwritten(docs, e)
+            error = e
+        self._stats['documents'] += len(docs) - len(unwritten)
+        self._stats['failed_documents'] += len(unwritten)
+        log.error('Ledger write failed for %d document(s), spooled for retry: %s', len(unwritten), error)
+        self._spool.extend(unwritten)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._retry())
+
+    async def _retry(self):
+        delay = SPOOL_RETRY_MIN
+        while self._spool:
+            await asyncio.sleep(delay)
+            docs, self._spool = self._spool, []
+            try:
+                await self.collection.insert_many(docs, ordered=False)
+                unwritten = []
+            except Exception as e:
+                unwritten = _unwritten(docs, e, retried=True)
+                log.error('Ledger retry failed for %d document(s): %s', len(unwritten), e)
+            self._stats['documents'] += len(docs) - len(unwritten)
+            self._spool.extend(unwritten)
+            delay = min(delay * 2, SPOOL_RETRY_MAX)
+
+    def metrics(self):
+        stats = dict(self._stats)
+        stats['spooled_documents'] = len(self._spool)
+        return stats
+
+
+def _unwritten(docs, error, retried=False):
+    """The documents an unordered insert_many that raised did not write"""
+    if not isinstance(error, BulkWriteError):
+        return docs
+    # On a retry a duplicate _id is a row an earlier attempt wrote
+    return [
+        docs[err['index']] for err in error.details.get('writeErrors', [])
+        if not (retried and err.get('code') == 11000)
+    ]
@@ -0,0 +1,117 @@
+# Non-blocking structured logging
+# Handlers only put records on an in-memory queue; one background
+# QueueListener thread formats them and writes to stdout, so a slow terminal
+# or log collector never adds latency to a request.
+#
+#   LOG_LEVEL   DEBUG | INFO (default) | WARNING | ERROR
+#   LOG_FORMAT  text (default) | json
+#
+# Usage (entry points call configure() once, after load_dotenv()):
+#   logs.configure()
+#   log = logs.get_logger()
+#   log.info('Deposit', extra={'account': number, 'amount': amount})
+
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_lock = threading.Lock()
+_listener = None
+_pid = None
+
+
+def _fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update(_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """[LEVEL] message key=value ... - the console style the app always used"""
+
+    def format(self, record):
+        line = f'[{record.levelname}] {record.getMessage()}'
+        fields = _fields(record)
+        if fields:
+            line += ' ' + ' '.join(f'{k}={v}' for k, v in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class ProcessQueueHandler(QueueHandler):
+    """QueueHandler whose queue and writer thread are (re)created per process
+
+    Threads do not survive fork, so a logger created in a pre-fork master
+    starts a fresh listener the first time a worker logs.
+    """
+
+    def __init__(self, handler):
+        super().__init__(None)
+        self.handler = handler
+
+    def emit(self, record):
+        global _listener, _pid
+        if _pid != os.getpid():
+            with _lock:
+                if _pid != os.getpid():
+                    self.queue = queue.SimpleQueue()
+                    _listener = QueueListener(self.queue, self.handler)
+                    _listener.start()
+                    _pid = os.getpid()
+        super().emit(record)
+
+
+def configure():
+    """Install the queue handler on the 'banking' logger; safe to call more than once"""
+    root = logging.getLogger('banking')
+    if any(isinstance(h, ProcessQueueHandler) for h in root.handlers):
+        return root
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if os.getenv('LOG_FORMAT', 'text') == 'json' else TextFormatter())
+
+    root.handlers = [ProcessQueueHandler(stream)]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root.propagate = False
+    return root
+
+
+def get_logger(name='banking'):
+    if not name.startswith('banking'):
+        name = f'banking.{name}'
+    return logging.getLogger(name)
+
+
+def flush():
+    """Write out everything queued so far (tests, shutdown)"""
+    global _listener, _pid
+    with _lock:
+        if _listener is not None and _pid == os.getpid():
+            _listener.stop()
+            _listener = None
+            _pid = None
+
+
+atexit.register(flush)
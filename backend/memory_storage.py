@@ -0,0 +1,326 @@
+# In-process storage backend (STORAGE_BACKEND=memory)
+# Dict indexes on email, account_number and user_id, and one append-only,
+# (timestamp, _id)-ordered transaction array per account, all behind a single
+# lock. No network round trips, so load tests against it measure the cost of
+# the handlers themselves.
+#
+# Data lives in the process: run a single worker (WEB_CONCURRENCY=1) and
+# expect it to be gone on restart.
+
+import copy
+import bisect
+import threading
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+import history
+import statements
+from storage import Storage, is_duplicate_email
+from balance_engine import BalanceChange, AccountNotFound, InsufficientFunds, apply_inc
+from batch import check_batch, assign_recipient, plan, increments, build_result
+
+INDEXED_FIELDS = ('_id', 'user_id', 'account_number')
+
+
+def _bson_datetime(value):
+    # BSON datetimes have millisecond precision; cursors rely on it
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def _copy_account(account):
+    copied = dict(account)
+    if 'stats' in copied:
+        copied['stats'] = copy.deepcopy(copied['stats'])
+    return copied
+
+
+class _History:
+    """Transactions of one account, ascending by (timestamp, _id)"""
+
+    __slots__ = ('keys', 'rows')
+
+    def __init__(self):
+        self.keys = []
+        self.rows = []
+
+    def append(self, row):
+        key = (row['timestamp'], row['_id'])
+        if not self.keys or key > self.keys[-1]:
+            self.keys.append(key)
+            self.rows.append(row)
+        else:
+            # Requests that took their timestamp earlier can commit later
+            index = bisect.bisect(self.keys, key)
+            self.keys.insert(index, key)
+            self.rows.insert(index, row)
+
+
+class MemoryStorage(Storage):
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users = {}
+        self._users_by_email = {}
+        self._accounts = {}
+        self._accounts_by_user = {}
+        self._accounts_by_number = {}
+        self._history = {}
+        self._transaction_count = 0
+        self._counters = {}
+        self._statements = {}
+
+    # ---------- users ----------
+
+    def find_user_by_email(self, email):
+        with self._lock:
+            user_id = self._users_by_email.get(email)
+            return dict(self._users[user_id]) if user_id is not None else None
+
+    def insert_user(self, user):
+        with self._lock:
+            if user['email'] in self._users_by_email:
+                raise DuplicateKeyError(f'E11000 duplicate key error index: email_1 dup key: {user["email"]}')
+            user.setdefault('_id', ObjectId())
+            self._users[user['_id']] = dict(user)
+            self._users_by_email[user['email']] = user['_id']
+            return user['_id']
+
+    def replace_password_hash(self, user_id, old_hash, new_hash):
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None or user['password'] != old_hash:
+                return False
+            user['password'] = new_hash
+            return True
+
+    def create_user_with_account(self, user, account):
+        with self._lock:
+            # Checked up front so that a failure leaves nothing behind
+            if user['email'] in self._users_by_email:
+                raise DuplicateKeyError(f'E11000 duplicate key error index: email_1 dup key: {user["email"]}')
+            if account['account_number'] in self._accounts_by_number:
+                raise DuplicateKeyError(
+                    f'E11000 duplicate key error index: account_number_1 dup key: {account["account_number"]}'
+                )
+            account['user_id'] = self.insert_user(user)
+            self.insert_account(account)
+            return user['_id']
+
+    def create_users_with_accounts(self, users, accounts):
+        errors = {}
+        with self._lock:
+            for i, (user, account) in enumerate(zip(users, accounts)):
+                try:
+                    self.create_user_with_account(user, account)
+                except DuplicateKeyError as e:
+                    errors[i] = 'Email already registered' if is_duplicate_email(e) else str(e)
+        return errors
+
+    # ---------- accounts ----------
+
+    def insert_account(self, account):
+        with self._lock:
+            if account['account_number'] in self._accounts_by_number:
+                raise DuplicateKeyError(
+                    f'E11000 duplicate key error index: account_number_1 dup key: {account["account_number"]}'
+                )
+            account.setdefault('_id', ObjectId())
+            stored = _copy_account(account)
+            self._accounts[account['_id']] = stored
+            self._accounts_by_number[account['account_number']] = stored
+            # Like find_one({'user_id': ...}) without a sort: the first one wins
+            self._accounts_by_user.setdefault(account['user_id'], stored)
+            return account['_id']
+
+    def find_account_by_user(self, user_id):
+        with self._lock:
+            account = self._accounts_by_user.get(user_id)
+            return _copy_account(account) if account is not None else None
+
+    def find_account_by_number(self, account_number):
+        with self._lock:
+            account = self._accounts_by_number.get(account_number)
+            return _copy_account(account) if account is not None else None
+
+    def _lookup(self, query):
+        (field, value), = query.items()
+        if field == '_id':
+            return self._accounts.get(value)
+        if field == 'user_id':
+            return self._accounts_by_user.get(value)
+        if field == 'account_number':
+            return self._accounts_by_number.get(value)
+        raise ValueError(f'Unsupported account query; use one of {INDEXED_FIELDS}')
+
+    def _apply(self, account, delta, inc):
+        before = account['balance']
+        apply_inc(account, inc or {})
+        account['balance'] = before + delta
+        return BalanceChange(_copy_account(account), before, account['balance'])
+
+    def credit(self, query, amount, inc=None):
+        with self._lock:
+            account = self._lookup(query)
+            if account is None:
+                raise AccountNotFound()
+            return self._apply(account, amount, inc)
+
+    def debit(self, query, amount, inc=None):
+        with self._lock:
+            account = self._lookup(query)
+            if account is None:
+                raise AccountNotFound()
+            if account['balance'] < amount:
+                raise InsufficientFunds(account['balance'])
+            return self._apply(account, -amount, inc)
+
+    def transfer(self, from_query, to_query, amount, from_inc=None, to_inc=None):
+        # Both sides change under one lock, so there is no refund path
+        with self._lock:
+            sender = self._lookup(from_query)
+            recipient = self._lookup(to_query)
+            if sender is None or recipient is None:
+                raise AccountNotFound()
+            if sender['balance'] < amount:
+                raise InsufficientFunds(sender['balance'])
+            return self._apply(sender, -amount, from_inc), self._apply(recipient, amount, to_inc)
+
+    def run_batch(self, user_id, mode, items, now):
+        user_id = ObjectId(user_id)
+        check_batch(mode, items)
+
+        with self._lock:
+            sender = self._accounts_by_user.get(user_id)
+            if sender is None:
+                return None
+            for item in items:
+                if item.op == 'transfer' and not item.error:
+                    recipient = self._accounts_by_number.get(item.to_account)
+                    if recipient is not None:
+                        recipient = {field: recipient[field] for field in INDEXED_FIELDS}
+                    assign_recipient(item, recipient, user_id)
+
+            accepted, net, _ = plan(items, sender['balance'], mode)
+            sender_inc, credits = increments(accepted, now)
+
+            pre_image = _copy_account(sender)
+            apply_inc(sender, sender_inc)
+            sender['balance'] += net
+
+            post_balances = {}
+            for rid, entry in credits.items():
+                recipient = self._accounts[rid]
+                for inc in entry['inc']:
+                    apply_inc(recipient, inc)
+                recipient['balance'] += entry['amount']
+                post_balances[rid] = recipient['balance']
+
+        return build_result(items, accepted, pre_image, net, sender_inc, credits, post_balances, now, ObjectId())
+
+    def reserve_sequence(self, name, count):
+        with self._lock:
+            start = self._counters.get(name, 0)
+            self._counters[name] = start + count
+            return start
+
+    # ---------- transactions ----------
+
+    def append_transactions(self, *transactions):
+        with self._lock:
+            for transaction in transactions:
+                transaction.setdefault('_id', ObjectId())
+                row = dict(transaction, timestamp=_bson_datetime(transaction['timestamp']))
+                history_ = self._history.get(row['account_id'])
+                if history_ is None:
+                    history_ = self._history[row['account_id']] = _History()
+                history_.append(row)
+            self._transaction_count += len(transactions)
+
+    def _newest(self, account_id, limit, cursor=None, filters=history.NO_FILTER):
+        """Up to `limit` rows older than the cursor, newest first, plus whether more exist"""
+        with self._lock:
+            history_ = self._history.get(account_id)
+            if history_ is None:
+                return [], False
+            end = len(history_.rows)
+            if cursor:
+                end = bisect.bisect_left(history_.keys, history.decode_cursor(cursor))
+            # (t,) sorts before every (t, _id) key
+            if filters.end is not None:
+                end = min(end, bisect.bisect_left(history_.keys, (filters.end,)))
+            first = 0
+            if filters.start is not None:
+                first = bisect.bisect_left(history_.keys, (filters.start,))
+            if filters.type is None:
+                start = max(first, end - limit)
+                rows = [dict(row) for row in reversed(history_.rows[start:end])]
+                return rows, start > first
+            rows = []
+            for index in range(end - 1, first - 1, -1):
+                row = history_.rows[index]
+                if row['type'] == filters.type:
+                    if len(rows) == limit:
+                        return rows, True
+                    rows.append(dict(row))
+            return rows, False
+
+    def transactions_page(self, account_id, limit, cursor=None, filters=history.NO_FILTER):
+        rows, has_more = self._newest(account_id, limit, cursor, filters)
+        next_cursor = history.encode_cursor(rows[-1]) if has_more else None
+        return [history.serialize_transaction(t) for t in rows], next_cursor
+
+    def recent_transactions(self, account_id, limit):
+        return [history.serialize_transaction(t) for t in self._newest(account_id, limit)[0]]
+
+    def iter_transactions(self, account_id):
+        with self._lock:
+            history_ = self._history.get(account_id)
+            rows = list(history_.rows) if history_ is not None else []
+        for row in reversed(rows):
+            yield dict(row)
+
+    def _period_rows(self, account_id, start, end):
+        with self._lock:
+            history_ = self._history.get(account_id)
+            if history_ is None:
+                return []
+            first = bisect.bisect_left(history_.keys, (start,)) if start is not None else 0
+            last = bisect.bisect_left(history_.keys, (end,))
+            return history_.rows[first:last]
+
+    def period_transactions(self, account_id, start, end):
+        for row in self._period_rows(account_id, start, end):
+            yield dict(row)
+
+    def net_change_before(self, account_id, end):
+        return sum(statements.SIGNS[row['type']] * row['amount'] for row in self._period_rows(account_id, None, end))
+
+    # ---------- statements ----------
+
+    def iter_accounts(self, created_before):
+        with self._lock:
+            accounts = [(a['_id'], a['created_at']) for a in self._accounts.values()]
+        return [(account_id, created_at) for account_id, created_at in accounts if created_at < created_before]
+
+    def find_statement(self, statement_id):
+        with self._lock:
+            statement = self._statements.get(statement_id)
+            return copy.deepcopy(statement) if statement is not None else None
+
+    def insert_statement(self, statement):
+        with self._lock:
+            stored = self._statements.setdefault(statement['_id'], copy.deepcopy(statement))
+            return copy.deepcopy(stored)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'accounts': len(self._accounts),
+                'transactions': self._transaction_count,
+                'statements': len(self._statements)
+            }
+
+    def metric_sources(self):
+        return [('memory_storage', 'In-memory storage', self.stats)]
@@ -0,0 +1,218 @@
+# In-process metrics in the Prometheus text exposition format
+# Request latency histograms per route, in-flight request gauges and
+# per-operation MongoDB timings (via a pymongo CommandListener, so every
+# collection call is covered, including cursors, bulk writes and the
+# ledger writer thread). Served at GET /metrics.
+#
+# Metrics are per process: with several gunicorn workers, each scrape sees
+# the worker that answered it (scrape the workers individually or aggregate
+# in Prometheus by instance).
+
+import threading
+from pymongo import monitoring
+
+# Prometheus' default latency buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f'{self.name}{_format_labels(self.label_names, key)} {_format_value(v)}'
+            for key, v in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [per-bucket counts..., +Inf count], sum
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            values = {key: (list(s[0]), s[1]) for key, s in self._values.items()}
+        lines = self.header()
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = _format_labels(self.label_names, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = {}
+
+    def counter(self, name, documentation, labels=()):
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._add(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, key, collect):
+        """collect() -> iterable of (name, kind, documentation, value), read at scrape time
+
+        Registering the same key again replaces the earlier collector.
+        """
+        self._collectors[key] = collect
+
+    def add_stats(self, prefix, documentation, stats):
+        """Expose the numeric values of a stats() dict as gauges named <prefix>_<key>"""
+        def collect():
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield f'{prefix}_{key}', 'gauge', f'{documentation}: {key}', value
+        self.add_collector(prefix, collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in list(self._collectors.values()):
+            for name, kind, documentation, value in collect():
+                lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}',
+                          f'{name} {_format_value(value)}']
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status'))
+http_latency = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('route', 'method'))
+http_in_flight = registry.gauge(
+    'http_requests_in_flight', 'Requests currently being handled')
+mongo_latency = registry.histogram(
+    'mongo_operation_duration_seconds', 'MongoDB command latency by collection and operation',
+    ('collection', 'operation'))
+mongo_failures = registry.counter(
+    'mongo_operation_failures_total', 'Failed MongoDB commands by collection and operation',
+    ('collection', 'operation'))
+
+# Commands whose first value is not a collection name
+_ADMIN_COMMANDS = {'ping', 'hello', 'ismaster', 'isMaster', 'endSessions', 'commitTransaction',
+                   'abortTransaction', 'getMore', 'killCursors', 'saslStart', 'saslContinue'}
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Records mongo_operation_duration_seconds for every command the client runs"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _target(event):
+        name = event.command_name
+        if name == 'getMore':
+            return event.command.get('collection', '-'), name
+        if name in _ADMIN_COMMANDS:
+            return '-', name
+        return str(event.command.get(name, '-')), name
+
+    def started(self, event):
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = self._target(event)
+
+    def _finish(self, event):
+        with self._lock:
+            target = self._pending.pop((event.connection_id, event.request_id), None)
+        return target or ('-', event.command_name)
+
+    def succeeded(self, event):
+        collection, operation = self._finish(event)
+        mongo_latency.observe(event.duration_micros / 1e6, collection=collection, operation=operation)
+
+    def failed(self, event):
+        collection, operation = self._finish(event)
+        mongo_latency.observe(event.duration_micros / 1e6, collection=collection, operation=operation)
+        mongo_failures.inc(collection=collection, operation=operation)
+
+
+mongo_command_timer = MongoCommandTimer()
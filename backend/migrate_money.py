@@ -0,0 +1,158 @@
+# Convert stored money from float rupees to int64 paise (see money.py)
+# Rewrites balances, transaction amounts, running statistics, hot account
+# slots and stored statements in place. Each collection is walked in _id
+# order in batches of --batch-size documents, and each batch is written with
+# one unordered bulk_write. Only documents that still hold floats are read,
+# so an interrupted run can simply be started again.
+#
+# Stop the app (or pause writes) while it runs: a paise $inc landing on a
+# float balance would corrupt it. The app refuses to start until the
+# migration has finished and recorded the new layout.
+#
+#   python migrate_money.py [--batch-size 1000] [--dry-run]
+
+import os
+import sys
+import time
+import argparse
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+
+import money
+import statements
+
+LEGACY_TYPES = ('double', 'decimal')
+DEFAULT_BATCH_SIZE = 1000
+
+
+def legacy(field):
+    """Filter for documents whose field still holds float (or Decimal128) rupees"""
+    return {'$or': [{field: {'$type': bson_type}} for bson_type in LEGACY_TYPES]}
+
+
+def convert_stats(stats):
+    """Copy of a stats (or statement totals) tree with every 'total' in paise"""
+    converted = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            converted[key] = convert_stats(value)
+        elif key == 'total':
+            converted[key] = money.from_legacy(value)
+        else:
+            converted[key] = value
+    return converted
+
+
+def convert_account(doc):
+    """$set for an account or balance slot document"""
+    update = {'balance': money.from_legacy(doc['balance'])}
+    if doc.get('stats'):
+        update['stats'] = convert_stats(doc['stats'])
+    return update
+
+
+def convert_transaction(doc):
+    return {field: money.from_legacy(doc[field])
+            for field in ('amount', 'balance_before', 'balance_after') if doc.get(field) is not None}
+
+
+def convert_statement(doc):
+    rows = []
+    for row in doc['rows']:
+        row = list(row)
+        row[3] = money.from_legacy(row[3])
+        row[4] = money.from_legacy(row[4])
+        rows.append(row)
+    return {
+        'opening_balance': money.from_legacy(doc['opening_balance']),
+        'closing_balance': money.from_legacy(doc['closing_balance']),
+        'totals': convert_stats(doc['totals']),
+        'rows': rows,
+        'version': statements.VERSION
+    }
+
+
+# collection -> (filter selecting unconverted documents, guard field, converter)
+# The guard field must still hold its float when the update lands, so a
+# document changed since it was read is left for the next run.
+MIGRATIONS = [
+    ('accounts', legacy('balance'), 'balance', convert_account),
+    ('balance_slots', legacy('balance'), 'balance', convert_account),
+    ('transactions', legacy('amount'), 'amount', convert_transaction),
+    ('statements', {'version': {'$lt': statements.VERSION}}, 'version', convert_statement),
+]
+
+
+def migrate_collection(collection, query, guard, convert, batch_size, on_progress=None):
+    """Returns (converted, skipped)"""
+    converted = skipped = 0
+    last_id = None
+    while True:
+        page = dict(query, _id={'$gt': last_id}) if last_id is not None else query
+        batch = list(collection.find(page).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return converted, skipped
+        last_id = batch[-1]['_id']
+        result = collection.bulk_write([
+            UpdateOne({'_id': doc['_id'], guard: doc[guard]}, {'$set': convert(doc)})
+            for doc in batch
+        ], ordered=False)
+        converted += result.modified_count
+        skipped += len(batch) - result.matched_count
+        if on_progress is not None:
+            on_progress(converted, skipped)
+
+
+def migrate(db, batch_size=DEFAULT_BATCH_SIZE, on_progress=None):
+    """Convert every collection, then record the paise layout; returns {name: (converted, skipped)}
+
+    on_progress(name, converted, skipped) is called after every batch.
+    """
+    results = {}
+    for name, query, guard, convert in MIGRATIONS:
+        progress = None
+        if on_progress is not None:
+            progress = lambda converted, skipped, name=name: on_progress(name, converted, skipped)
+        results[name] = migrate_collection(db[name], query, guard, convert, batch_size, progress)
+    if not any(skipped for _, skipped in results.values()):
+        db['counters'].update_one(
+            {'_id': money.LAYOUT_MARKER}, {'$set': {'value': money.LAYOUT}}, upsert=True
+        )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert stored money from float rupees to int64 paise')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help='only count the documents to convert')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGODB_URI'))
+    db = client[os.getenv('DATABASE_NAME', 'banking_system')]
+
+    if args.dry_run:
+        for name, query, _, _ in MIGRATIONS:
+            print(f"{name}: {db[name].count_documents(query):,} document(s) to convert")
+        return 0
+
+    started = time.perf_counter()
+
+    def on_progress(name, converted, skipped):
+        print(f"\r{name}: {converted:,} converted, {skipped:,} changed meanwhile", end='', flush=True)
+
+    results = migrate(db, args.batch_size, on_progress)
+    print()
+    for name, (converted, skipped) in results.items():
+        print(f"  {name}: {converted:,} converted, {skipped:,} changed meanwhile")
+    total = sum(converted for converted, _ in results.values())
+    skipped = sum(skipped for _, skipped in results.values())
+    print(f"[OK] {total:,} document(s) converted in {time.perf_counter() - started:.1f}s")
+    if skipped:
+        print(f"[WARN] {skipped:,} document(s) changed during the run; stop writes and run again")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# Money as integer paise
+# Balances, transaction amounts and the running statistics are stored as
+# int64 paise (1 rupee = 100 paise), so $inc and $sum are exact on the server
+# and arithmetic is exact in Python. Rupees exist only at the edges: parse()
+# turns a request amount into paise, rupees() and format_rupees() turn paise
+# back into what the API and descriptions have always shown.
+#
+# Databases written with float rupees are converted by migrate_money.py;
+# MongoStorage.init_schema() refuses to start on one that has not been.
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from bson.decimal128 import Decimal128
+from bson.int64 import Int64
+
+PAISE_PER_RUPEE = 100
+ZERO = Int64(0)
+# Stored as BSON int64
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+# counters document recording that the database holds paise
+LAYOUT_MARKER = 'money_layout'
+LAYOUT = 'paise'
+
+_PAISA = Decimal('0.01')
+
+
+class LegacyMoneyLayout(RuntimeError):
+    """The database still stores money as float rupees"""
+
+
+def parse(value):
+    """Rupee amount from a request (number or numeric string) as int paise;
+    raises ValueError for non-numbers and for fractions of a paisa"""
+    if isinstance(value, bool):
+        raise ValueError('not a number')
+    try:
+        # str() of a float is its shortest repr, so 0.1 parses as exactly 0.10
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError('not a number')
+    if not amount.is_finite():
+        raise ValueError('not a number')
+    try:
+        exact = amount == amount.quantize(_PAISA, rounding=ROUND_HALF_EVEN)
+    except InvalidOperation:
+        # Too many digits for the context precision (e.g. 1e30)
+        raise ValueError('too large')
+    if not exact:
+        raise ValueError('more than two decimal places')
+    paise = int(amount.scaleb(2))
+    if not INT64_MIN <= paise <= INT64_MAX:
+        raise ValueError('too large')
+    return paise
+
+
+def from_legacy(value):
+    """float rupees (or Decimal128) as stored before, to int paise"""
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    elif isinstance(value, float):
+        value = Decimal(repr(value))
+    else:
+        return value
+    return Int64(int(value.quantize(_PAISA, rounding=ROUND_HALF_EVEN).scaleb(2)))
+
+
+def rupees(paise):
+    """The number the API reports for an amount in paise"""
+    return paise / PAISE_PER_RUPEE
+
+
+def format_rupees(paise):
+    return f'Rs.{Decimal(paise).scaleb(-2):,.2f}'
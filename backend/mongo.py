@@ -0,0 +1,116 @@
+# MongoDB client construction and connection-pool tuning
+# Clients are created with connect=False so that importing the app opens no
+# sockets; each worker process connects (and pre-warms its pool) after fork.
+
+import os
+import threading
+from pymongo import MongoClient
+from pymongo.errors import ConfigurationError, OperationFailure
+
+import metrics
+
+# Environment variable -> MongoClient option
+POOL_SETTINGS = {
+    'MONGO_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGO_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGO_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+    'MONGO_SOCKET_TIMEOUT_MS': 'socketTimeoutMS',
+    'MONGO_CONNECT_TIMEOUT_MS': 'connectTimeoutMS',
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS'
+}
+
+DEFAULT_POOL_OPTIONS = {
+    'maxPoolSize': 100,
+    'minPoolSize': 0,
+    'waitQueueTimeoutMS': 2000,
+    'socketTimeoutMS': 10000,
+    'connectTimeoutMS': 5000,
+    'serverSelectionTimeoutMS': 5000
+}
+
+
+def pool_options_from_env():
+    options = dict(DEFAULT_POOL_OPTIONS)
+    for env_name, option in POOL_SETTINGS.items():
+        value = os.getenv(env_name)
+        if value:
+            options[option] = int(value)
+    return options
+
+
+def client_options(**overrides):
+    """Pool settings plus the command timer; shared by the pymongo and Motor clients"""
+    options = pool_options_from_env()
+    options['event_listeners'] = [metrics.mongo_command_timer]
+    options.update(overrides)
+    return options
+
+
+def create_client(uri, **overrides):
+    return MongoClient(uri, connect=False, **client_options(**overrides))
+
+
+def prewarm(client, connections):
+    """Open `connections` pooled sockets by running that many pings at once"""
+    connections = max(1, min(connections, client.options.pool_options.max_pool_size or connections))
+    barrier = threading.Barrier(connections)
+    errors = []
+
+    def ping():
+        try:
+            # Hold every check-out until all threads are ready so each ping
+            # needs its own connection
+            barrier.wait(timeout=10)
+            client.admin.command('ping')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ping) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return connections
+
+
+# Server error codes meaning "transactions are not available here"
+# (standalone server, or a storage engine without transaction support)
+_NO_TRANSACTION_CODES = {20, 263}
+_transactions_supported = {}
+
+
+def run_in_transaction(client, callback):
+    """Run callback(session) in a multi-document transaction
+
+    with_transaction retries transient errors. On deployments without
+    transaction support callback(None) runs without one.
+    """
+    if _transactions_supported.get(id(client), True):
+        try:
+            with client.start_session() as session:
+                return session.with_transaction(callback)
+        except (NotImplementedError, ConfigurationError):
+            _transactions_supported[id(client)] = False
+        except OperationFailure as e:
+            if e.code not in _NO_TRANSACTION_CODES:
+                raise
+            _transactions_supported[id(client)] = False
+    return callback(None)
+
+
+async def run_in_transaction_async(client, callback):
+    """run_in_transaction() for a Motor client and a coroutine callback"""
+    if _transactions_supported.get(id(client), True):
+        try:
+            async with await client.start_session() as session:
+                return await session.with_transaction(callback)
+        except (NotImplementedError, ConfigurationError):
+            _transactions_supported[id(client)] = False
+        except OperationFailure as e:
+            if e.code not in _NO_TRANSACTION_CODES:
+                raise
+            _transactions_supported[id(client)] = False
+    return await callback(None)
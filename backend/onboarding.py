@@ -0,0 +1,233 @@
+# Customer onboarding: new user + account documents, and bulk import
+# Registration and the bulk importer build documents the same way and store
+# each user together with their account (Storage.create_user_with_account /
+# create_users_with_accounts), so a failure never leaves a user without one.
+#
+# Import a CSV or JSONL customer file in streamed batches:
+#   python onboarding.py customers.csv --errors rejected.jsonl
+#
+# Columns: name, email, phone and either password (hashed here, on all CPU
+# cores) or password_hash (an already-hashed werkzeug password, e.g. from a
+# previous system; much faster). Rejected rows are reported per line.
+
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash
+
+import money
+from validation import ValidationError, validate_registration, validate_profile
+
+DEFAULT_BATCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+FIELDS = ('name', 'email', 'phone', 'password', 'password_hash')
+
+
+def customer_documents(name, email, phone, password_hash, account_number, now):
+    """(user, account) documents for a new customer"""
+    user = {
+        'name': name,
+        'email': email,
+        'phone': phone,
+        'password': password_hash,
+        'created_at': now
+    }
+    account = {
+        'account_number': account_number,
+        'balance': money.ZERO,
+        'created_at': now
+    }
+    return user, account
+
+
+# ==================== READING ====================
+
+def detect_format(path):
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(f, file_format):
+    """(line number, row dict) pairs; unparsable JSONL lines come back as their error"""
+    if file_format == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('expected a JSON object')
+        except ValueError as e:
+            yield line_number, ValidationError(f'Invalid JSON: {e}')
+        else:
+            yield line_number, row
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_row(row):
+    """(name, email, phone, password, password_hash); one of the last two is None"""
+    if isinstance(row, Exception):
+        raise row
+    row = {field: str(row[field]) if row.get(field) is not None else '' for field in FIELDS}
+    if row['password_hash']:
+        name, email, phone = validate_profile(row)
+        return name, email, phone, None, row['password_hash']
+    name, email, phone, password = validate_registration(row)
+    return name, email, phone, password, None
+
+
+# ==================== IMPORT ====================
+
+class Importer:
+    """Streams customer rows into storage in batches"""
+
+    def __init__(self, storage, allocator, hash_method, batch_size=DEFAULT_BATCH_SIZE, hash_workers=None):
+        self.storage = storage
+        self.allocator = allocator
+        self.hash_method = hash_method
+        self.batch_size = batch_size
+        self.hash_workers = hash_workers
+        self._pool = None
+
+    def _hash(self, passwords):
+        if not passwords:
+            return []
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.hash_workers)
+        chunk = max(1, len(passwords) // ((self.hash_workers or os.cpu_count() or 1) * 4))
+        return list(self._pool.map(generate_password_hash, passwords,
+                                   [self.hash_method] * len(passwords), chunksize=chunk))
+
+    def import_batch(self, batch, now):
+        """Store one batch of (line, row); returns [(line, email, error)] for rejected rows"""
+        rejected = []
+        parsed = []
+        seen = set()
+        for line, row in batch:
+            try:
+                name, email, phone, password, password_hash = parse_row(row)
+            except ValidationError as e:
+                rejected.append((line, row.get('email') if isinstance(row, dict) else None, str(e)))
+                continue
+            if email in seen:
+                rejected.append((line, email, 'Duplicate email in file'))
+                continue
+            seen.add(email)
+            parsed.append((line, name, email, phone, password, password_hash))
+
+        hashes = iter(self._hash([p[4] for p in parsed if p[4] is not None]))
+        numbers = self.allocator.allocate(len(parsed)) if parsed else []
+
+        users, accounts = [], []
+        for (line, name, email, phone, password, password_hash), number in zip(parsed, numbers):
+            user, account = customer_documents(
+                name, email, phone, password_hash or next(hashes), number, now
+            )
+            users.append(user)
+            accounts.append(account)
+
+        errors = self.storage.create_users_with_accounts(users, accounts) if users else {}
+        for index, message in sorted(errors.items()):
+            rejected.append((parsed[index][0], parsed[index][2], message))
+        return len(users) - len(errors), rejected
+
+    def run(self, f, file_format, on_rejected=None, on_progress=None):
+        """Import every row; returns a summary dict"""
+        started = time.perf_counter()
+        created = failed = rows = 0
+        try:
+            for batch in batches(read_rows(f, file_format), self.batch_size):
+                ok, rejected = self.import_batch(batch, datetime.utcnow())
+                rows += len(batch)
+                created += ok
+                failed += len(rejected)
+                if on_rejected is not None:
+                    for line, email, message in rejected:
+                        on_rejected(line, email, message)
+                if on_progress is not None:
+                    on_progress(rows, created, failed, time.perf_counter() - started)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+        elapsed = time.perf_counter() - started
+        return {
+            'rows': rows,
+            'created': created,
+            'failed': failed,
+            'seconds': round(elapsed, 3),
+            'accounts_per_second': round(created / elapsed, 1) if elapsed else 0.0
+        }
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    import logs
+    from storage import create_storage, backend_from_env
+    from account_numbers import AccountNumberAllocator, SEQUENCE_NAME
+    from hashing import DEFAULT_METHOD
+
+    parser = argparse.ArgumentParser(description='Bulk customer onboarding from CSV or JSONL')
+    parser.add_argument('path', help='customer file (- for stdin)')
+    parser.add_argument('--format', choices=FORMATS, help='default: from the file extension')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--errors', help='write rejected rows here as JSONL (default: stderr)')
+    parser.add_argument('--hash-workers', type=int, help='processes for plaintext passwords (default: CPU count)')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logs.configure()
+    storage = create_storage(backend_from_env(), os.getenv('MONGODB_URI'), os.getenv('DATABASE_NAME', 'banking_system'))
+    # Schema only: no pool pre-warm or hot-account compactor for a one-off import
+    storage.init_schema()
+    allocator = AccountNumberAllocator.from_env(lambda count: storage.reserve_sequence(SEQUENCE_NAME, count))
+    importer = Importer(storage, allocator, os.getenv('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+                        batch_size=args.batch_size, hash_workers=args.hash_workers)
+
+    errors_file = open(args.errors, 'w') if args.errors else sys.stderr
+
+    def on_rejected(line, email, message):
+        errors_file.write(json.dumps({'line': line, 'email': email, 'error': message}) + '\n')
+
+    def on_progress(rows, created, failed, elapsed):
+        print(f"\r{rows:,} rows, {created:,} created, {failed:,} rejected, "
+              f"{created / elapsed if elapsed else 0:,.0f} accounts/s", end='', flush=True)
+
+    file_format = args.format or detect_format(args.path)
+    source = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+    try:
+        summary = importer.run(source, file_format, on_rejected, on_progress)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if errors_file is not sys.stderr:
+            errors_file.close()
+
+    print(f"\n[OK] {summary['created']:,} of {summary['rows']:,} customers onboarded in "
+          f"{summary['seconds']}s ({summary['accounts_per_second']:,} accounts/s), "
+          f"{summary['failed']:,} rejected")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,457 @@
+# Ledger reconciliation
+# Balances are moved with atomic $inc (balance_engine.py) but the ledger rows
+# are written afterwards, separately (and behind, with LedgerWriter), so the
+# two can drift apart. This offline job audits every account against its
+# transactions:
+#
+#   balance   opening balance (0) plus the signed amounts equals the stored
+#             balance (the account document plus its hot-account slots)
+#   row       balance_after - balance_before equals the row's signed amount
+#   chain     each row's balance_before is the previous row's balance_after
+#             in (timestamp, _id) order; rows that are only out of order
+#             (concurrent writes in the same instant) are not reported. A
+#             hot account's rows carry no running balance and are checked
+#             by the balance and transfer rules alone
+#   transfer  every transfer_out has a transfer_in with the same accounts,
+#             amount and timestamp, and the other way round
+#   orphan    a transaction whose account does not exist
+#
+# Accounts are split into shards of consecutive _ids and audited in a
+# process pool. A worker streams its shard's transactions in
+# (account_id, timestamp, _id) order from the history index in large
+# batches, turns them into NumPy columns and checks them with array
+# operations. Transfer legs come back to the parent as 64-bit keys and are
+# matched across all shards at the end.
+#
+# Run it with writes paused, or expect findings for the last few seconds of
+# traffic (rows still queued in LedgerWriter). Amounts in the report are
+# paise.
+#
+#   python reconcile.py [--workers N] [--shard-size 5000] [--report report.json]
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from datetime import datetime
+
+import numpy as np
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+import money
+from account_stats import STAT_TYPES
+from hot_accounts import SLOT_FIELDS, add_pending
+
+DEFAULT_SHARD_SIZE = 5000
+DEFAULT_BATCH_SIZE = 50000
+DEFAULT_MAX_FINDINGS = 1000
+
+CHECKS = ('balance', 'row', 'chain', 'transfer', 'orphan')
+
+# Indexed by type code (position in STAT_TYPES); unknown types get code -1
+_TYPE_CODES = {txn_type: code for code, txn_type in enumerate(STAT_TYPES)}
+_SIGNS = np.array([{'deposit': 1, 'withdrawal': -1, 'transfer_out': -1, 'transfer_in': 1}[t] for t in STAT_TYPES],
+                  dtype=np.int64)
+_TRANSFER_OUT = _TYPE_CODES['transfer_out']
+_TRANSFER_IN = _TYPE_CODES['transfer_in']
+
+# Reverse of history.HISTORY_INDEX: ascending time within each account
+_SHARD_SORT = [('account_id', -1), ('timestamp', 1), ('_id', 1)]
+_PROJECTION = {'account_id': 1, 'type': 1, 'amount': 1, 'balance_before': 1, 'balance_after': 1,
+               'timestamp': 1, 'to_account': 1, 'from_account': 1}
+# Stands in for a missing balance_before/balance_after
+_NO_BALANCE = np.iinfo(np.int64).min
+
+
+# ==================== COLUMNS ====================
+
+def _number_key(account_number):
+    """Account numbers are digit strings; anything else is hashed"""
+    if account_number is None:
+        return 0
+    if account_number.isdigit() and len(account_number) < 19:
+        return int(account_number)
+    return int.from_bytes(account_number.encode()[:8].ljust(8, b'\0'), 'little') ^ len(account_number)
+
+
+def _mix(x):
+    """splitmix64 finalizer on a uint64 array"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def transfer_keys(sender, recipient, amount, timestamp):
+    """64-bit key per transfer leg; both legs of one transfer get the same key"""
+    key = _mix(sender.astype(np.uint64))
+    for column in (recipient, amount, timestamp):
+        key = _mix(key ^ column.astype(np.uint64))
+    return key
+
+
+class Columns:
+    """A shard's transactions as NumPy arrays, in stream order"""
+
+    def __init__(self, ids, account, txn_type, amount, before, after, timestamp, counterparty):
+        self.ids = ids
+        self.account = account
+        self.type = txn_type
+        self.amount = amount
+        self.before = before
+        self.after = after
+        self.timestamp = timestamp
+        self.counterparty = counterparty
+
+    @classmethod
+    def from_cursor(cls, cursor, account_index, on_orphan):
+        """Read every row; rows of unknown accounts go to on_orphan(row) instead"""
+        ids, account, txn_type, amount, before, after, timestamp, counterparty = ([] for _ in range(8))
+        for t in cursor:
+            index = account_index.get(t['account_id'])
+            if index is None:
+                on_orphan(t)
+                continue
+            ids.append(t['_id'].binary)
+            account.append(index)
+            txn_type.append(_TYPE_CODES.get(t.get('type'), -1))
+            amount.append(t.get('amount') or 0)
+            balance = t.get('balance_before')
+            before.append(_NO_BALANCE if balance is None else balance)
+            balance = t.get('balance_after')
+            after.append(_NO_BALANCE if balance is None else balance)
+            timestamp.append(t['timestamp'])
+            counterparty.append(_number_key(t.get('to_account') or t.get('from_account')))
+        return cls(
+            np.frombuffer(b''.join(ids), dtype='V12'),
+            np.array(account, dtype=np.int64),
+            np.array(txn_type, dtype=np.int64),
+            np.array(amount, dtype=np.int64),
+            np.array(before, dtype=np.int64),
+            np.array(after, dtype=np.int64),
+            np.array(timestamp, dtype='datetime64[ms]').astype(np.int64),
+            np.array(counterparty, dtype=np.int64),
+        )
+
+    def __len__(self):
+        return len(self.account)
+
+
+def _oid(value):
+    return str(ObjectId(bytes(value)))
+
+
+# ==================== SHARD AUDIT ====================
+
+class Findings:
+    """Discrepancies of one shard, at most max_per_check kept per check"""
+
+    def __init__(self, max_per_check=DEFAULT_MAX_FINDINGS):
+        self.max_per_check = max_per_check
+        self.counts = dict.fromkeys(CHECKS, 0)
+        self.items = []
+        self._kept = dict.fromkeys(CHECKS, 0)
+
+    def add(self, check, **details):
+        self.counts[check] += 1
+        if self._kept[check] < self.max_per_check:
+            self._kept[check] += 1
+            self.items.append(dict(check=check, **details))
+
+
+def _group_starts(account):
+    """Index of the first row of each account's run (rows are grouped by account)"""
+    if not len(account):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, account[1:] != account[:-1]])
+
+
+def _only_reordered(before, after):
+    """The rows chain up in some order: every balance_before is the opening
+    balance or another row's balance_after, each used once"""
+    # The one value left over is the final balance
+    pool = np.sort(np.r_[0, after])
+    unique, counts = np.unique(before, return_counts=True)
+    available = np.searchsorted(pool, unique, 'right') - np.searchsorted(pool, unique, 'left')
+    return bool(np.all(counts <= available))
+
+
+def audit_columns(columns, accounts, findings):
+    """Balance, row and chain checks of one shard's columns
+
+    accounts is a list of (account_id, account_number, stored_balance)
+    in account index order.
+    """
+    n = len(columns)
+    known = columns.type >= 0
+    signed = np.where(known, columns.amount * _SIGNS[np.where(known, columns.type, 0)], 0)
+
+    # balance: 0 + sum(signed) == stored balance
+    totals = np.zeros(len(accounts), dtype=np.int64)
+    starts = _group_starts(columns.account)
+    if n:
+        totals[columns.account[starts]] = np.add.reduceat(signed, starts)
+    stored = np.array([balance for _, _, balance in accounts], dtype=np.int64)
+    for i in np.flatnonzero(totals != stored):
+        account_id, number, _ = accounts[i]
+        findings.add('balance', account_id=str(account_id), account_number=number,
+                     expected=int(stored[i]), actual=int(totals[i]))
+
+    has_chain = (columns.before != _NO_BALANCE) & (columns.after != _NO_BALANCE)
+
+    # row: each row's own arithmetic
+    bad_rows = has_chain & ((columns.after - columns.before != signed) | ~known)
+    for i in np.flatnonzero(bad_rows):
+        account_id, number, _ = accounts[columns.account[i]]
+        findings.add('row', account_id=str(account_id), account_number=number,
+                     transaction_id=_oid(columns.ids[i]),
+                     expected=int(columns.before[i] + signed[i]), actual=int(columns.after[i]))
+
+    # chain: balance_before follows the previous row's balance_after
+    previous = np.empty_like(columns.after)
+    previous[1:] = columns.after[:-1]
+    previous[starts] = 0
+    breaks = has_chain & (previous != _NO_BALANCE) & (columns.before != previous)
+    ends = np.r_[starts[1:], n]
+    for start, end in zip(starts, ends):
+        if not breaks[start:end].any():
+            continue
+        rows = slice(start, end)
+        if _only_reordered(columns.before[rows][has_chain[rows]], columns.after[rows][has_chain[rows]]):
+            continue
+        account_id, number, _ = accounts[columns.account[start]]
+        for i in start + np.flatnonzero(breaks[rows]):
+            findings.add('chain', account_id=str(account_id), account_number=number,
+                         transaction_id=_oid(columns.ids[i]),
+                         expected=int(previous[i]), actual=int(columns.before[i]))
+
+
+def transfer_legs(columns, accounts):
+    """(outgoing keys, outgoing ids, incoming keys, incoming ids) of a shard"""
+    numbers = np.array([_number_key(number) for _, number, _ in accounts], dtype=np.int64)
+    own = numbers[columns.account]
+
+    out = columns.type == _TRANSFER_OUT
+    out_keys = transfer_keys(own[out], columns.counterparty[out], columns.amount[out], columns.timestamp[out])
+
+    incoming = columns.type == _TRANSFER_IN
+    in_keys = transfer_keys(columns.counterparty[incoming], own[incoming],
+                            columns.amount[incoming], columns.timestamp[incoming])
+    return out_keys, columns.ids[out], in_keys, columns.ids[incoming]
+
+
+def _id_range(low, high):
+    """low <= id < high; None is unbounded"""
+    bounds = {}
+    if low is not None:
+        bounds['$gte'] = low
+    if high is not None:
+        bounds['$lt'] = high
+    return bounds or {'$exists': True}
+
+
+def load_accounts(db, low, high):
+    """[(account_id, account_number, stored_balance)] of a shard, hot-account slots included"""
+    id_range = _id_range(low, high)
+    slots = {}
+    for slot in db['balance_slots'].find({'account_id': id_range}, SLOT_FIELDS):
+        slots.setdefault(slot['account_id'], []).append(slot)
+    accounts = []
+    for account in db['accounts'].find(
+        {'_id': id_range}, {'account_number': 1, 'balance': 1, 'slots_folded': 1}
+    ):
+        account.setdefault('balance', 0)
+        add_pending(account, slots.get(account['_id'], []))
+        accounts.append((account['_id'], account.get('account_number'), account['balance']))
+    return accounts
+
+
+def audit_shard(db, low, high, batch_size=DEFAULT_BATCH_SIZE, max_findings=DEFAULT_MAX_FINDINGS):
+    """Audit the accounts with low <= _id < high; returns a result dict"""
+    accounts = load_accounts(db, low, high)
+    account_index = {account[0]: i for i, account in enumerate(accounts)}
+    findings = Findings(max_findings)
+
+    def on_orphan(t):
+        findings.add('orphan', account_id=str(t['account_id']), transaction_id=str(t['_id']))
+
+    cursor = db['transactions'].find(
+        {'account_id': _id_range(low, high)}, _PROJECTION
+    ).sort(_SHARD_SORT).batch_size(batch_size)
+    columns = Columns.from_cursor(cursor, account_index, on_orphan)
+    audit_columns(columns, accounts, findings)
+    out_keys, out_ids, in_keys, in_ids = transfer_legs(columns, accounts)
+
+    return {
+        'accounts': len(accounts),
+        'transactions': len(columns) + findings.counts['orphan'],
+        'counts': findings.counts,
+        'findings': findings.items,
+        'transfers': (out_keys, out_ids, in_keys, in_ids),
+    }
+
+
+# ==================== TRANSFERS ====================
+
+def unmatched(keys, other):
+    """Positions in keys without a partner in other, matching equal keys one to one"""
+    order = np.argsort(keys, kind='stable')
+    ordered = keys[order]
+    # 0 for the first leg with a key, 1 for the second, ...
+    rank = np.arange(len(ordered)) - np.searchsorted(ordered, ordered, 'left')
+    pool = np.sort(other)
+    available = np.searchsorted(pool, ordered, 'right') - np.searchsorted(pool, ordered, 'left')
+    return order[rank >= available]
+
+
+def match_transfers(results, findings):
+    """Report transfer legs without a counterpart in any shard"""
+    legs = [result['transfers'] for result in results]
+    if not legs:
+        return 0
+    out_keys = np.concatenate([leg[0] for leg in legs])
+    out_ids = np.concatenate([leg[1] for leg in legs])
+    in_keys = np.concatenate([leg[2] for leg in legs])
+    in_ids = np.concatenate([leg[3] for leg in legs])
+    for i in unmatched(out_keys, in_keys):
+        findings.add('transfer', transaction_id=_oid(out_ids[i]), missing='transfer_in')
+    for i in unmatched(in_keys, out_keys):
+        findings.add('transfer', transaction_id=_oid(in_ids[i]), missing='transfer_out')
+    return len(out_keys)
+
+
+# ==================== RUN ====================
+
+def plan_shards(db, shard_size=DEFAULT_SHARD_SIZE):
+    """[(low, high)] _id ranges of shard_size accounts each
+
+    The ranges are contiguous and unbounded at both ends, so a transaction
+    of a missing account still falls in one of them (as an orphan).
+    """
+    boundaries = [None]
+    count = 0
+    for account in db['accounts'].find({}, {'_id': 1}).sort('_id', 1):
+        if count == shard_size:
+            boundaries.append(account['_id'])
+            count = 0
+        count += 1
+    boundaries.append(None)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+_worker_db = None
+
+
+def _init_worker(uri, database):
+    global _worker_db
+    _worker_db = MongoClient(uri)[database]
+
+
+def _audit_in_worker(task):
+    low, high, batch_size, max_findings = task
+    return audit_shard(_worker_db, low, high, batch_size, max_findings)
+
+
+def reconcile(db, workers=None, uri=None, database=None, shard_size=DEFAULT_SHARD_SIZE,
+              batch_size=DEFAULT_BATCH_SIZE, max_findings=DEFAULT_MAX_FINDINGS, on_progress=None):
+    """Audit every account; returns the report dict
+
+    With workers > 1 each worker process opens its own client to uri/database;
+    otherwise the shards are audited one by one on db.
+    """
+    started = time.perf_counter()
+    shards = plan_shards(db, shard_size)
+    tasks = [(low, high, batch_size, max_findings) for low, high in shards]
+    results = []
+
+    if workers is not None and workers > 1 and len(tasks) > 1:
+        # Spawned, not forked: MongoClient is not fork-safe
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker, initargs=(uri, database)) as pool:
+            for result in pool.imap_unordered(_audit_in_worker, tasks):
+                results.append(result)
+                if on_progress is not None:
+                    on_progress(len(results), len(tasks))
+    else:
+        for low, high, batch_size, max_findings in tasks:
+            results.append(audit_shard(db, low, high, batch_size, max_findings))
+            if on_progress is not None:
+                on_progress(len(results), len(tasks))
+
+    findings = Findings(max_findings)
+    transfers = match_transfers(results, findings)
+    counts = dict.fromkeys(CHECKS, 0)
+    items = []
+    for result in results:
+        for check, count in result['counts'].items():
+            counts[check] += count
+        items.extend(result['findings'])
+    counts['transfer'] = findings.counts['transfer']
+    items.extend(findings.items)
+
+    return {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'seconds': round(time.perf_counter() - started, 3),
+        'shards': len(shards),
+        'accounts': sum(result['accounts'] for result in results),
+        'transactions': sum(result['transactions'] for result in results),
+        'transfer_legs_out': transfers,
+        'discrepancies': counts,
+        # Up to max_findings per check and shard (transfers: overall)
+        'findings': items,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reconcile balances with the transaction ledger')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='worker processes (default: one per CPU; 1 runs in this process)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help='accounts per shard')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='cursor batch size')
+    parser.add_argument('--max-findings', type=int, default=DEFAULT_MAX_FINDINGS,
+                        help='findings kept per check and shard')
+    parser.add_argument('--report', help='write the full report as JSON to this file')
+    parser.add_argument('--show', type=int, default=20, help='findings printed (default 20)')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    uri = os.getenv('MONGODB_URI')
+    database = os.getenv('DATABASE_NAME', 'banking_system')
+    db = MongoClient(uri)[database]
+
+    def on_progress(done, total):
+        print(f'\r{done:,}/{total:,} shards', end='', flush=True)
+
+    report = reconcile(db, args.workers, uri, database, args.shard_size, args.batch_size,
+                       args.max_findings, on_progress)
+    print()
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    rate = report['transactions'] / report['seconds'] if report['seconds'] else 0
+    print(f"[OK] {report['accounts']:,} accounts, {report['transactions']:,} transactions "
+          f"in {report['seconds']:.1f}s ({rate:,.0f} rows/s, {report['shards']:,} shards)")
+    total = sum(report['discrepancies'].values())
+    if not total:
+        print('[OK] No discrepancies')
+        return 0
+    print(f"[WARN] {total:,} discrepancies: " +
+          ', '.join(f'{check} {count:,}' for check, count in report['discrepancies'].items() if count))
+    for item in report['findings'][:args.show]:
+        line = f"  {item['check']:<9} {item.get('account_number') or item.get('account_id', '')}"
+        if 'transaction_id' in item:
+            line += f" txn {item['transaction_id']}"
+        if 'expected' in item:
+            line += f" expected {money.format_rupees(item['expected'])} got {money.format_rupees(item['actual'])}"
+        if 'missing' in item:
+            line += f" has no {item['missing']}"
+        print(line)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,429 @@
+# Server-side sessions for the Flask app
+# The cookie carries only a random session id; the data lives in a session
+# store, so sessions can be revoked (one, or every session of a user) and can
+# hold the resolved account (account_id, account_number) without trusting the
+# client with it. Loaded sessions are kept in a short-lived per-process LRU so
+# a busy session does not hit the store on every request.
+#
+#   SESSION_STORE       mongo | memory | shared | cookie
+#                       (default: mongo with STORAGE_BACKEND=mongo, else memory)
+#   SESSION_STORE_URL   shared store: memory:// (in-process stand-in) or redis://host:6379/0
+#   SESSION_TTL         seconds a session lives after login (default 86400)
+#   SESSION_CACHE_TTL   seconds a loaded session is reused in-process (default 5)
+#
+# memory keeps sessions in the worker process: run one worker with it.
+# cookie keeps Flask's signed-cookie sessions (no revocation).
+#
+# asgi_app.py reads and writes the same stores through AsyncSessionStore, so
+# one session id works on both entry points (memory excepted: it is per
+# process).
+
+import os
+import time
+import asyncio
+import secrets
+import threading
+from datetime import datetime, timedelta
+import bson
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from cache import LRUCache, _MISSING, shared_store_from_url
+
+STORES = ('mongo', 'memory', 'shared', 'cookie')
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, data=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(data, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # Compared on save: a new login gets a fresh id (no session fixation)
+        self.loaded_user_id = (data or {}).get('user_id')
+
+
+# ==================== STORES ====================
+
+class MemorySessionStore:
+    """Sessions in this process with a TTL, indexed by user for revocation"""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._data = {}
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            data, expires = entry
+            if expires < time.time():
+                self._remove(sid)
+                return None
+            return dict(data)
+
+    def save(self, sid, data, ttl):
+        with self._lock:
+            self._remove(sid)
+            self._data[sid] = (dict(data), time.time() + ttl)
+            if data.get('user_id'):
+                self._by_user.setdefault(data['user_id'], set()).add(sid)
+            while len(self._data) > self.maxsize:
+                # Least recently saved first
+                self._remove(next(iter(self._data)))
+
+    def delete(self, sid):
+        with self._lock:
+            self._remove(sid)
+
+    def _remove(self, sid):
+        entry = self._data.pop(sid, None)
+        if entry is not None and entry[0].get('user_id'):
+            sids = self._by_user.get(entry[0]['user_id'])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._by_user[entry[0]['user_id']]
+
+    def revoke_user(self, user_id):
+        with self._lock:
+            sids = list(self._by_user.get(user_id, ()))
+            for sid in sids:
+                self._remove(sid)
+            return sids
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MongoSessionStore:
+    """One document per session; a TTL index removes expired ones"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def init(self):
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+        self.collection.create_index('user_id')
+
+    def load(self, sid):
+        # The TTL monitor runs about once a minute; expiry is enforced here
+        doc = self.collection.find_one({'_id': sid, 'expires_at': {'$gt': datetime.utcnow()}})
+        return doc['data'] if doc is not None else None
+
+    def save(self, sid, data, ttl):
+        self.collection.replace_one({'_id': sid}, {
+            'data': dict(data),
+            'user_id': data.get('user_id'),
+            'expires_at': datetime.utcnow() + timedelta(seconds=ttl)
+        }, upsert=True)
+
+    def delete(self, sid):
+        self.collection.delete_one({'_id': sid})
+
+    def revoke_user(self, user_id):
+        sids = [doc['_id'] for doc in self.collection.find({'user_id': user_id}, {'_id': 1})]
+        if sids:
+            self.collection.delete_many({'_id': {'$in': sids}})
+        return sids
+
+
+class SharedSessionStore:
+    """Sessions in a redis-py style key/value store (get/set/delete with px)
+
+    Without server-side sets, revoking a user records a timestamp; sessions
+    created before it are rejected on load.
+    """
+
+    def __init__(self, client, ttl):
+        self.client = client
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(sid):
+        return f'sess:{sid}'
+
+    @staticmethod
+    def _revoked_key(user_id):
+        return f'sess:revoked:{user_id}'
+
+    def load(self, sid):
+        raw = self.client.get(self._key(sid))
+        if raw is None:
+            return None
+        doc = bson.decode(raw)
+        revoked = self.client.get(self._revoked_key(doc['data'].get('user_id')))
+        if revoked is not None and doc['created_at'] <= float(revoked):
+            return None
+        return doc['data']
+
+    def save(self, sid, data, ttl):
+        # A re-save keeps the creation time, or a session modified after a
+        # revocation would pass the check in load() again
+        existing = self.client.get(self._key(sid))
+        created_at = bson.decode(existing)['created_at'] if existing is not None else time.time()
+        raw = bson.encode({'data': dict(data), 'created_at': created_at})
+        self.client.set(self._key(sid), raw, px=int(ttl * 1000))
+
+    def delete(self, sid):
+        self.client.delete(self._key(sid))
+
+    def revoke_user(self, user_id):
+        # Kept as long as a session can live
+        self.client.set(self._revoked_key(user_id), repr(time.time()).encode(), px=int(self.ttl * 1000))
+        # Individual ids are unknown here; the caches drop them by user
+        return None
+
+
+class AsyncMongoSessionStore:
+    """MongoSessionStore on a Motor collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def init(self):
+        await self.collection.create_index('expires_at', expireAfterSeconds=0)
+        await self.collection.create_index('user_id')
+
+    async def load(self, sid):
+        doc = await self.collection.find_one({'_id': sid, 'expires_at': {'$gt': datetime.utcnow()}})
+        return doc['data'] if doc is not None else None
+
+    async def save(self, sid, data, ttl):
+        await self.collection.replace_one({'_id': sid}, {
+            'data': dict(data),
+            'user_id': data.get('user_id'),
+            'expires_at': datetime.utcnow() + timedelta(seconds=ttl)
+        }, upsert=True)
+
+    async def delete(self, sid):
+        await self.collection.delete_one({'_id': sid})
+
+    async def revoke_user(self, user_id):
+        sids = [doc['_id'] async for doc in self.collection.find({'user_id': user_id}, {'_id': 1})]
+        if sids:
+            await self.collection.delete_many({'_id': {'$in': sids}})
+        return sids
+
+
+class ThreadedSessionStore:
+    """Async front for a blocking store (a redis client), run in a worker thread"""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def load(self, sid):
+        return await asyncio.to_thread(self.store.load, sid)
+
+    async def save(self, sid, data, ttl):
+        await asyncio.to_thread(self.store.save, sid, data, ttl)
+
+    async def delete(self, sid):
+        await asyncio.to_thread(self.store.delete, sid)
+
+    async def revoke_user(self, user_id):
+        return await asyncio.to_thread(self.store.revoke_user, user_id)
+
+
+def _kind(default):
+    kind = os.getenv('SESSION_STORE', default).strip().lower()
+    if kind not in STORES:
+        raise ValueError(f'SESSION_STORE must be one of: {", ".join(STORES)}')
+    return kind
+
+
+def _shared_store(ttl):
+    client = shared_store_from_url(os.getenv('SESSION_STORE_URL', 'memory://'))
+    if client is None:
+        raise ValueError('SESSION_STORE=shared needs a usable SESSION_STORE_URL')
+    return SharedSessionStore(client, ttl)
+
+
+# ==================== FLASK INTERFACE ====================
+
+class SessionStore(SessionInterface):
+    """Flask SessionInterface over one of the stores above"""
+
+    def __init__(self, store, ttl=86400.0, cache_ttl=5.0):
+        self.store = store
+        self.ttl = ttl
+        # sid -> session data, in front of the store
+        self.cache = LRUCache(maxsize=10000, ttl=cache_ttl) if cache_ttl > 0 else None
+        self._counters = {'loads': 0, 'cache_hits': 0, 'saves': 0, 'revocations': 0}
+        self._counter_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, storage):
+        """SessionStore for SESSION_STORE, or None to keep signed-cookie sessions"""
+        ttl = float(os.getenv('SESSION_TTL', 86400))
+        kind = _kind('mongo' if storage.name == 'mongo' else 'memory')
+        if kind == 'cookie':
+            return None
+        if kind == 'memory':
+            store = MemorySessionStore()
+        elif kind == 'mongo':
+            if storage.name != 'mongo':
+                raise ValueError('SESSION_STORE=mongo needs STORAGE_BACKEND=mongo')
+            store = MongoSessionStore(storage.db['sessions'])
+        else:
+            store = _shared_store(ttl)
+        return cls(store, ttl=ttl, cache_ttl=float(os.getenv('SESSION_CACHE_TTL', 5)))
+
+    def init(self):
+        if hasattr(self.store, 'init'):
+            self.store.init()
+
+    def _count(self, name):
+        with self._counter_lock:
+            self._counters[name] += 1
+
+    def _load(self, sid):
+        if self.cache is not None:
+            data = self.cache.get(sid)
+            if data is not _MISSING:
+                self._count('cache_hits')
+                return data
+        self._count('loads')
+        data = self.store.load(sid)
+        if self.cache is not None and data is not None:
+            self.cache.set(sid, data)
+        return data
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self._load(sid)
+            if data is not None:
+                return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self._forget(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        if not session.new and session.get('user_id') != session.loaded_user_id:
+            self._forget(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+
+        data = dict(session)
+        self.store.save(session.sid, data, self.ttl)
+        if self.cache is not None:
+            self.cache.set(session.sid, data)
+        self._count('saves')
+
+        response.set_cookie(
+            name, session.sid,
+            max_age=int(self.ttl),
+            domain=domain, path=path,
+            httponly=self.get_cookie_httponly(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+    def _forget(self, sid):
+        self.store.delete(sid)
+        if self.cache is not None:
+            self.cache.delete(sid)
+
+    def revoke_user(self, user_id):
+        """End every session of the user. Other workers' caches keep a revoked
+        session for at most SESSION_CACHE_TTL seconds."""
+        sids = self.store.revoke_user(user_id)
+        if self.cache is not None:
+            if sids is None:
+                self.cache.clear()
+            else:
+                self.cache.delete(*sids)
+        self._count('revocations')
+
+    def stats(self):
+        with self._counter_lock:
+            stats = dict(self._counters)
+        stats['cached_sessions'] = len(self.cache) if self.cache is not None else 0
+        return stats
+
+
+# ==================== ASGI ====================
+
+class AsyncSessionStore:
+    """Session ids for asgi_app.py over the same stores and cookie as SessionStore"""
+
+    def __init__(self, store, ttl=86400.0, cache_ttl=5.0):
+        self.store = store
+        self.ttl = ttl
+        self.cache = LRUCache(maxsize=10000, ttl=cache_ttl) if cache_ttl > 0 else None
+        self._counters = {'loads': 0, 'cache_hits': 0, 'saves': 0, 'revocations': 0}
+
+    @classmethod
+    def from_env(cls, db):
+        """AsyncSessionStore for SESSION_STORE, or None to keep signed-cookie sessions"""
+        ttl = float(os.getenv('SESSION_TTL', 86400))
+        kind = _kind('mongo')
+        if kind == 'cookie':
+            return None
+        if kind == 'mongo':
+            store = AsyncMongoSessionStore(db['sessions'])
+        elif kind == 'memory':
+            store = ThreadedSessionStore(MemorySessionStore())
+        else:
+            store = ThreadedSessionStore(_shared_store(ttl))
+        return cls(store, ttl=ttl, cache_ttl=float(os.getenv('SESSION_CACHE_TTL', 5)))
+
+    async def init(self):
+        if hasattr(self.store, 'init'):
+            await self.store.init()
+
+    async def load(self, sid):
+        if self.cache is not None:
+            data = self.cache.get(sid)
+            if data is not _MISSING:
+                self._counters['cache_hits'] += 1
+                return data
+        self._counters['loads'] += 1
+        data = await self.store.load(sid)
+        if self.cache is not None and data is not None:
+            self.cache.set(sid, data)
+        return data
+
+    async def create(self, data):
+        """Save data under a fresh session id (one per login) and return the id"""
+        sid = secrets.token_urlsafe(32)
+        await self.store.save(sid, data, self.ttl)
+        if self.cache is not None:
+            self.cache.set(sid, dict(data))
+        self._counters['saves'] += 1
+        return sid
+
+    async def delete(self, sid):
+        await self.store.delete(sid)
+        if self.cache is not None:
+            self.cache.delete(sid)
+
+    async def revoke_user(self, user_id):
+        sids = await self.store.revoke_user(user_id)
+        if self.cache is not None:
+            if sids is None:
+                self.cache.clear()
+            else:
+                self.cache.delete(*sids)
+        self._counters['revocations'] += 1
+
+    def stats(self):
+        stats = dict(self._counters)
+        stats['cached_sessions'] = len(self.cache) if self.cache is not None else 0
+        return stats
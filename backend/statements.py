@@ -0,0 +1,299 @@
+# Monthly account statements
+# A statement covers one closed calendar month (UTC): opening and closing
+# balance, totals and counts per transaction type, and the month's
+# transactions as compact rows (one array per transaction, in the order of
+# COLUMNS). A closed month never changes, so its statement is built once,
+# stored write-once under '<account_id>:<YYYY-MM>' and served with a strong
+# ETag and an immutable Cache-Control. The first request for a month builds
+# it; to precompute every account's statement for a month:
+#   python statements.py generate [--period YYYY-MM]
+#
+#   STATEMENT_CLOSE_DELAY  seconds after the month ends before it counts as
+#                          closed, so write-behind ledger rows have landed
+#                          (default 3600)
+#   STATEMENT_MAX_ROWS     rows kept in one statement (default 50000); above
+#                          it the statement keeps its totals, sets
+#                          rows_truncated, and the rows are read from
+#                          /api/transactions/history?from=...&to=...
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+
+import money
+import history
+from account_stats import STAT_TYPES
+from validation import ValidationError
+
+# Bump when the stored layout changes; it is part of the ETag
+# (2: amounts and balances in paise)
+VERSION = 2
+COLUMNS = ('id', 'timestamp', 'type', 'amount', 'balance_after', 'counterparty', 'description')
+SIGNS = {'deposit': 1, 'transfer_in': 1, 'withdrawal': -1, 'transfer_out': -1}
+
+DEFAULT_CLOSE_DELAY = 3600
+DEFAULT_MAX_ROWS = 50000
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+# ==================== PERIODS ====================
+
+def parse_period(value):
+    """'YYYY-MM' -> (start, end) datetimes, end exclusive; raises ValidationError"""
+    try:
+        start = datetime.strptime(value, '%Y-%m')
+    except (TypeError, ValueError):
+        raise ValidationError('Statement period must be YYYY-MM')
+    return start, _next_month(start)
+
+
+def _next_month(start):
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+
+def _previous_month(start):
+    return start.replace(year=start.year - 1, month=12) if start.month == 1 else start.replace(month=start.month - 1)
+
+
+def close_delay_from_env():
+    return float(os.getenv('STATEMENT_CLOSE_DELAY', DEFAULT_CLOSE_DELAY))
+
+
+def is_closed(period, now, close_delay=DEFAULT_CLOSE_DELAY):
+    _, end = parse_period(period)
+    return (now - end).total_seconds() >= close_delay
+
+
+def closed_periods(created_at, now, close_delay=DEFAULT_CLOSE_DELAY):
+    """Closed months since the account was opened, newest first"""
+    periods = []
+    month = created_at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while (now - _next_month(month)).total_seconds() >= close_delay:
+        periods.append(month.strftime('%Y-%m'))
+        month = _next_month(month)
+    periods.reverse()
+    return periods
+
+
+def latest_closed_period(now, close_delay=DEFAULT_CLOSE_DELAY):
+    month = _previous_month(now.replace(day=1, hour=0, minute=0, second=0, microsecond=0))
+    if (now - _next_month(month)).total_seconds() < close_delay:
+        month = _previous_month(month)
+    return month.strftime('%Y-%m')
+
+
+def statement_id(account_id, period):
+    return f'{account_id}:{period}'
+
+
+def etag(account_id, period):
+    """Known without reading the statement, since it never changes"""
+    return hashlib.sha1(f'{statement_id(account_id, period)}:{VERSION}'.encode()).hexdigest()
+
+
+# ==================== BUILDING ====================
+
+def _row(t):
+    counterparty = t.get('to_account') or t.get('from_account')
+    return [t['_id'], t['timestamp'], t['type'], t['amount'], t.get('balance_after'),
+            counterparty, t.get('description')]
+
+
+def build_statement(account_id, period, opening_balance, transactions, now, max_rows=DEFAULT_MAX_ROWS):
+    """Statement document from the period's transactions (ascending)"""
+    totals = {txn_type: {'total': 0, 'count': 0} for txn_type in STAT_TYPES}
+    rows = []
+    net = 0
+    count = 0
+    for t in transactions:
+        bucket = totals[t['type']]
+        bucket['total'] += t['amount']
+        bucket['count'] += 1
+        net += SIGNS[t['type']] * t['amount']
+        count += 1
+        if len(rows) < max_rows:
+            rows.append(_row(t))
+
+    return {
+        '_id': statement_id(account_id, period),
+        'account_id': account_id,
+        'period': period,
+        'version': VERSION,
+        'opening_balance': opening_balance,
+        # Carried forward as the next month's opening balance, so the chain of
+        # statements always adds up
+        'closing_balance': opening_balance + net,
+        'totals': totals,
+        'transaction_count': count,
+        'rows': rows,
+        'rows_truncated': count > len(rows),
+        'generated_at': now
+    }
+
+
+def max_rows_from_env():
+    return int(os.getenv('STATEMENT_MAX_ROWS', DEFAULT_MAX_ROWS))
+
+
+def opening_balance(storage, account_id, start, created_at):
+    if created_at is not None and created_at >= start:
+        # Accounts open with a zero balance
+        return 0
+    previous = storage.find_statement(statement_id(account_id, _previous_month(start).strftime('%Y-%m')))
+    if previous is not None:
+        return previous['closing_balance']
+    return storage.net_change_before(account_id, start)
+
+
+def get_statement(storage, account_id, period, created_at=None, now=None, max_rows=None):
+    """Stored statement for a closed period, built and stored on first use"""
+    stored = storage.find_statement(statement_id(account_id, period))
+    if stored is not None:
+        return stored
+    start, end = parse_period(period)
+    statement = build_statement(
+        account_id, period,
+        opening_balance(storage, account_id, start, created_at),
+        storage.period_transactions(account_id, start, end),
+        now or datetime.utcnow(), max_rows_from_env() if max_rows is None else max_rows
+    )
+    # Another worker may have stored it meanwhile; theirs is kept
+    return storage.insert_statement(statement)
+
+
+class AsyncStatementStore:
+    """The Storage methods statements need, on Motor collections (asgi_app.py)"""
+
+    def __init__(self, transactions_collection, statements_collection):
+        self.transactions = transactions_collection
+        self.statements = statements_collection
+
+    async def period_transactions(self, account_id, start, end):
+        query = history.filter_query(account_id, history.HistoryFilter(start, end, None))
+        return await self.transactions.find(query).sort([('timestamp', 1), ('_id', 1)]).to_list(None)
+
+    async def net_change_before(self, account_id, end):
+        pipeline = [
+            {'$match': history.filter_query(account_id, history.HistoryFilter(None, end, None))},
+            {'$group': {'_id': '$type', 'total': {'$sum': '$amount'}}}
+        ]
+        return sum(SIGNS[row['_id']] * row['total'] for row in await self.transactions.aggregate(pipeline).to_list(None))
+
+    async def find_statement(self, statement_id):
+        return await self.statements.find_one({'_id': statement_id})
+
+    async def insert_statement(self, statement):
+        try:
+            await self.statements.insert_one(statement)
+            return statement
+        except DuplicateKeyError:
+            return await self.statements.find_one({'_id': statement['_id']})
+
+
+async def get_statement_async(store, account_id, period, created_at=None, now=None, max_rows=None):
+    """get_statement() on an AsyncStatementStore"""
+    stored = await store.find_statement(statement_id(account_id, period))
+    if stored is not None:
+        return stored
+    start, end = parse_period(period)
+    if created_at is not None and created_at >= start:
+        opening = 0
+    else:
+        previous = await store.find_statement(statement_id(account_id, _previous_month(start).strftime('%Y-%m')))
+        if previous is not None:
+            opening = previous['closing_balance']
+        else:
+            opening = await store.net_change_before(account_id, start)
+    statement = build_statement(
+        account_id, period, opening,
+        await store.period_transactions(account_id, start, end),
+        now or datetime.utcnow(), max_rows_from_env() if max_rows is None else max_rows
+    )
+    return await store.insert_statement(statement)
+
+
+def serialize_statement(statement, account_number):
+    rows = []
+    for row in statement['rows']:
+        row = list(row)
+        row[0] = str(row[0])
+        row[1] = row[1].isoformat() + 'Z'
+        row[3] = money.rupees(row[3])
+        if row[4] is not None:
+            row[4] = money.rupees(row[4])
+        rows.append(row)
+    return {
+        'period': statement['period'],
+        'account_number': account_number,
+        'opening_balance': money.rupees(statement['opening_balance']),
+        'closing_balance': money.rupees(statement['closing_balance']),
+        'totals': {
+            txn_type: {'total': money.rupees(bucket['total']), 'count': bucket['count']}
+            for txn_type, bucket in statement['totals'].items()
+        },
+        'transaction_count': statement['transaction_count'],
+        'columns': list(COLUMNS),
+        'rows': rows,
+        'rows_truncated': statement['rows_truncated'],
+        'generated_at': statement['generated_at'].isoformat() + 'Z'
+    }
+
+
+def generate(storage, period, on_progress=None):
+    """Build every missing statement for a closed period; returns (built, existing)"""
+    start, end = parse_period(period)
+    built = existing = 0
+    for account_id, created_at in storage.iter_accounts(created_before=end):
+        if storage.find_statement(statement_id(account_id, period)) is not None:
+            existing += 1
+        else:
+            get_statement(storage, account_id, period, created_at)
+            built += 1
+        if on_progress is not None and (built + existing) % 1000 == 0:
+            on_progress(built, existing)
+    return built, existing
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    import logs
+    from storage import create_storage, backend_from_env
+
+    parser = argparse.ArgumentParser(description='Precompute monthly statements')
+    parser.add_argument('command', choices=['generate'])
+    parser.add_argument('--period', help='YYYY-MM (default: the latest closed month)')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logs.configure()
+    now = datetime.utcnow()
+    close_delay = close_delay_from_env()
+    period = args.period or latest_closed_period(now, close_delay)
+    try:
+        closed = is_closed(period, now, close_delay)
+    except ValidationError as e:
+        parser.error(str(e))
+    if not closed:
+        parser.error(f'{period} has not closed yet')
+
+    storage = create_storage(backend_from_env(), os.getenv('MONGODB_URI'), os.getenv('DATABASE_NAME', 'banking_system'))
+    # Schema only: no pool pre-warm or hot-account compactor for a batch job
+    storage.init_schema()
+
+    def on_progress(built, existing):
+        print(f'\r{built:,} built, {existing:,} already stored', end='', flush=True)
+
+    started = time.perf_counter()
+    built, existing = generate(storage, period, on_progress)
+    print(f'\n[OK] {period}: {built:,} statements built, {existing:,} already stored '
+          f'in {time.perf_counter() - started:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# Static frontend assets served from memory
+# At startup every file under frontend/ is read once, fingerprinted with a
+# hash of its content and precompressed (gzip always, brotli when the brotli
+# package is installed; a variant is kept only if it is smaller). CSS and JS
+# are also published under a fingerprinted name (css/style.3f2a9c1b4d.css)
+# and the HTML pages are rewritten to reference those names, so they can be
+# cached as immutable for a year: a new build changes the name.
+#
+# Requests are answered from the table by StaticMiddleware in front of the
+# Flask app (StaticASGIMiddleware in asgi_app.py) before any routing, session
+# or storage work: no disk reads, no compression per request, a strong ETag per
+# encoding and 304 for If-None-Match. Everything else reaches the app.
+#
+#   STATIC_ASSETS      'memory' (default) serves from the table; 'disk' reads
+#                      frontend/ on every request, for editing the frontend
+#                      without restarting
+#   STATIC_MIN_COMPRESS  bytes below which assets are not compressed
+#                        (default 512)
+#
+# To ship the same files to a CDN or nginx (gzip_static / brotli_static):
+#   python static_assets.py build --out dist/
+
+import os
+import re
+import sys
+import gzip
+import hashlib
+import argparse
+import mimetypes
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FRONTEND_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'frontend'))
+
+# Files that are not part of the site
+SKIP_SUFFIXES = ('.bak', '.old', '.orig', '~')
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+FINGERPRINTED_SUFFIXES = ('.css', '.js')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# HTML and the unversioned names keep their URL across builds, so they are
+# revalidated on every use (a cheap 304)
+REVALIDATE = 'no-cache'
+
+DEFAULT_MIN_COMPRESS = 512
+FINGERPRINT_LENGTH = 10
+
+# href="css/style.css", src="js/utils.js" (relative, no scheme)
+_REFERENCE = re.compile(r'''(\b(?:href|src)=["'])([^"':?#]+\.(?:css|js))(["'])''')
+
+mimetypes.add_type('application/javascript', '.js')
+
+
+class Asset:
+    """One URL: the body in every encoding it is stored in"""
+
+    __slots__ = ('path', 'content_type', 'cache_control', 'variants')
+
+    def __init__(self, path, content_type, cache_control, variants):
+        self.path = path
+        self.content_type = content_type
+        self.cache_control = cache_control
+        # encoding ('br', 'gzip', 'identity') -> (body, etag), best first
+        self.variants = variants
+
+    def select(self, accept_encoding):
+        """(encoding, body, etag) for the client's Accept-Encoding"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding, (body, etag) in self.variants.items():
+            if encoding == 'identity' or accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return encoding, body, etag
+
+
+def parse_accept_encoding(header):
+    """{'gzip': 1.0, 'br': 0.5, ...} from an Accept-Encoding header"""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def fingerprinted_name(path, digest):
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{digest[:FINGERPRINT_LENGTH]}{ext}'
+
+
+def compress(body, content_type, min_size=DEFAULT_MIN_COMPRESS):
+    """Encoded variants of body worth storing, best first"""
+    variants = []
+    if len(body) < min_size or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return variants
+    if brotli is not None:
+        variants.append(('br', brotli.compress(body, quality=11)))
+    # mtime=0 so the same input always gives the same bytes (and ETag)
+    variants.append(('gzip', gzip.compress(body, compresslevel=9, mtime=0)))
+    return [(encoding, data) for encoding, data in variants if len(data) < len(body)]
+
+
+def _variants(body, content_type, min_compress):
+    digest = hashlib.sha256(body).hexdigest()
+    variants = {}
+    for encoding, data in compress(body, content_type, min_compress):
+        variants[encoding] = (data, f'"{digest[:20]}-{encoding}"')
+    variants['identity'] = (body, f'"{digest[:20]}"')
+    return digest, variants
+
+
+def _site_files(root):
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for filename in sorted(filenames):
+            if filename.startswith('.') or filename.endswith(SKIP_SUFFIXES):
+                continue
+            full = os.path.join(directory, filename)
+            yield os.path.relpath(full, root).replace(os.sep, '/'), full
+
+
+class StaticAssets:
+    """URL path -> Asset for every file under root, built once"""
+
+    def __init__(self, root=FRONTEND_DIR, min_compress=DEFAULT_MIN_COMPRESS):
+        self.root = root
+        self.min_compress = min_compress
+        self.assets = {}
+        # unversioned name -> fingerprinted name, e.g. css/style.css -> css/style.3f2a9c1b4d.css
+        self.manifest = {}
+        self._counters = {'hits': 0, 'not_modified': 0, 'br': 0, 'gzip': 0, 'identity': 0, 'bytes_sent': 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(min_compress=int(os.getenv('STATIC_MIN_COMPRESS', DEFAULT_MIN_COMPRESS)))
+
+    def build(self):
+        files = {}
+        for path, full in _site_files(self.root):
+            with open(full, 'rb') as f:
+                files[path] = f.read()
+
+        # Versioned assets first, so the pages can point at them
+        assets = {}
+        manifest = {}
+        for path, body in files.items():
+            if not path.endswith(FINGERPRINTED_SUFFIXES):
+                continue
+            content_type = _content_type(path)
+            digest, variants = _variants(body, content_type, self.min_compress)
+            versioned = fingerprinted_name(path, digest)
+            manifest[path] = versioned
+            assets[versioned] = Asset(versioned, content_type, IMMUTABLE, variants)
+            # The old name still works, for pages cached before this build
+            assets[path] = Asset(path, content_type, REVALIDATE, variants)
+
+        for path, body in files.items():
+            if path in assets:
+                continue
+            content_type = _content_type(path)
+            if path.endswith('.html'):
+                body = self.rewrite(body, path, manifest)
+            _, variants = _variants(body, content_type, self.min_compress)
+            assets[path] = Asset(path, content_type, REVALIDATE, variants)
+
+        if 'index.html' in assets:
+            assets[''] = assets['index.html']
+        self.assets = assets
+        self.manifest = manifest
+        return self
+
+    @staticmethod
+    def rewrite(html, path, manifest):
+        """Point a page's stylesheet and script references at their fingerprinted names"""
+        base = os.path.dirname(path)
+
+        def replace(match):
+            reference = match.group(2)
+            target = os.path.normpath(os.path.join(base, reference)).replace(os.sep, '/')
+            if target not in manifest:
+                return match.group(0)
+            versioned = manifest[target]
+            # Keep the reference relative to the page, as it was written
+            replacement = reference[:len(reference) - len(os.path.basename(reference))] + os.path.basename(versioned)
+            return match.group(1) + replacement + match.group(3)
+
+        return _REFERENCE.sub(replace, html.decode('utf-8')).encode('utf-8')
+
+    def lookup(self, path):
+        return self.assets.get(path.lstrip('/'))
+
+    def respond(self, asset, accept_encoding, if_none_match, head=False):
+        """(status, headers, body) for a GET or HEAD of asset"""
+        encoding, body, etag = asset.select(accept_encoding)
+        headers = [
+            ('ETag', etag),
+            ('Cache-Control', asset.cache_control),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if if_none_match and _etag_matches(if_none_match, etag):
+            self._count('not_modified')
+            return 304, headers, b''
+        headers.append(('Content-Type', asset.content_type))
+        headers.append(('Content-Length', str(len(body))))
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        self._count('hits', encoding)
+        if head:
+            return 200, headers, b''
+        self._count('bytes_sent', amount=len(body))
+        return 200, headers, body
+
+    def _count(self, *names, amount=1):
+        with self._lock:
+            for name in names:
+                self._counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['assets'] = len(self.assets)
+        # An unversioned name shares its bodies with the fingerprinted one
+        bodies = {id(body): len(body) for asset in self.assets.values() for body, _ in asset.variants.values()}
+        stats['stored_bytes'] = sum(bodies.values())
+        stats['brotli'] = brotli is not None
+        return stats
+
+    def write(self, out):
+        """Write every asset and its .br/.gz siblings under out; returns the number of files"""
+        suffixes = {'br': '.br', 'gzip': '.gz', 'identity': ''}
+        written = 0
+        for path, asset in self.assets.items():
+            if not path:
+                continue
+            for encoding, (body, _) in asset.variants.items():
+                target = os.path.join(out, path + suffixes[encoding])
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(body)
+                written += 1
+        return written
+
+
+def _content_type(path):
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type == 'application/javascript':
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def _etag_matches(header, etag):
+    if header.strip() == '*':
+        return True
+    # A weak validator (W/"...") matches on its opaque part
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+# ==================== WSGI ====================
+
+class StaticMiddleware:
+    """Answer GET/HEAD for known assets before the wrapped app sees the request"""
+
+    def __init__(self, app, assets):
+        self.app = app
+        self.assets = assets
+
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD')
+        if method in ('GET', 'HEAD'):
+            asset = self.assets.lookup(environ.get('PATH_INFO', ''))
+            if asset is not None:
+                status, headers, body = self.assets.respond(
+                    asset, environ.get('HTTP_ACCEPT_ENCODING'), environ.get('HTTP_IF_NONE_MATCH'),
+                    head=method == 'HEAD'
+                )
+                start_response('200 OK' if status == 200 else '304 Not Modified', headers)
+                return [body]
+        return self.app(environ, start_response)
+
+
+# ==================== ASGI ====================
+
+class StaticASGIMiddleware:
+    """StaticMiddleware for an ASGI app"""
+
+    def __init__(self, app, assets):
+        self.app = app
+        self.assets = assets
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            asset = self.assets.lookup(scope['path'])
+            if asset is not None:
+                request_headers = dict(scope['headers'])
+                status, headers, body = self.assets.respond(
+                    asset, request_headers.get(b'accept-encoding', b'').decode('latin-1'),
+                    request_headers.get(b'if-none-match', b'').decode('latin-1'),
+                    head=scope['method'] == 'HEAD'
+                )
+                await send({
+                    'type': 'http.response.start', 'status': status,
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+                })
+                await send({'type': 'http.response.body', 'body': body})
+                return
+        await self.app(scope, receive, send)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fingerprint and precompress the frontend')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--out', required=True, help='directory to write the site to')
+    parser.add_argument('--root', default=FRONTEND_DIR)
+    args = parser.parse_args(argv)
+
+    assets = StaticAssets(args.root).build()
+    written = assets.write(args.out)
+    stats = assets.stats()
+    print(f"[OK] {written:,} files written to {args.out} "
+          f"({len(assets.manifest)} fingerprinted, brotli {'on' if stats['brotli'] else 'off'})")
+    for name, versioned in sorted(assets.manifest.items()):
+        print(f"  {name} -> {versioned}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,356 @@
+# Storage backends behind the route handlers
+# The handlers in app.py talk to a Storage object instead of raw
+# collections, so the same API can run against MongoDB or the in-process
+# MemoryStorage (memory_storage.py) for offline load tests and profiling.
+#
+#   STORAGE_BACKEND  mongo (default) | memory
+#
+# Queries passed to credit/debit/transfer are single-field equality filters
+# on _id, user_id or account_number, the only shapes the handlers use.
+
+import os
+from abc import ABC, abstractmethod
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import mongo
+import money
+import history
+import statements
+from hot_accounts import ShardedBalanceEngine
+from ledger_writer import LedgerWriter
+from batch import BatchProcessor
+
+BACKENDS = ('mongo', 'memory')
+
+
+def is_duplicate_email(error):
+    """True when a DuplicateKeyError came from the unique email index"""
+    return 'email' in str(error)
+
+
+class Storage(ABC):
+    """Interface shared by MongoStorage and MemoryStorage"""
+
+    name = None
+
+    def init(self, prewarm_connections=0):
+        """Per-process setup of a serving worker: init_schema(), then start()"""
+        self.init_schema()
+        self.start(prewarm_connections)
+
+    def init_schema(self):
+        """Connect, ensure indexes and check the data layout; all a command-line tool needs"""
+
+    def start(self, prewarm_connections=0):
+        """Worker-only startup: index cleanup, pool pre-warm, background threads"""
+
+    # ---------- users ----------
+
+    @abstractmethod
+    def find_user_by_email(self, email):
+        ...
+
+    @abstractmethod
+    def insert_user(self, user):
+        """Store the user, setting user['_id']; raises DuplicateKeyError on a taken email"""
+
+    @abstractmethod
+    def replace_password_hash(self, user_id, old_hash, new_hash):
+        """Compare-and-set, so a concurrent password change is never overwritten"""
+
+    @abstractmethod
+    def create_user_with_account(self, user, account):
+        """Store both or neither, setting their _ids and account['user_id'];
+        raises DuplicateKeyError on a taken email"""
+
+    @abstractmethod
+    def create_users_with_accounts(self, users, accounts):
+        """Bulk create_user_with_account(); returns {index: error message} for rows not created"""
+
+    # ---------- accounts ----------
+
+    @abstractmethod
+    def insert_account(self, account):
+        ...
+
+    @abstractmethod
+    def find_account_by_user(self, user_id):
+        ...
+
+    @abstractmethod
+    def find_account_by_number(self, account_number):
+        ...
+
+    @abstractmethod
+    def credit(self, query, amount, inc=None):
+        """BalanceChange; raises AccountNotFound"""
+
+    @abstractmethod
+    def debit(self, query, amount, inc=None):
+        """BalanceChange; raises AccountNotFound or InsufficientFunds"""
+
+    @abstractmethod
+    def transfer(self, from_query, to_query, amount, from_inc=None, to_inc=None):
+        """(sent, received) BalanceChanges"""
+
+    @abstractmethod
+    def run_batch(self, user_id, mode, items, now):
+        """BatchResult, or None when the user has no account"""
+
+    @abstractmethod
+    def reserve_sequence(self, name, count):
+        """Atomically advance counter `name` by count; returns the first reserved value"""
+
+    # ---------- transactions ----------
+
+    @abstractmethod
+    def append_transactions(self, *transactions):
+        ...
+
+    @abstractmethod
+    def transactions_page(self, account_id, limit, cursor=None, filters=history.NO_FILTER):
+        """(history rows, next_cursor), newest first, within a history.HistoryFilter"""
+
+    @abstractmethod
+    def recent_transactions(self, account_id, limit):
+        """Newest `limit` transactions as history rows"""
+
+    @abstractmethod
+    def iter_transactions(self, account_id):
+        """Every transaction document of the account, newest first"""
+
+    @abstractmethod
+    def period_transactions(self, account_id, start, end):
+        """Transaction documents with start <= timestamp < end, oldest first"""
+
+    @abstractmethod
+    def net_change_before(self, account_id, end):
+        """Sum of the account's signed transaction amounts before `end`"""
+
+    # ---------- statements ----------
+
+    @abstractmethod
+    def iter_accounts(self, created_before):
+        """(account _id, created_at) of accounts opened before the given time"""
+
+    @abstractmethod
+    def find_statement(self, statement_id):
+        ...
+
+    @abstractmethod
+    def insert_statement(self, statement):
+        """Store a statement unless one with its _id exists; returns the stored one"""
+
+    def metric_sources(self):
+        """(prefix, documentation, stats function) triples for /metrics"""
+        return []
+
+
+class MongoStorage(Storage):
+    name = 'mongo'
+
+    def __init__(self, client, database_name):
+        self.client = client
+        self.db = db = client[database_name]
+        self.users = db['users']
+        self.accounts = db['accounts']
+        self.transactions = db['transactions']
+        self.balance_slots = db['balance_slots']
+        self.counters = db['counters']
+        self.statements = db['statements']
+
+        self.balance_engine = ShardedBalanceEngine.from_env(client, self.accounts, self.balance_slots)
+        self.compact_interval = float(os.getenv('HOT_ACCOUNT_COMPACT_INTERVAL', 30))
+        self.ledger = LedgerWriter.from_env(self.transactions)
+        self.batch_processor = BatchProcessor(client, self.accounts)
+
+    def init_schema(self):
+        self.client.admin.command('ping')
+
+        self.users.create_index('email', unique=True)
+        self.accounts.create_index('account_number', unique=True)
+        self.accounts.create_index('user_id')
+        self.transactions.create_index(history.HISTORY_INDEX)
+        self.transactions.create_index(history.HISTORY_TYPE_INDEX)
+        self.balance_engine.create_indexes()
+        self._check_money_layout()
+
+    def start(self, prewarm_connections=0):
+        # Superseded by the compound history index
+        for legacy_index in ('account_id_1', 'timestamp_1'):
+            try:
+                self.transactions.drop_index(legacy_index)
+            except Exception:
+                pass
+
+        if prewarm_connections:
+            mongo.prewarm(self.client, prewarm_connections)
+
+        # start() runs once per worker process, after fork
+        self.balance_engine.start_compactor(self.compact_interval)
+
+    def _check_money_layout(self):
+        if self.counters.find_one({'_id': money.LAYOUT_MARKER}) is not None:
+            return
+        # A database without the marker is either new or still holds float rupees
+        if self.accounts.find_one({'balance': {'$type': 'double'}}, {'_id': 1}) is not None:
+            raise money.LegacyMoneyLayout('Balances are stored as float rupees; run python migrate_money.py first')
+        self.counters.update_one({'_id': money.LAYOUT_MARKER}, {'$setOnInsert': {'value': money.LAYOUT}}, upsert=True)
+
+    def find_user_by_email(self, email):
+        return self.users.find_one({'email': email})
+
+    def insert_user(self, user):
+        return self.users.insert_one(user).inserted_id
+
+    def replace_password_hash(self, user_id, old_hash, new_hash):
+        result = self.users.update_one({'_id': user_id, 'password': old_hash}, {'$set': {'password': new_hash}})
+        return result.modified_count == 1
+
+    def create_user_with_account(self, user, account):
+        # Assigned up front so a partial write can be found and undone
+        user.setdefault('_id', ObjectId())
+
+        def callback(session):
+            self.users.insert_one(user, session=session)
+            account['user_id'] = user['_id']
+            self.accounts.insert_one(account, session=session)
+
+        try:
+            mongo.run_in_transaction(self.client, callback)
+        except Exception:
+            # Without transaction support the user may already be written
+            self.users.delete_one({'_id': user['_id']})
+            raise
+        return user['_id']
+
+    def create_users_with_accounts(self, users, accounts):
+        errors = {}
+        # One read per batch finds the emails already taken, so the batch
+        # itself can go in as a single transaction
+        taken = {
+            u['email'] for u in self.users.find({'email': {'$in': [u['email'] for u in users]}}, {'email': 1})
+        }
+        rows = []
+        for i, user in enumerate(users):
+            if user['email'] in taken:
+                errors[i] = 'Email already registered'
+            else:
+                rows.append(i)
+        if not rows:
+            return errors
+
+        for i in rows:
+            users[i].setdefault('_id', ObjectId())
+
+        def callback(session):
+            self.users.insert_many([users[i] for i in rows], session=session)
+            for i in rows:
+                accounts[i]['user_id'] = users[i]['_id']
+            self.accounts.insert_many([accounts[i] for i in rows], session=session)
+
+        try:
+            mongo.run_in_transaction(self.client, callback)
+        except (BulkWriteError, DuplicateKeyError):
+            # An email registered since the read (or twice in the batch):
+            # undo whatever a non-transactional attempt wrote, then go row by row
+            user_ids = [users[i]['_id'] for i in rows]
+            self.accounts.delete_many({'user_id': {'$in': user_ids}})
+            self.users.delete_many({'_id': {'$in': user_ids}})
+            for i in rows:
+                accounts[i].pop('_id', None)
+                try:
+                    self.create_user_with_account(users[i], accounts[i])
+                except DuplicateKeyError as e:
+                    errors[i] = 'Email already registered' if is_duplicate_email(e) else str(e)
+        return errors
+
+    def insert_account(self, account):
+        return self.accounts.insert_one(account).inserted_id
+
+    def find_account_by_user(self, user_id):
+        return self.balance_engine.view(self.accounts.find_one({'user_id': user_id}))
+
+    def find_account_by_number(self, account_number):
+        return self.balance_engine.view(self.accounts.find_one({'account_number': account_number}))
+
+    def credit(self, query, amount, inc=None):
+        return self.balance_engine.credit(query, amount, inc)
+
+    def debit(self, query, amount, inc=None):
+        return self.balance_engine.debit(query, amount, inc)
+
+    def transfer(self, from_query, to_query, amount, from_inc=None, to_inc=None):
+        return self.balance_engine.transfer(from_query, to_query, amount, from_inc, to_inc)
+
+    def run_batch(self, user_id, mode, items, now):
+        hot = self.balance_engine.lookup({'user_id': ObjectId(user_id)})
+        if hot is not None:
+            # Batches plan against the account document's balance alone
+            self.balance_engine.consolidate(hot[0])
+        return self.batch_processor.run(user_id, mode, items, now)
+
+    def reserve_sequence(self, name, count):
+        counter = self.counters.find_one_and_update(
+            {'_id': name}, {'$inc': {'value': count}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return counter['value'] - count
+
+    def append_transactions(self, *transactions):
+        self.ledger.write(*transactions)
+
+    def transactions_page(self, account_id, limit, cursor=None, filters=history.NO_FILTER):
+        return history.fetch_page(self.transactions, account_id, limit, cursor, filters)
+
+    def recent_transactions(self, account_id, limit):
+        return history.fetch_recent(self.transactions, account_id, limit)
+
+    def iter_transactions(self, account_id):
+        return history.export_cursor(self.transactions, account_id)
+
+    def period_transactions(self, account_id, start, end):
+        query = history.filter_query(account_id, history.HistoryFilter(start, end, None))
+        return self.transactions.find(query).sort([('timestamp', 1), ('_id', 1)]).batch_size(history.EXPORT_BATCH_SIZE)
+
+    def net_change_before(self, account_id, end):
+        pipeline = [
+            {'$match': history.filter_query(account_id, history.HistoryFilter(None, end, None))},
+            {'$group': {'_id': '$type', 'total': {'$sum': '$amount'}}}
+        ]
+        return sum(statements.SIGNS[row['_id']] * row['total'] for row in self.transactions.aggregate(pipeline))
+
+    def iter_accounts(self, created_before):
+        for account in self.accounts.find({'created_at': {'$lt': created_before}}, {'created_at': 1}):
+            yield account['_id'], account['created_at']
+
+    def find_statement(self, statement_id):
+        return self.statements.find_one({'_id': statement_id})
+
+    def insert_statement(self, statement):
+        try:
+            self.statements.insert_one(statement)
+            return statement
+        except DuplicateKeyError:
+            return self.statements.find_one({'_id': statement['_id']})
+
+    def metric_sources(self):
+        return [
+            ('ledger', 'Ledger writer', self.ledger.metrics),
+            ('hot_accounts', 'Hot account sub-balances', self.balance_engine.stats)
+        ]
+
+
+def create_storage(backend, mongo_uri=None, database_name='banking_system'):
+    if backend == 'memory':
+        from memory_storage import MemoryStorage
+        return MemoryStorage()
+    if backend == 'mongo':
+        return MongoStorage(mongo.create_client(mongo_uri), database_name)
+    raise ValueError(f'STORAGE_BACKEND must be one of: {", ".join(BACKENDS)}')
+
+
+def backend_from_env():
+    return os.getenv('STORAGE_BACKEND', 'mongo').strip().lower()
@@ -0,0 +1,9 @@
+# Unit tests for the backend modules
+# Run from the backend directory:
+#   pip install -r requirements-dev.txt
+#   python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+import pytest
+
+import account_numbers
+from account_numbers import AccountNumberAllocator, SequenceExhausted
+from memory_storage import MemoryStorage
+
+
+class CountingReserve:
+    """reserve() over MemoryStorage's counter, recording each block size"""
+
+    def __init__(self):
+        self.storage = MemoryStorage()
+        self.sizes = []
+
+    def __call__(self, count):
+        self.sizes.append(count)
+        return self.storage.reserve_sequence(account_numbers.SEQUENCE_NAME, count)
+
+
+def test_luhn_check_digit():
+    # The textbook example
+    assert account_numbers.luhn_check_digit('7992739871') == '3'
+    assert account_numbers.is_valid('79927398713')
+    assert account_numbers.format_account_number('2001', 0) == '2001000000006'
+
+
+def test_is_valid_catches_typos():
+    number = account_numbers.format_account_number('2001', 1234)
+    assert len(number) == 13 and account_numbers.is_valid(number)
+    for i in range(len(number)):
+        wrong = number[:i] + str((int(number[i]) + 1) % 10) + number[i + 1:]
+        assert not account_numbers.is_valid(wrong)
+    # Swapped neighbours ('23' -> '32')
+    assert not account_numbers.is_valid(number[:9] + number[10] + number[9] + number[11:])
+    assert not account_numbers.is_valid('2001abc')
+    assert not account_numbers.is_valid('7')
+
+
+def test_one_reservation_per_block():
+    reserve = CountingReserve()
+    allocator = AccountNumberAllocator(reserve, block_size=10)
+    numbers = [allocator.next() for _ in range(25)]
+    assert len(set(numbers)) == 25
+    assert all(account_numbers.is_valid(n) for n in numbers)
+    assert reserve.sizes == [10, 10, 10]
+    assert allocator.stats() == {'blocks_reserved': 3, 'block_remaining': 5}
+
+
+def test_bulk_allocation_reserves_what_it_needs_at_once():
+    reserve = CountingReserve()
+    allocator = AccountNumberAllocator(reserve, block_size=10)
+    allocator.next()
+    numbers = allocator.allocate(50)
+    # 9 from the first block, the other 41 in one reservation
+    assert reserve.sizes == [10, 41]
+    assert len(set(numbers)) == 50
+
+
+def test_processes_never_share_numbers():
+    reserve = CountingReserve()
+    workers = [AccountNumberAllocator(reserve, block_size=7) for _ in range(4)]
+    found = []
+    lock = threading.Lock()
+
+    def run(allocator):
+        mine = [allocator.next() for _ in range(30)]
+        with lock:
+            found.extend(mine)
+
+    threads = [threading.Thread(target=run, args=(w,)) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(found) == len(set(found)) == 120
+
+
+def test_sequence_exhaustion(monkeypatch):
+    monkeypatch.setattr(account_numbers, 'SEQUENCE_DIGITS', 2)
+    allocator = AccountNumberAllocator(CountingReserve(), block_size=60)
+    allocator.next()
+    with pytest.raises(SequenceExhausted):
+        allocator.allocate(60)
+
+
+def test_async_allocation():
+    reserve = CountingReserve()
+
+    async def areserve(count):
+        await asyncio.sleep(0)
+        return reserve(count)
+
+    allocator = AccountNumberAllocator(areserve, block_size=5)
+
+    async def scenario():
+        return await asyncio.gather(*(allocator.anext() for _ in range(12)))
+
+    numbers = asyncio.run(scenario())
+    assert len(set(numbers)) == 12
+    assert all(account_numbers.is_valid(n) for n in numbers)
@@ -0,0 +1,115 @@
+import importlib
+
+import pytest
+
+import idempotency
+from memory_storage import MemoryStorage
+
+PASSWORD = 'Passw0rd!x'
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """The Flask app on a fresh in-memory storage"""
+    monkeypatch.setenv('STORAGE_BACKEND', 'memory')
+    monkeypatch.setenv('STATIC_ASSETS', 'disk')
+    module = importlib.import_module('app')
+    monkeypatch.setattr(module, 'storage', MemoryStorage())
+    monkeypatch.setattr(module, 'idempotency_keys', idempotency.Idempotency(idempotency.MemoryIdempotencyStore()))
+    return module
+
+
+def register(client, email='user@example.com'):
+    response = client.post('/api/auth/register', json={
+        'name': 'Test User', 'email': email, 'phone': '9876543210', 'password': PASSWORD
+    })
+    assert response.status_code == 200, response.json
+    return response.json['account_number']
+
+
+def balance(client):
+    return client.get('/api/account/balance').json['balance']
+
+
+def test_deposit_replays_with_the_same_key(backend):
+    client = backend.app.test_client()
+    register(client)
+
+    headers = {idempotency.HEADER: 'deposit-1'}
+    first = client.post('/api/transactions/deposit', json={'amount': 100}, headers=headers)
+    second = client.post('/api/transactions/deposit', json={'amount': 100}, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.headers[idempotency.REPLAYED_HEADER] == 'true'
+    assert second.get_data() == first.get_data()
+    assert balance(client) == 100.0
+
+
+def test_error_after_the_balance_changed_is_replayed(backend, monkeypatch):
+    client = backend.app.test_client()
+    register(client)
+
+    def failing_append(*transactions):
+        raise RuntimeError('ledger unavailable')
+
+    monkeypatch.setattr(backend.storage, 'append_transactions', failing_append)
+    headers = {idempotency.HEADER: 'deposit-1'}
+    first = client.post('/api/transactions/deposit', json={'amount': 100}, headers=headers)
+    assert first.status_code == 500
+
+    # The credit went through: the retry must not apply it again
+    retry = client.post('/api/transactions/deposit', json={'amount': 100}, headers=headers)
+    assert retry.status_code == 500
+    assert retry.headers[idempotency.REPLAYED_HEADER] == 'true'
+    assert balance(client) == 100.0
+
+
+def test_error_before_the_balance_changed_releases_the_key(backend, monkeypatch):
+    client = backend.app.test_client()
+    register(client)
+
+    credit = backend.storage.credit
+
+    def failing_credit(*args, **kwargs):
+        raise RuntimeError('storage unavailable')
+
+    monkeypatch.setattr(backend.storage, 'credit', failing_credit)
+    headers = {idempotency.HEADER: 'deposit-1'}
+    assert client.post('/api/transactions/deposit', json={'amount': 100}, headers=headers).status_code == 500
+
+    monkeypatch.setattr(backend.storage, 'credit', credit)
+    retry = client.post('/api/transactions/deposit', json={'amount': 100}, headers=headers)
+    assert retry.status_code == 200
+    assert idempotency.REPLAYED_HEADER not in retry.headers
+    assert balance(client) == 100.0
+
+
+def test_transfer_error_after_the_move_is_replayed(backend, monkeypatch):
+    sender = backend.app.test_client()
+    register(sender, 'sender@example.com')
+    recipient = backend.app.test_client()
+    to_account = register(recipient, 'recipient@example.com')
+    sender.post('/api/transactions/deposit', json={'amount': 500})
+
+    def failing_append(*transactions):
+        raise RuntimeError('ledger unavailable')
+
+    monkeypatch.setattr(backend.storage, 'append_transactions', failing_append)
+    headers = {idempotency.HEADER: 'transfer-1'}
+    body = {'to_account': to_account, 'amount': 200}
+    assert sender.post('/api/transactions/transfer', json=body, headers=headers).status_code == 500
+    assert sender.post('/api/transactions/transfer', json=body, headers=headers).status_code == 500
+
+    assert balance(sender) == 300.0
+    assert balance(recipient) == 200.0
+
+
+def test_balance_written_elsewhere_is_read_at_once(backend):
+    client = backend.app.test_client()
+    number = register(client)
+    assert balance(client) == 0.0
+
+    # Another worker's credit, straight to storage
+    backend.storage.credit({'account_number': number}, 12345)
+    assert balance(client) == 123.45
+    assert client.get('/api/dashboard?fields=account').json['account']['balance'] == 123.45
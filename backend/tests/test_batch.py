@@ -0,0 +1,195 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson.int64 import Int64
+from bson.objectid import ObjectId
+
+import batch
+from batch import BatchRejected, parse_batch, plan
+from validation import ValidationError
+
+
+def items(*operations, mode='atomic'):
+    return parse_batch({'mode': mode, 'operations': list(operations)})[1]
+
+
+def with_recipients(parsed):
+    for item in parsed:
+        if item.op == 'transfer' and not item.error:
+            batch.assign_recipient(item, {'_id': ObjectId(), 'user_id': ObjectId()}, ObjectId())
+    return parsed
+
+
+def test_parse_batch_marks_invalid_items():
+    mode, parsed = parse_batch({'operations': [
+        {'type': 'deposit', 'amount': 10}, {'type': 'bogus'}, {'type': 'withdraw', 'amount': '1.005'}
+    ]})
+    assert mode == 'atomic'
+    assert parsed[0].error is None and parsed[0].amount == 1000
+    assert parsed[1].error == 'Type must be deposit, withdraw or transfer'
+    assert 'more than two decimal places' in parsed[2].error
+
+
+@pytest.mark.parametrize('body', [
+    {'operations': []},
+    {'operations': 'deposit'},
+    {'mode': 'eventually', 'operations': [{'type': 'deposit', 'amount': 1}]},
+    {'operations': [{'type': 'deposit', 'amount': 1}] * (batch.MAX_BATCH_OPERATIONS + 1)},
+])
+def test_parse_batch_rejects_body(body):
+    with pytest.raises(ValidationError):
+        parse_batch(body)
+
+
+def test_plan_in_order_with_deposits_funding_later_debits():
+    parsed = with_recipients(items(
+        {'type': 'deposit', 'amount': 50},
+        {'type': 'transfer', 'amount': 120, 'to_account': '2001000000014'},
+        {'type': 'withdraw', 'amount': 30},
+    ))
+    accepted, net, required = plan(parsed, 10000, 'atomic')
+    assert accepted == parsed
+    assert net == 5000 - 12000 - 3000
+    # The running balance bottoms out at 100 + 50 - 120 - 30 = 0
+    assert required == 10000
+
+
+def test_plan_atomic_rejects_unfundable_batch():
+    parsed = items({'type': 'withdraw', 'amount': 60}, {'type': 'withdraw', 'amount': 60})
+    with pytest.raises(BatchRejected) as rejected:
+        plan(parsed, 10000, 'atomic')
+    statuses = [result['status'] for result in rejected.value.results]
+    assert statuses == ['ok', 'failed']
+    assert rejected.value.results[1]['error'] == 'Insufficient balance. Available: Rs.40.00'
+
+
+def test_plan_best_effort_skips_unfunded_and_invalid():
+    parsed = items(
+        {'type': 'withdraw', 'amount': 60},
+        {'type': 'bogus'},
+        {'type': 'withdraw', 'amount': 60},
+        {'type': 'withdraw', 'amount': 40},
+        mode='best_effort'
+    )
+    accepted, net, required = plan(parsed, 10000, 'best_effort')
+    assert [item.index for item in accepted] == [0, 3]
+    assert net == -10000
+    assert required == 10000
+    assert parsed[2].unfunded is not None
+
+
+def test_plan_resets_unfunded_on_replan():
+    parsed = items({'type': 'withdraw', 'amount': 60}, mode='best_effort')
+    plan(parsed, 0, 'best_effort')
+    assert parsed[0].unfunded is not None
+    accepted, _, _ = plan(parsed, 6000, 'best_effort')
+    assert accepted == parsed and parsed[0].unfunded is None
+
+
+def test_check_batch_refuses_atomic_batch_with_invalid_item():
+    with pytest.raises(BatchRejected):
+        batch.check_batch('atomic', items({'type': 'deposit', 'amount': 1}, {'type': 'bogus'}))
+    batch.check_batch('best_effort', items({'type': 'bogus'}, mode='best_effort'))
+
+
+@pytest.fixture
+def bank():
+    mongomock = pytest.importorskip('mongomock')
+    client = mongomock.MongoClient()
+    accounts = client.db['accounts']
+    users = {}
+    for number, balance in (('2001000000006', 10000), ('2001000000014', 0), ('2001000000022', 0)):
+        users[number] = ObjectId()
+        accounts.insert_one({'user_id': users[number], 'account_number': number, 'balance': Int64(balance)})
+    return client, accounts, users
+
+
+def balances(accounts):
+    return {a['account_number']: a['balance'] for a in accounts.find()}
+
+
+def delete_after_resolve(monkeypatch, processor, accounts, number):
+    resolve = processor._resolve_recipients
+
+    def resolve_then_delete(user_id, parsed):
+        resolve(user_id, parsed)
+        accounts.delete_one({'account_number': number})
+
+    monkeypatch.setattr(processor, '_resolve_recipients', resolve_then_delete)
+
+
+def test_processor_chains_recipient_balances(bank):
+    client, accounts, users = bank
+    accounts.update_one({'account_number': '2001000000014'}, {'$set': {'balance': Int64(700)}})
+    result = batch.BatchProcessor(client, accounts).run(users['2001000000006'], 'atomic', items(
+        {'type': 'transfer', 'amount': 10, 'to_account': '2001000000014'},
+        {'type': 'transfer', 'amount': 20, 'to_account': '2001000000014'},
+    ), datetime(2026, 10, 1))
+
+    credits = [t for t in result.transactions if t['type'] == 'transfer_in']
+    assert [(t['balance_before'], t['balance_after']) for t in credits] == [(700, 1700), (1700, 3700)]
+    assert balances(accounts) == {'2001000000006': 7000, '2001000000014': 3700, '2001000000022': 0}
+
+
+def test_atomic_batch_without_transactions_backs_out_a_vanished_recipient(bank, monkeypatch):
+    client, accounts, users = bank
+    processor = batch.BatchProcessor(client, accounts)
+    delete_after_resolve(monkeypatch, processor, accounts, '2001000000022')
+
+    with pytest.raises(BatchRejected) as rejected:
+        processor.run(users['2001000000006'], 'atomic', items(
+            {'type': 'transfer', 'amount': 20, 'to_account': '2001000000014'},
+            {'type': 'transfer', 'amount': 50, 'to_account': '2001000000022'},
+        ), datetime(2026, 10, 1))
+
+    assert rejected.value.results[1]['error'] == 'Recipient account not found'
+    # Nothing moved, statistics included
+    assert balances(accounts) == {'2001000000006': 10000, '2001000000014': 0}
+    recipient = accounts.find_one({'account_number': '2001000000014'})
+    assert recipient['stats']['transfer_in'] == {'total': 0, 'count': 0}
+    sender = accounts.find_one({'account_number': '2001000000006'})
+    assert sender['stats']['transfer_out'] == {'total': 0, 'count': 0}
+
+
+def test_best_effort_batch_goes_on_without_a_vanished_recipient(bank, monkeypatch):
+    client, accounts, users = bank
+    processor = batch.BatchProcessor(client, accounts)
+    delete_after_resolve(monkeypatch, processor, accounts, '2001000000022')
+
+    parsed = items(
+        {'type': 'transfer', 'amount': 20, 'to_account': '2001000000014'},
+        {'type': 'transfer', 'amount': 50, 'to_account': '2001000000022'},
+        mode='best_effort'
+    )
+    result = processor.run(users['2001000000006'], 'best_effort', parsed, datetime(2026, 10, 1))
+
+    assert [r['status'] for r in result.results()] == ['ok', 'failed']
+    assert result.balance_after == 8000
+    assert balances(accounts) == {'2001000000006': 8000, '2001000000014': 2000}
+
+
+def test_async_processor_backs_out_a_vanished_recipient(monkeypatch):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+
+    async def scenario():
+        client = mongomock_motor.AsyncMongoMockClient()
+        accounts = client.db['accounts']
+        sender_user = ObjectId()
+        await accounts.insert_one({'user_id': sender_user, 'account_number': '2001000000006', 'balance': Int64(10000)})
+        await accounts.insert_one({'user_id': ObjectId(), 'account_number': '2001000000014', 'balance': Int64(0)})
+        processor = batch.AsyncBatchProcessor(client, accounts)
+        resolve = processor._resolve_recipients
+
+        async def resolve_then_delete(user_id, parsed):
+            await resolve(user_id, parsed)
+            await accounts.delete_one({'account_number': '2001000000014'})
+
+        monkeypatch.setattr(processor, '_resolve_recipients', resolve_then_delete)
+        with pytest.raises(BatchRejected):
+            await processor.run(sender_user, 'atomic', items(
+                {'type': 'transfer', 'amount': 50, 'to_account': '2001000000014'}
+            ), datetime(2026, 10, 1))
+        return (await accounts.find_one({'user_id': sender_user}))['balance']
+
+    assert asyncio.run(scenario()) == 10000
@@ -0,0 +1,71 @@
+import importlib
+
+import pytest
+
+from memory_storage import MemoryStorage
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'memory')
+    monkeypatch.setenv('STATIC_ASSETS', 'disk')
+    module = importlib.import_module('app')
+    monkeypatch.setattr(module, 'storage', MemoryStorage())
+    return module
+
+
+@pytest.fixture
+def client(backend):
+    """A signed-in user with one deposit of ₹100"""
+    client = backend.app.test_client()
+    client.post('/api/auth/register', json={
+        'name': 'Test User', 'email': 'user@example.com', 'phone': '9876543210', 'password': 'Passw0rd!x'
+    })
+    client.post('/api/transactions/deposit', json={'amount': 100})
+    return client
+
+
+def test_unchanged_dashboard_is_revalidated_without_reading_history(backend, client, monkeypatch):
+    first = client.get('/api/dashboard')
+    assert first.status_code == 200
+    assert first.headers['ETag'].startswith('W/')
+    assert first.json['recent_transactions'][0]['amount'] == 100.0
+
+    def no_history(*args, **kwargs):
+        raise AssertionError('history read for a 304')
+
+    monkeypatch.setattr(backend.storage, 'recent_transactions', no_history)
+    again = client.get('/api/dashboard', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+def test_etag_changes_with_the_balance_and_the_fields(client):
+    etag = client.get('/api/dashboard').headers['ETag']
+    assert client.get('/api/dashboard?fields=account').headers['ETag'] != etag
+    assert client.get('/api/dashboard?limit=5').headers['ETag'] != etag
+
+    client.post('/api/transactions/deposit', json={'amount': 50})
+    changed = client.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.json['account']['balance'] == 150.0
+
+
+def test_lagging_ledger_gets_a_body_etag(backend, client, monkeypatch):
+    # The balance moved but its ledger row has not landed yet
+    monkeypatch.setattr(backend.storage, 'append_transactions', lambda *transactions: None)
+    client.post('/api/transactions/deposit', json={'amount': 50})
+
+    response = client.get('/api/dashboard')
+    assert response.status_code == 200
+    # The account-derived ETag would outlive the row's arrival
+    assert not response.headers['ETag'].startswith('W/')
+    assert response.json['recent_transactions'][0]['amount'] == 100.0
+
+
+def test_field_selection_and_validation(client):
+    body = client.get('/api/dashboard?fields=stats').json
+    assert 'stats' in body and 'account' not in body and 'recent_transactions' not in body
+    assert client.get('/api/dashboard?fields=balance').status_code == 400
+    assert client.get('/api/dashboard?limit=ten').status_code == 400
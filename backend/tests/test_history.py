@@ -0,0 +1,116 @@
+import importlib
+from datetime import datetime, timedelta
+
+import pytest
+from bson.objectid import ObjectId
+
+import history
+from memory_storage import MemoryStorage
+from validation import ValidationError
+
+mongomock = pytest.importorskip('mongomock')
+
+START = datetime(2026, 3, 1, 9, 30)
+
+
+def ledger(account_id, count=7):
+    """Rows in pairs sharing a timestamp, so pages split ties on _id"""
+    rows = []
+    for i in range(count):
+        rows.append({
+            '_id': ObjectId(), 'account_id': account_id,
+            'type': 'deposit' if i % 3 else 'withdrawal', 'amount': 100 * (i + 1),
+            'balance_before': 0, 'balance_after': 100 * (i + 1),
+            'timestamp': START + timedelta(days=i // 2), 'description': f'row {i}'
+        })
+    return rows
+
+
+def walk(fetch, limit, filters=history.NO_FILTER):
+    """Every page's rows until next_cursor runs out"""
+    pages = []
+    cursor = None
+    while True:
+        rows, cursor = fetch(limit, cursor, filters)
+        pages.append(rows)
+        if cursor is None:
+            return pages
+
+
+@pytest.fixture
+def sources():
+    account_id = ObjectId()
+    rows = ledger(account_id)
+    collection = mongomock.MongoClient().db['transactions']
+    collection.insert_many([dict(row) for row in rows])
+    storage = MemoryStorage()
+    storage.append_transactions(*[dict(row) for row in rows])
+
+    def mongo(limit, cursor, filters):
+        return history.fetch_page(collection, account_id, limit, cursor, filters)
+
+    def memory(limit, cursor, filters):
+        return storage.transactions_page(account_id, limit, cursor, filters)
+
+    return rows, mongo, memory
+
+
+def test_pages_cover_every_row_once_newest_first(sources):
+    rows, mongo, memory = sources
+    for fetch in (mongo, memory):
+        pages = walk(fetch, 3)
+        assert [len(page) for page in pages] == [3, 3, 1]
+        ids = [row['_id'] for page in pages for row in page]
+        expected = sorted(rows, key=lambda t: (t['timestamp'], t['_id']), reverse=True)
+        assert ids == [str(t['_id']) for t in expected]
+
+
+def test_both_backends_return_the_same_rows(sources):
+    _, mongo, memory = sources
+    assert walk(mongo, 2) == walk(memory, 2)
+
+
+def test_filters_narrow_the_pages(sources):
+    rows, mongo, memory = sources
+    filters = history.parse_filter({'from': '2026-03-02', 'to': '2026-03-03', 'type': 'deposit'})
+    expected = [t for t in rows
+                if t['type'] == 'deposit' and datetime(2026, 3, 2) <= t['timestamp'] < datetime(2026, 3, 4)]
+    for fetch in (mongo, memory):
+        found = [row['_id'] for page in walk(fetch, 1, filters) for row in page]
+        assert sorted(found) == sorted(str(t['_id']) for t in expected)
+
+
+def test_cursor_round_trip_and_bad_input():
+    transaction = {'timestamp': START, '_id': ObjectId()}
+    assert history.decode_cursor(history.encode_cursor(transaction)) == (START, transaction['_id'])
+    with pytest.raises(history.InvalidCursor):
+        history.decode_cursor('not-a-cursor')
+    with pytest.raises(ValidationError):
+        history.parse_filter({'from': '2026-03-05', 'to': '2026-03-01'})
+    with pytest.raises(ValidationError):
+        history.parse_filter({'type': 'refund'})
+    assert history.parse_limit('100000') == history.MAX_PAGE_SIZE
+    assert history.parse_limit('x') == history.DEFAULT_PAGE_SIZE
+
+
+def test_history_endpoint_pages_and_rejects_bad_cursors(monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'memory')
+    monkeypatch.setenv('STATIC_ASSETS', 'disk')
+    app = importlib.import_module('app')
+    monkeypatch.setattr(app, 'storage', MemoryStorage())
+    client = app.app.test_client()
+    client.post('/api/auth/register', json={
+        'name': 'Test User', 'email': 'user@example.com', 'phone': '9876543210', 'password': 'Passw0rd!x'
+    })
+    for amount in (10, 20, 30):
+        client.post('/api/transactions/deposit', json={'amount': amount})
+
+    first = client.get('/api/transactions/history?limit=2').json
+    assert [t['amount'] for t in first['transactions']] == [30.0, 20.0]
+    assert first['has_more']
+    second = client.get(f"/api/transactions/history?limit=2&cursor={first['next_cursor']}").json
+    assert [t['amount'] for t in second['transactions']] == [10.0]
+    assert not second['has_more'] and second['next_cursor'] is None
+
+    assert client.get('/api/transactions/history?cursor=garbage').status_code == 400
+    assert client.get('/api/transactions/history?type=refund').status_code == 400
@@ -0,0 +1,210 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson.int64 import Int64
+from bson.objectid import ObjectId
+
+from balance_engine import InsufficientFunds
+from hot_accounts import ShardedBalanceEngine, AsyncShardedBalanceEngine, slot_id
+
+mongomock = pytest.importorskip('mongomock')
+
+NUMBER = '2001000000006'
+
+
+@pytest.fixture
+def engine():
+    client = mongomock.MongoClient()
+    db = client['test']
+    engine = ShardedBalanceEngine(client, db['accounts'], db['balance_slots'])
+    engine.create_indexes()
+    db['accounts'].insert_one({'user_id': ObjectId(), 'account_number': NUMBER, 'balance': Int64(1000)})
+    assert engine.enable(NUMBER, 4) == 4
+    return engine
+
+
+def slot_balances(engine):
+    return sorted(slot['balance'] for slot in engine.slots.find())
+
+
+def stored_balance(engine):
+    return engine.accounts.find_one({'account_number': NUMBER})['balance']
+
+
+def balance(engine):
+    return engine.view(engine.accounts.find_one({'account_number': NUMBER}))['balance']
+
+
+def test_credits_go_to_slots_and_reads_add_them(engine):
+    change = engine.credit({'account_number': NUMBER}, 500)
+    # No running balance to place the credit in
+    assert (change.balance_before, change.balance_after) == (None, None)
+    assert change.account['account_number'] == NUMBER
+    assert stored_balance(engine) == 1000
+    assert sum(slot_balances(engine)) == 500
+    assert balance(engine) == 1500
+
+
+def test_credits_spread_over_the_slots(engine):
+    for _ in range(200):
+        engine.credit({'account_number': NUMBER}, 1)
+    assert all(slot_balances(engine))
+    assert engine.stats()['slot_credits'] == 200
+
+
+def test_debit_within_account_balance_leaves_slots(engine):
+    engine.credit({'account_number': NUMBER}, 500)
+    change = engine.debit({'account_number': NUMBER}, 300)
+    assert (change.balance_before, change.balance_after) == (None, None)
+    assert balance(engine) == 1200
+    assert sum(slot_balances(engine)) == 500
+    assert engine.stats()['consolidations'] == 0
+
+
+def test_debit_beyond_account_balance_consolidates_slots(engine):
+    for _ in range(3):
+        engine.credit({'account_number': NUMBER}, 500)
+    engine.debit({'account_number': NUMBER}, 2000)
+    assert stored_balance(engine) == 500
+    assert balance(engine) == 500
+    # Slots keep what they were credited; the account records it as taken in
+    assert sum(slot_balances(engine)) == 1500
+    assert engine.stats()['consolidations'] == 1
+
+
+def test_debit_beyond_whole_balance_is_refused(engine):
+    engine.credit({'account_number': NUMBER}, 500)
+    with pytest.raises(InsufficientFunds) as refused:
+        engine.debit({'account_number': NUMBER}, 1600)
+    # Consolidated before giving up; nothing was lost
+    assert refused.value.available == 1500
+    assert stored_balance(engine) == 1500
+
+
+def test_consolidation_moves_slot_statistics(engine):
+    engine.credit({'account_number': NUMBER}, 500, {'stats.total_transfers_in': 500})
+    engine.consolidate(engine.accounts.find_one({'account_number': NUMBER})['_id'])
+    account = engine.accounts.find_one({'account_number': NUMBER})
+    assert account['balance'] == 1500
+    assert account['stats']['total_transfers_in'] == 500
+
+
+def test_fold_is_applied_once(engine):
+    engine.credit({'account_number': NUMBER}, 500, {'stats.total_transfers_in': 500})
+    account_id = engine.accounts.find_one({'account_number': NUMBER})['_id']
+    stale = engine.accounts.find_one({'_id': account_id}).get('slots_folded', {})
+
+    assert engine.consolidate(account_id) == 500
+    # A retry (or a concurrent fold) working from the same read matches nothing
+    for slot in engine.slots.find({'account_id': account_id}):
+        assert engine._fold(slot, stale) == 0
+    assert engine.consolidate(account_id) == 0
+
+    account = engine.accounts.find_one({'_id': account_id})
+    assert account['balance'] == 1500
+    assert account['stats']['total_transfers_in'] == 500
+    assert balance(engine) == 1500
+
+
+def test_interrupted_fold_loses_nothing(engine):
+    account_id = engine.accounts.find_one({'account_number': NUMBER})['_id']
+    engine.slots.update_one({'_id': slot_id(account_id, 0)}, {'$inc': {'balance': 500}})
+    engine.slots.update_one({'_id': slot_id(account_id, 1)}, {'$inc': {'balance': 200}})
+    calls = []
+    update_one = engine.accounts.update_one
+
+    def crash_after_first_write(*args, **kwargs):
+        if calls:
+            raise RuntimeError('worker died')
+        calls.append(args)
+        return update_one(*args, **kwargs)
+
+    engine.accounts.update_one = crash_after_first_write
+    with pytest.raises(RuntimeError):
+        engine.consolidate(account_id)
+    engine.accounts.update_one = update_one
+    assert stored_balance(engine) in (1500, 1200)
+
+    assert balance(engine) == 1700
+    engine.consolidate(account_id)
+    assert stored_balance(engine) == 1700 and balance(engine) == 1700
+
+
+def test_retired_slot_takes_no_credits(engine):
+    account_id = engine.accounts.find_one({'account_number': NUMBER})['_id']
+    engine.slots.update_many({'account_id': account_id}, {'$set': {'retired': True}})
+    change = engine.credit({'account_number': NUMBER}, 500)
+    # Falls back to the account document, still without a running balance
+    assert change.balance_after is None
+    assert stored_balance(engine) == 1500
+    assert sum(slot_balances(engine)) == 0
+
+
+def test_shrinking_then_growing_starts_slots_empty(engine):
+    engine.credit({'account_number': NUMBER}, 500)
+    assert engine.enable(NUMBER, 2) == 2
+    assert balance(engine) == 1500
+    assert engine.enable(NUMBER, 4) == 4
+    assert balance(engine) == 1500
+    engine.credit({'account_number': NUMBER}, 100)
+    assert balance(engine) == 1600
+
+
+def test_compact_and_disable_fold_every_slot(engine):
+    engine.credit({'account_number': NUMBER}, 500)
+    assert engine.compact() == 1
+    assert stored_balance(engine) == 1500
+
+    engine.credit({'account_number': NUMBER}, 200)
+    assert engine.disable(NUMBER)
+    assert stored_balance(engine) == 1700
+    assert engine.slots.count_documents({}) == 0
+    assert 'balance_slots' not in engine.accounts.find_one({'account_number': NUMBER})
+
+
+def test_async_engine_consolidates_before_debit(engine):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+
+    async def scenario():
+        client = mongomock_motor.AsyncMongoMockClient(mock_mongo_client=engine.client)
+        db = client['test']
+        async_engine = AsyncShardedBalanceEngine(client, db['accounts'], db['balance_slots'])
+        credited = await async_engine.credit({'account_number': NUMBER}, 500)
+        viewed = await async_engine.view(await db['accounts'].find_one({'account_number': NUMBER}))
+        debited = await async_engine.debit({'account_number': NUMBER}, 1200)
+        return credited, viewed, debited, async_engine.stats()
+
+    credited, viewed, debited, stats = asyncio.run(scenario())
+    assert credited.balance_after is None
+    assert viewed['balance'] == 1500
+    assert debited.balance_after is None
+    assert stored_balance(engine) == 300 and balance(engine) == 300
+    assert stats['consolidations'] == 1 and stats['slot_credits'] == 1
+
+
+def test_reconcile_checks_hot_accounts_by_balance(engine):
+    pytest.importorskip('numpy')
+    import reconcile
+
+    account_id = engine.accounts.find_one({'account_number': NUMBER})['_id']
+    ledger = engine.accounts.database['transactions']
+    now = datetime(2026, 1, 1)
+    ledger.insert_one({'account_id': account_id, 'type': 'deposit', 'amount': 1000,
+                       'balance_before': 0, 'balance_after': 1000, 'timestamp': now})
+    for i, (txn_type, amount) in enumerate([('deposit', 500), ('deposit', 300), ('withdrawal', 200)]):
+        if txn_type == 'deposit':
+            change = engine.credit({'account_number': NUMBER}, amount)
+        else:
+            change = engine.debit({'account_number': NUMBER}, amount)
+        ledger.insert_one({'account_id': account_id, 'type': txn_type, 'amount': amount,
+                           'balance_before': change.balance_before, 'balance_after': change.balance_after,
+                           'timestamp': now + timedelta(seconds=i + 1)})
+
+    result = reconcile.audit_shard(engine.accounts.database, None, None)
+    assert not any(result['counts'].values()), result['findings']
+
+    # Money missing from a slot is still found
+    engine.slots.update_one({'balance': {'$gt': 0}}, {'$inc': {'balance': -100}})
+    result = reconcile.audit_shard(engine.accounts.database, None, None)
+    assert result['counts']['balance'] == 1
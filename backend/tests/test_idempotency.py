@@ -0,0 +1,201 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+import idempotency
+from idempotency import Idempotency, MemoryIdempotencyStore, KeyReused, RequestInProgress
+
+HASH = idempotency.fingerprint('POST', '/api/transactions/deposit', b'{"amount": 10}')
+
+
+def keys(store=None, **kwargs):
+    kwargs.setdefault('wait_timeout', 1.0)
+    return Idempotency(MemoryIdempotencyStore() if store is None else store, **kwargs)
+
+
+def test_fingerprint_covers_method_path_and_body():
+    assert HASH == idempotency.fingerprint('POST', '/api/transactions/deposit', b'{"amount": 10}')
+    assert HASH != idempotency.fingerprint('POST', '/api/transactions/withdraw', b'{"amount": 10}')
+    assert HASH != idempotency.fingerprint('POST', '/api/transactions/deposit', b'{"amount": 11}')
+
+
+@pytest.mark.parametrize('status, final', [
+    (200, True), (201, True), (400, True), (404, True), (422, True),
+    (408, False), (409, False), (425, False), (429, False), (500, False), (503, False),
+])
+def test_is_final(status, final):
+    assert idempotency.is_final(status) is final
+
+
+def test_completed_response_is_replayed():
+    idem = keys()
+    assert idem.begin('u:k', HASH) is None
+    idem.complete('u:k', HASH, 200, b'{"success":true}', 'application/json')
+
+    record = idem.begin('u:k', HASH)
+    assert (record['status'], record['body'], record['content_type']) == (200, b'{"success":true}', 'application/json')
+    stats = idem.stats()
+    assert stats['executed'] == 1 and stats['replayed'] == 1 and stats['running'] == 0
+
+
+def test_replay_from_store_when_not_cached():
+    store = MemoryIdempotencyStore()
+    first = keys(store, cache_ttl=0)
+    first.begin('u:k', HASH)
+    first.complete('u:k', HASH, 400, b'{"success":false}', 'application/json')
+
+    # Another worker: nothing in its cache, the store has the response
+    record = keys(store, cache_ttl=0).begin('u:k', HASH)
+    assert record['status'] == 400
+
+
+def test_key_reused_for_another_request():
+    idem = keys()
+    idem.begin('u:k', HASH)
+    idem.complete('u:k', HASH, 200, b'{}', 'application/json')
+    with pytest.raises(KeyReused):
+        idem.begin('u:k', 'another request')
+    assert idem.stats()['conflicts'] == 1
+
+
+def test_released_key_runs_again():
+    idem = keys()
+    assert idem.begin('u:k', HASH) is None
+    idem.release('u:k')
+    assert idem.begin('u:k', HASH) is None
+    assert idem.stats()['executed'] == 2
+
+
+def test_duplicate_in_process_waits_for_the_first():
+    idem = keys()
+    assert idem.begin('u:k', HASH) is None
+    replies = []
+    waiter = threading.Thread(target=lambda: replies.append(idem.begin('u:k', HASH)))
+    waiter.start()
+    time.sleep(0.05)
+    idem.complete('u:k', HASH, 200, b'{}', 'application/json')
+    waiter.join(2)
+    assert replies[0]['status'] == 200
+    assert idem.stats()['waited'] == 1
+
+
+def test_duplicate_gives_up_after_wait_timeout():
+    idem = keys(wait_timeout=0.05)
+    idem.begin('u:k', HASH)
+    with pytest.raises(RequestInProgress):
+        idem.begin('u:k', HASH)
+    assert idem.stats()['timeouts'] == 1
+
+
+def test_duplicate_in_another_process_polls_the_store():
+    store = MemoryIdempotencyStore()
+    owner, other = keys(store), keys(store, wait_timeout=2.0)
+    owner.begin('u:k', HASH)
+    threading.Timer(0.05, owner.complete, ('u:k', HASH, 200, b'{}', 'application/json')).start()
+    assert other.begin('u:k', HASH)['status'] == 200
+
+
+def test_claim_of_dead_owner_is_taken_over_after_lease():
+    store = MemoryIdempotencyStore()
+    # A claim nobody renews any more
+    store.claim('u:k', HASH, 0.01, 60, 'dead-owner')
+    time.sleep(0.02)
+    assert keys(store, lease=0.01).begin('u:k', HASH) is None
+    assert store.get('u:k')['owner'] != 'dead-owner'
+
+
+def test_running_request_keeps_renewing_its_lease():
+    store = MemoryIdempotencyStore()
+    owner = keys(store, lease=0.06)
+    assert owner.begin('u:k', HASH) is None
+    time.sleep(0.2)
+
+    # Well past the lease, the claim is still held: no takeover
+    with pytest.raises(RequestInProgress):
+        keys(store, lease=0.06, wait_timeout=0.05).begin('u:k', HASH)
+    owner.complete('u:k', HASH, 200, b'{}', 'application/json')
+    assert keys(store).begin('u:k', HASH)['status'] == 200
+
+
+def test_only_the_owner_completes_or_releases():
+    store = MemoryIdempotencyStore()
+    store.claim('u:k', HASH, 60, 60, 'first')
+    assert store.complete('u:k', 'second', {'status': 200}) is False
+    store.release('u:k', 'second')
+    assert store.get('u:k')['state'] == idempotency.PENDING
+    assert store.complete('u:k', 'first', {'status': 200}) is True
+
+
+def test_outcome_of_a_taken_over_claim_is_not_stored():
+    store = MemoryIdempotencyStore()
+    idem = keys(store)
+    idem.begin('u:k', HASH)
+    # Another request took the key over meanwhile
+    store._data['u:k']['owner'] = 'other'
+
+    idem.complete('u:k', HASH, 200, b'{"first":true}', 'application/json')
+    assert store.get('u:k')['state'] == idempotency.PENDING
+    assert idem.stats()['lost_claims'] == 1
+    assert idem.cache.get('u:k') is idempotency._MISSING
+
+
+def test_memory_store_evicts_completed_records_only():
+    store = MemoryIdempotencyStore(maxsize=2)
+    store.claim('running', HASH, 60, 60, 'a')
+    store.claim('done', HASH, 60, 60, 'b')
+    store.complete('done', 'b', {'status': 200})
+    store.claim('new', HASH, 60, 60, 'c')
+
+    assert store.get('running') is not None
+    assert store.get('done') is None
+    assert store.get('new') is not None
+
+
+def test_mongo_store_rules():
+    mongomock = pytest.importorskip('mongomock')
+    store = idempotency.MongoIdempotencyStore(mongomock.MongoClient().db['idempotency_keys'])
+    store.init()
+    idem = keys(store, cache_ttl=0)
+
+    assert idem.begin('u:k', HASH) is None
+    idem.complete('u:k', HASH, 200, b'{}', 'application/json')
+    assert idem.begin('u:k', HASH)['status'] == 200
+    with pytest.raises(KeyReused):
+        idem.begin('u:k', 'another request')
+
+    assert idem.begin('u:other', HASH) is None
+    idem.release('u:other')
+    assert store.get('u:other') is None
+
+    assert store.claim('u:owned', HASH, 60, 60, 'first') is None
+    assert store.complete('u:owned', 'second', {'status': 200}) is False
+    assert store.renew('u:owned', 'first', 60) is True
+    assert store.complete('u:owned', 'first', {'status': 200}) is True
+
+
+def test_async_idempotency_rules():
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient().db['idempotency_keys']
+        idem = idempotency.AsyncIdempotency(idempotency.AsyncMongoIdempotencyStore(collection), wait_timeout=1.0)
+        await idem.init()
+
+        assert await idem.begin('u:k', HASH) is None
+        duplicate = asyncio.ensure_future(idem.begin('u:k', HASH))
+        await asyncio.sleep(0.05)
+        await idem.complete('u:k', HASH, 200, b'{}', 'application/json')
+        assert (await duplicate)['status'] == 200
+
+        with pytest.raises(KeyReused):
+            await idem.begin('u:k', 'another request')
+
+        assert await idem.begin('u:busy', HASH) is None
+        await idem.release('u:busy')
+        assert await idem.begin('u:busy', HASH) is None
+        return idem.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['executed'] == 3 and stats['waited'] == 1 and stats['running'] == 1
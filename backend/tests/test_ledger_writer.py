@@ -0,0 +1,123 @@
+import asyncio
+import threading
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+import ledger_writer
+from ledger_writer import LedgerWriter, AsyncLedgerWriter
+
+mongomock = pytest.importorskip('mongomock')
+
+
+class FlakyCollection:
+    """A collection whose first `failures` insert_many calls raise, optionally after writing"""
+
+    def __init__(self, collection, failures=0, write_first=False):
+        self.collection = collection
+        self.failures = failures
+        self.write_first = write_first
+        self.calls = 0
+
+    def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.calls <= self.failures:
+            if self.write_first:
+                self.collection.insert_many(docs, ordered=ordered)
+            raise AutoReconnect('connection reset')
+        return self.collection.insert_many(docs, ordered=ordered)
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db['transactions']
+
+
+@pytest.fixture(autouse=True)
+def fast_spool(monkeypatch):
+    monkeypatch.setattr(ledger_writer, 'SPOOL_RETRY_MIN', 0.01)
+
+
+def test_group_write_returns_after_the_flush(collection):
+    writer = LedgerWriter(collection)
+    ticket = writer.write({'amount': 1}, {'amount': 2})
+    assert ticket.done.is_set() and ticket.error is None
+    assert collection.count_documents({}) == 2
+    assert writer.metrics()['documents'] == 2
+
+
+def test_failed_flush_is_spooled_not_raised(collection):
+    flaky = FlakyCollection(collection, failures=1)
+    writer = LedgerWriter(flaky, max_retries=0)
+
+    ticket = writer.write({'amount': 1})
+    assert ticket.error is not None
+    assert writer.flush(timeout=2)
+    # The spool is retried on the flusher's next wake-up
+    for _ in range(100):
+        if collection.count_documents({}) == 1:
+            break
+        threading.Event().wait(0.01)
+    assert collection.count_documents({}) == 1
+    assert writer.metrics()['spooled_documents'] == 0
+
+
+def test_retry_of_a_written_batch_does_not_duplicate(collection):
+    flaky = FlakyCollection(collection, failures=1, write_first=True)
+    writer = LedgerWriter(flaky, max_retries=0)
+
+    writer.write({'amount': 1}, {'amount': 2})
+    for _ in range(100):
+        if writer.metrics()['spooled_documents'] == 0 and flaky.calls >= 2:
+            break
+        threading.Event().wait(0.01)
+    assert collection.count_documents({}) == 2
+    assert writer.metrics()['spooled_documents'] == 0
+
+
+def test_group_wait_is_bounded(collection):
+    release = threading.Event()
+
+    class SlowCollection:
+        def insert_many(self, docs, ordered=True):
+            release.wait(5)
+            return collection.insert_many(docs, ordered=ordered)
+
+    writer = LedgerWriter(SlowCollection(), wait_timeout=0.05)
+    ticket = writer.write({'amount': 1})
+    assert not ticket.done.is_set()
+    assert writer.metrics()['late_writes'] == 1
+
+    release.set()
+    assert writer.flush(timeout=2)
+    assert collection.count_documents({}) == 1
+
+
+def test_async_writer_spools_failed_inserts():
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+
+    class FlakyAsync:
+        def __init__(self, collection):
+            self.collection = collection
+            self.calls = 0
+
+        async def insert_many(self, docs, ordered=True):
+            self.calls += 1
+            if self.calls == 1:
+                raise AutoReconnect('connection reset')
+            return await self.collection.insert_many(docs, ordered=ordered)
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient().db['transactions']
+        writer = AsyncLedgerWriter(FlakyAsync(collection))
+        await writer.write({'amount': 1}, {'amount': 2})
+        assert writer.metrics()['spooled_documents'] == 2
+        for _ in range(100):
+            if not writer.metrics()['spooled_documents']:
+                break
+            await asyncio.sleep(0.01)
+        return await collection.count_documents({}), writer.metrics()
+
+    count, stats = asyncio.run(scenario())
+    assert count == 2
+    assert stats['documents'] == 2 and stats['spooled_documents'] == 0
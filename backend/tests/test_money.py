@@ -0,0 +1,37 @@
+import pytest
+
+import money
+
+
+@pytest.mark.parametrize('value, paise', [
+    (100, 10000),
+    ('100', 10000),
+    (' 12.5 ', 1250),
+    (0.1, 10),
+    ('0.07', 7),
+    (1.1, 110),
+    ('92233720368547758.07', money.INT64_MAX),
+])
+def test_parse(value, paise):
+    assert money.parse(value) == paise
+
+
+@pytest.mark.parametrize('value, message', [
+    ('abc', 'not a number'),
+    (True, 'not a number'),
+    (None, 'not a number'),
+    ('nan', 'not a number'),
+    ('inf', 'not a number'),
+    ('1.005', 'more than two decimal places'),
+    (0.001, 'more than two decimal places'),
+    ('1e30', 'too large'),
+    ('92233720368547758.08', 'too large'),
+])
+def test_parse_rejects(value, message):
+    with pytest.raises(ValueError, match=message):
+        money.parse(value)
+
+
+def test_rupees_round_trip():
+    assert money.rupees(money.parse('1234.56')) == 1234.56
+    assert money.format_rupees(123456) == 'Rs.1,234.56'
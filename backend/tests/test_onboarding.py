@@ -0,0 +1,94 @@
+import io
+import json
+
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import account_numbers
+import onboarding
+from account_numbers import AccountNumberAllocator
+from memory_storage import MemoryStorage
+
+# Cheap enough for tests; the cost is not what is being tested
+HASH_METHOD = 'pbkdf2:sha256:1000'
+HASH = generate_password_hash('Passw0rd!x', HASH_METHOD)
+
+
+@pytest.fixture
+def storage():
+    return MemoryStorage()
+
+
+def importer(storage, batch_size=onboarding.DEFAULT_BATCH_SIZE):
+    allocator = AccountNumberAllocator(
+        lambda count: storage.reserve_sequence(account_numbers.SEQUENCE_NAME, count), block_size=10
+    )
+    return onboarding.Importer(storage, allocator, HASH_METHOD, batch_size=batch_size, hash_workers=1)
+
+
+def run(storage, text, file_format='csv', batch_size=onboarding.DEFAULT_BATCH_SIZE):
+    rejected = []
+    summary = importer(storage, batch_size).run(
+        io.StringIO(text), file_format, lambda line, email, message: rejected.append((line, email, message))
+    )
+    return summary, rejected
+
+
+def test_csv_import_creates_users_with_accounts(storage):
+    text = (
+        'name,email,phone,password_hash\n'
+        f'Asha,Asha@Example.com,9876543210,{HASH}\n'
+        f'Ravi,ravi@example.com,9876543211,{HASH}\n'
+        f'Meera,meera@example.com,9876543212,{HASH}\n'
+    )
+    summary, rejected = run(storage, text, batch_size=2)
+    assert (summary['rows'], summary['created'], summary['failed']) == (3, 3, 0)
+    assert rejected == []
+
+    user = storage.find_user_by_email('asha@example.com')
+    assert user['password'] == HASH
+    account = storage.find_account_by_user(user['_id'])
+    assert account['balance'] == 0
+    assert account_numbers.is_valid(account['account_number'])
+
+
+def test_rejected_rows_are_reported_by_line(storage):
+    storage.create_user_with_account(*onboarding.customer_documents(
+        'Existing', 'taken@example.com', '9876543210', HASH, '2001999999998', None
+    ))
+    text = (
+        'name,email,phone,password_hash\n'
+        f'Asha,asha@example.com,98765,{HASH}\n'
+        f'Ravi,ravi@example.com,9876543211,{HASH}\n'
+        f'Ravi again,ravi@example.com,9876543212,{HASH}\n'
+        f'Taken,taken@example.com,9876543213,{HASH}\n'
+    )
+    summary, rejected = run(storage, text)
+    assert (summary['created'], summary['failed']) == (1, 3)
+    assert sorted(rejected) == [
+        (2, 'asha@example.com', 'Phone must be 10 digits'),
+        (4, 'ravi@example.com', 'Duplicate email in file'),
+        (5, 'taken@example.com', 'Email already registered'),
+    ]
+
+
+def test_jsonl_plaintext_passwords_are_hashed(storage):
+    rows = [
+        {'name': 'Asha', 'email': 'asha@example.com', 'phone': 9876543210, 'password': 'Passw0rd!x'},
+        'not an object',
+        {'name': 'Ravi', 'email': 'ravi@example.com', 'phone': '9876543211', 'password': 'short'},
+    ]
+    text = '\n'.join(json.dumps(row) for row in rows) + '\n\n{broken\n'
+    summary, rejected = run(storage, text, 'jsonl')
+    assert (summary['rows'], summary['created']) == (4, 1)
+    assert [line for line, _, _ in rejected] == [2, 3, 5]
+
+    user = storage.find_user_by_email('asha@example.com')
+    assert user['phone'] == '9876543210'
+    assert check_password_hash(user['password'], 'Passw0rd!x')
+
+
+def test_detect_format():
+    assert onboarding.detect_format('customers.JSONL') == 'jsonl'
+    assert onboarding.detect_format('customers.ndjson') == 'jsonl'
+    assert onboarding.detect_format('customers.csv') == 'csv'
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson.objectid import ObjectId
+
+np = pytest.importorskip('numpy')
+mongomock = pytest.importorskip('mongomock')
+
+import reconcile  # noqa: E402 (needs numpy)
+
+START = datetime(2026, 3, 1, 9, 30)
+NUMBERS = ('2001000000006', '2001000000014', '2001000000022')
+
+
+class Ledger:
+    """Accounts and rows written the way the app writes them, in paise"""
+
+    def __init__(self):
+        self.db = mongomock.MongoClient().db
+        self.ids = [ObjectId() for _ in NUMBERS]
+        self.balances = [0] * len(NUMBERS)
+        self.clock = START
+        for account_id, number in zip(self.ids, NUMBERS):
+            self.db['accounts'].insert_one({'_id': account_id, 'account_number': number, 'balance': 0})
+
+    def row(self, i, txn_type, amount, timestamp=None, **extra):
+        sign = 1 if txn_type in ('deposit', 'transfer_in') else -1
+        before = self.balances[i]
+        self.balances[i] += sign * amount
+        self.db['accounts'].update_one({'_id': self.ids[i]}, {'$set': {'balance': self.balances[i]}})
+        if timestamp is None:
+            self.clock += timedelta(minutes=1)
+            timestamp = self.clock
+        row = dict({'_id': ObjectId(), 'account_id': self.ids[i], 'type': txn_type, 'amount': amount,
+                    'balance_before': before, 'balance_after': self.balances[i], 'timestamp': timestamp},
+                   **extra)
+        self.db['transactions'].insert_one(row)
+        return row
+
+    def transfer(self, i, j, amount):
+        self.clock += timedelta(minutes=1)
+        self.row(i, 'transfer_out', amount, self.clock, to_account=NUMBERS[j])
+        self.row(j, 'transfer_in', amount, self.clock, from_account=NUMBERS[i])
+
+
+@pytest.fixture
+def ledger():
+    ledger = Ledger()
+    ledger.row(0, 'deposit', 50000)
+    ledger.row(1, 'deposit', 20000)
+    ledger.transfer(0, 1, 12500)
+    ledger.row(1, 'withdrawal', 2500)
+    ledger.transfer(1, 2, 1000)
+    return ledger
+
+
+def test_clean_ledger_has_no_findings(ledger):
+    report = reconcile.reconcile(ledger.db, shard_size=1)
+    assert report['shards'] == 3
+    assert (report['accounts'], report['transactions']) == (3, 7)
+    assert report['transfer_legs_out'] == 2
+    assert sum(report['discrepancies'].values()) == 0 and report['findings'] == []
+
+
+def test_same_instant_rows_out_of_order_are_not_a_break(ledger):
+    # Two concurrent deposits: the second one's row sorts first
+    ledger.clock += timedelta(minutes=1)
+    first = ledger.row(2, 'deposit', 300, ledger.clock)
+    second = ledger.row(2, 'deposit', 700, ledger.clock)
+    ledger.db['transactions'].delete_many({'_id': {'$in': [first['_id'], second['_id']]}})
+    ledger.db['transactions'].insert_many([dict(second, _id=first['_id']), dict(first, _id=second['_id'])])
+    report = reconcile.reconcile(ledger.db)
+    assert report['discrepancies']['chain'] == 0
+
+
+def test_each_kind_of_drift_is_reported(ledger):
+    # A credit whose row never landed
+    ledger.db['accounts'].update_one({'_id': ledger.ids[0]}, {'$inc': {'balance': 999}})
+    # A row that does not add up
+    bad = ledger.row(2, 'deposit', 400)
+    ledger.db['transactions'].update_one({'_id': bad['_id']}, {'$set': {'balance_after': bad['balance_after'] + 1}})
+    # A transfer whose incoming leg was lost
+    ledger.clock += timedelta(minutes=1)
+    lost = ledger.row(1, 'transfer_out', 100, ledger.clock, to_account=NUMBERS[2])
+    # A row for an account that does not exist
+    ledger.db['transactions'].insert_one({'_id': ObjectId(), 'account_id': ObjectId(), 'type': 'deposit',
+                                          'amount': 1, 'timestamp': START})
+
+    report = reconcile.reconcile(ledger.db, shard_size=2)
+    assert report['discrepancies'] == {'balance': 1, 'row': 1, 'chain': 0, 'transfer': 1, 'orphan': 1}
+    found = {item['check']: item for item in report['findings']}
+    assert found['balance']['account_number'] == NUMBERS[0]
+    assert (found['balance']['expected'], found['balance']['actual']) == (38499, 37500)
+    assert found['row']['transaction_id'] == str(bad['_id'])
+    assert found['transfer'] == {'check': 'transfer', 'transaction_id': str(lost['_id']), 'missing': 'transfer_in'}
+
+
+def test_chain_break_is_reported(ledger):
+    row = ledger.row(0, 'withdrawal', 500)
+    ledger.db['transactions'].update_one({'_id': row['_id']}, {'$inc': {'balance_before': 10, 'balance_after': 10}})
+    result = reconcile.audit_shard(ledger.db, None, None)
+    assert result['counts']['chain'] == 1
+    assert result['findings'][0]['transaction_id'] == str(row['_id'])
+
+
+def test_unmatched_pairs_equal_keys_one_to_one():
+    keys = np.array([5, 5, 7, 9], dtype=np.uint64)
+    other = np.array([5, 9, 9], dtype=np.uint64)
+    assert sorted(reconcile.unmatched(keys, other).tolist()) == [1, 2]
+    assert reconcile.unmatched(other, keys).tolist() == [2]
+
+
+def test_findings_are_capped_but_counted():
+    findings = reconcile.Findings(max_per_check=2)
+    for i in range(5):
+        findings.add('row', transaction_id=str(i))
+    assert findings.counts['row'] == 5 and len(findings.items) == 2
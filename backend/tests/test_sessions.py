@@ -0,0 +1,139 @@
+import asyncio
+import importlib
+
+import pytest
+
+from cache import LocalSharedStore
+from memory_storage import MemoryStorage
+from sessions import (AsyncMongoSessionStore, AsyncSessionStore, MemorySessionStore,
+                      MongoSessionStore, SessionStore, SharedSessionStore)
+
+PASSWORD = 'Passw0rd!x'
+TTL = 3600
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'memory')
+    monkeypatch.setenv('STATIC_ASSETS', 'disk')
+    module = importlib.import_module('app')
+    monkeypatch.setattr(module, 'storage', MemoryStorage())
+    store = SessionStore(MemorySessionStore(), ttl=TTL)
+    monkeypatch.setattr(module, 'session_store', store)
+    monkeypatch.setattr(module.app, 'session_interface', store)
+    return module
+
+
+def login(client):
+    response = client.post('/api/auth/login', json={'email': 'user@example.com', 'password': PASSWORD})
+    assert response.status_code == 200, response.json
+    return client
+
+
+def logged_in(client):
+    return client.get('/api/auth/check').json['logged_in']
+
+
+@pytest.fixture
+def devices(backend):
+    """Two clients signed in as the same user"""
+    phone = backend.app.test_client()
+    phone.post('/api/auth/register', json={
+        'name': 'Test User', 'email': 'user@example.com', 'phone': '9876543210', 'password': PASSWORD
+    })
+    return phone, login(backend.app.test_client())
+
+
+def test_cookie_carries_only_a_session_id(backend, devices):
+    phone, _ = devices
+    sid = phone.get_cookie(backend.app.config['SESSION_COOKIE_NAME']).value
+    data = backend.session_store.store.load(sid)
+    assert data['user_email'] == 'user@example.com' and 'account_id' in data
+    assert 'user@example.com' not in sid
+
+
+def test_another_login_gets_a_fresh_session_id(backend, devices):
+    phone, _ = devices
+    backend.app.test_client().post('/api/auth/register', json={
+        'name': 'Other User', 'email': 'other@example.com', 'phone': '9876543211', 'password': PASSWORD
+    })
+    cookie_name = backend.app.config['SESSION_COOKIE_NAME']
+    before = phone.get_cookie(cookie_name).value
+    phone.post('/api/auth/login', json={'email': 'other@example.com', 'password': PASSWORD})
+    after = phone.get_cookie(cookie_name).value
+    assert after != before
+    assert backend.session_store.store.load(before) is None
+    assert backend.session_store.store.load(after)['user_email'] == 'other@example.com'
+
+
+def test_logout_ends_only_this_session(devices):
+    phone, laptop = devices
+    phone.post('/api/auth/logout')
+    assert not logged_in(phone)
+    assert logged_in(laptop)
+
+
+def test_logout_all_ends_every_session(backend, devices):
+    phone, laptop = devices
+    assert logged_in(laptop)  # now in the load cache too
+    response = phone.post('/api/auth/logout-all')
+    assert response.status_code == 200
+    assert not logged_in(phone)
+    assert not logged_in(laptop)
+    assert len(backend.session_store.store) == 0
+    assert phone.post('/api/auth/logout-all').status_code == 401
+
+
+def test_logout_all_needs_revocable_sessions(backend, devices, monkeypatch):
+    phone, _ = devices
+    monkeypatch.setattr(backend, 'session_store', None)
+    assert phone.post('/api/auth/logout-all').status_code == 400
+
+
+def test_memory_store_expires_and_evicts():
+    store = MemorySessionStore(maxsize=2)
+    store.save('a', {'user_id': 'u1'}, -1)
+    assert store.load('a') is None
+    store.save('b', {'user_id': 'u1'}, TTL)
+    store.save('c', {'user_id': 'u2'}, TTL)
+    store.save('d', {'user_id': 'u2'}, TTL)
+    # Oldest save goes first
+    assert store.load('b') is None and len(store) == 2
+    assert sorted(store.revoke_user('u2')) == ['c', 'd']
+    assert len(store) == 0
+
+
+def test_shared_store_revokes_by_timestamp():
+    store = SharedSessionStore(LocalSharedStore(), TTL)
+    store.save('a', {'user_id': 'u1'}, TTL)
+    store.save('b', {'user_id': 'u2'}, TTL)
+    assert store.revoke_user('u1') is None
+    assert store.load('a') is None
+    # A re-save does not bring a revoked session back
+    store.save('a', {'user_id': 'u1', 'user_name': 'changed'}, TTL)
+    assert store.load('a') is None
+    assert store.load('b') == {'user_id': 'u2'}
+
+
+def test_mongo_stores_revoke_every_session_of_a_user():
+    mongomock = pytest.importorskip('mongomock')
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+
+    collection = mongomock.MongoClient().db['sessions']
+    async_collection = mongomock_motor.AsyncMongoMockClient().db['sessions']
+
+    async def scenario():
+        store = AsyncSessionStore(AsyncMongoSessionStore(async_collection), ttl=TTL)
+        first = await store.create({'user_id': 'u1'})
+        second = await store.create({'user_id': 'u1'})
+        assert first != second
+        assert await store.load(first) == {'user_id': 'u1'}
+        await store.revoke_user('u1')
+        return await store.load(first), await store.load(second)
+
+    assert asyncio.run(scenario()) == (None, None)
+
+    sync = MongoSessionStore(collection)
+    sync.save('a', {'user_id': 'u1'}, TTL)
+    assert sync.load('a') == {'user_id': 'u1'}
+    assert sync.revoke_user('u1') == ['a'] and sync.load('a') is None
@@ -0,0 +1,184 @@
+import asyncio
+import importlib
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+
+import statements
+from memory_storage import MemoryStorage
+
+OPENED = datetime(2026, 1, 5)
+NOW = datetime(2026, 4, 10)
+
+# (timestamp, type, amount) in paise
+ROWS = [
+    (datetime(2026, 1, 6), 'deposit', 10000),
+    (datetime(2026, 1, 20), 'withdrawal', 2500),
+    (datetime(2026, 2, 3), 'transfer_in', 4000),
+    (datetime(2026, 2, 27), 'transfer_out', 1500),
+]
+
+
+def ledger(account_id):
+    balance = 0
+    for timestamp, txn_type, amount in ROWS:
+        before = balance
+        balance += statements.SIGNS[txn_type] * amount
+        yield {'_id': ObjectId(), 'account_id': account_id, 'type': txn_type, 'amount': amount,
+               'balance_before': before, 'balance_after': balance, 'timestamp': timestamp}
+
+
+@pytest.fixture
+def storage():
+    storage = MemoryStorage()
+    storage.insert_account({'user_id': ObjectId(), 'account_number': '2001000000006',
+                            'balance': 0, 'created_at': OPENED})
+    return storage
+
+
+def account_id(storage):
+    return storage.find_account_by_number('2001000000006')['_id']
+
+
+def test_closed_periods_wait_for_the_close_delay():
+    assert statements.closed_periods(OPENED, NOW) == ['2026-03', '2026-02', '2026-01']
+    # Half an hour after March ended it is not closed yet
+    assert statements.closed_periods(OPENED, datetime(2026, 4, 1, 0, 30)) == ['2026-02', '2026-01']
+
+
+def test_statements_chain_and_are_stored_once(storage):
+    aid = account_id(storage)
+    storage.append_transactions(*ledger(aid))
+
+    january = statements.get_statement(storage, aid, '2026-01', OPENED, NOW)
+    february = statements.get_statement(storage, aid, '2026-02', OPENED, NOW)
+    assert (january['opening_balance'], january['closing_balance']) == (0, 7500)
+    assert (february['opening_balance'], february['closing_balance']) == (7500, 10000)
+    assert february['totals']['transfer_in'] == {'total': 4000, 'count': 1}
+    assert february['transaction_count'] == 2
+
+    # A late row does not change a stored statement
+    storage.append_transactions({'account_id': aid, 'type': 'deposit', 'amount': 1,
+                                 'balance_before': None, 'balance_after': None,
+                                 'timestamp': datetime(2026, 1, 31)})
+    assert statements.get_statement(storage, aid, '2026-01', OPENED, NOW)['closing_balance'] == 7500
+
+
+def test_rows_beyond_the_limit_are_truncated(storage):
+    aid = account_id(storage)
+    storage.append_transactions(*ledger(aid))
+    statement = statements.get_statement(storage, aid, '2026-01', OPENED, NOW, max_rows=1)
+    assert statement['rows_truncated'] and len(statement['rows']) == 1
+    assert statement['transaction_count'] == 2 and statement['closing_balance'] == 7500
+
+
+def test_serialized_statement_is_in_rupees(storage):
+    aid = account_id(storage)
+    storage.append_transactions(*ledger(aid))
+    body = statements.serialize_statement(statements.get_statement(storage, aid, '2026-01', OPENED, NOW), '2001000000006')
+    assert body['closing_balance'] == 75.0
+    assert body['rows'][0][statements.COLUMNS.index('amount')] == 100.0
+
+
+def test_async_store_builds_the_same_statement(storage):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    aid = account_id(storage)
+    rows = list(ledger(aid))
+    storage.append_transactions(*[dict(row) for row in rows])
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()['test']
+        await db['transactions'].insert_many([dict(row) for row in rows])
+        store = statements.AsyncStatementStore(db['transactions'], db['statements'])
+        # No stored January: February's opening balance is summed from the ledger
+        february = await statements.get_statement_async(store, aid, '2026-02', OPENED, NOW)
+        again = await statements.get_statement_async(store, aid, '2026-02', OPENED, NOW)
+        return february, again, await db['statements'].count_documents({})
+
+    february, again, stored = asyncio.run(scenario())
+    expected = statements.get_statement(storage, aid, '2026-02', OPENED, NOW)
+    assert february['opening_balance'] == expected['opening_balance'] == 7500
+    assert february['closing_balance'] == expected['closing_balance']
+    assert february['totals'] == expected['totals']
+    assert again['_id'] == february['_id'] and stored == 1
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'memory')
+    monkeypatch.setenv('STATIC_ASSETS', 'disk')
+    module = importlib.import_module('app')
+    monkeypatch.setattr(module, 'storage', MemoryStorage())
+    return module
+
+
+def test_statement_routes(backend):
+    client = backend.app.test_client()
+    response = client.post('/api/auth/register', json={
+        'name': 'Test User', 'email': 'user@example.com', 'phone': '9876543210', 'password': 'Passw0rd!x'
+    })
+    number = response.json['account_number']
+    # Opened in January: the months since have closed
+    backend.storage._accounts_by_number[number]['created_at'] = OPENED
+    aid = backend.storage.find_account_by_number(number)['_id']
+    backend.storage.append_transactions(*ledger(aid))
+
+    periods = client.get('/api/statements').json['periods']
+    assert periods[-1] == '2026-01'
+
+    assert client.get('/api/statements/2026-13').status_code == 400
+    assert client.get('/api/statements/2025-12').status_code == 404
+    assert client.get(f'/api/statements/{datetime.utcnow():%Y-%m}').status_code == 404
+
+    response = client.get('/api/statements/2026-01')
+    assert response.status_code == 200
+    assert response.json['statement']['closing_balance'] == 75.0
+    assert response.headers['Cache-Control'] == statements.CACHE_CONTROL
+
+    revalidated = client.get('/api/statements/2026-01', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_asgi_statement_routes(monkeypatch):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    pytest.importorskip('httpx')
+    from starlette.testclient import TestClient
+    from hot_accounts import AsyncShardedBalanceEngine
+
+    monkeypatch.setenv('STATIC_ASSETS', 'disk')
+    asgi_app = importlib.import_module('asgi_app')
+    db = mongomock_motor.AsyncMongoMockClient()['test']
+    user_id = ObjectId()
+    aid = ObjectId()
+
+    async def seed():
+        await db['accounts'].insert_one({'_id': aid, 'user_id': user_id, 'account_number': '2001000000006',
+                                         'balance': 0, 'created_at': OPENED})
+        await db['transactions'].insert_many(list(ledger(aid)))
+
+    asyncio.run(seed())
+    monkeypatch.setattr(asgi_app.state, 'sessions', None, raising=False)
+    monkeypatch.setattr(asgi_app.state, 'accounts', db['accounts'], raising=False)
+    monkeypatch.setattr(asgi_app.state, 'balance_engine',
+                        AsyncShardedBalanceEngine(None, db['accounts'], db['balance_slots']), raising=False)
+    monkeypatch.setattr(asgi_app.state, 'statements',
+                        statements.AsyncStatementStore(db['transactions'], db['statements']), raising=False)
+    monkeypatch.setattr(asgi_app.state, 'statement_close_delay', statements.DEFAULT_CLOSE_DELAY, raising=False)
+
+    # No `with`: startup (a real MongoDB) is not run
+    client = TestClient(asgi_app.app)
+    client.cookies.set(asgi_app.SESSION_COOKIE, asgi_app.session_serializer.dumps({'user_id': str(user_id)}))
+
+    assert client.get('/api/statements').json()['periods'][-1] == '2026-01'
+    assert client.get('/api/statements/2026-13').status_code == 400
+    assert client.get('/api/statements/2025-12').status_code == 404
+
+    response = client.get('/api/statements/2026-02')
+    assert response.status_code == 200
+    body = response.json()['statement']
+    assert (body['opening_balance'], body['closing_balance']) == (75.0, 100.0)
+    assert response.headers['Cache-Control'] == statements.CACHE_CONTROL
+
+    revalidated = client.get('/api/statements/2026-02', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
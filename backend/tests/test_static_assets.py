@@ -0,0 +1,110 @@
+import gzip
+
+import pytest
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+import static_assets
+from static_assets import StaticAssets, StaticMiddleware
+
+STYLE = ('body { color: #333; }\n' * 100).encode()
+SCRIPT = ('console.log("hello");\n' * 100).encode()
+PAGE = b'<link rel="stylesheet" href="css/style.css"><script src="js/app.js"></script><a href="about.html">'
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'css' / 'style.css').write_bytes(STYLE)
+    (tmp_path / 'js' / 'app.js').write_bytes(SCRIPT)
+    (tmp_path / 'index.html').write_bytes(PAGE)
+    (tmp_path / 'index.html.bak').write_bytes(b'old')
+    (tmp_path / '.hidden').write_bytes(b'secret')
+    return StaticAssets(str(tmp_path)).build()
+
+
+def not_found(environ, start_response):
+    return Response('from the app', status=404)(environ, start_response)
+
+
+def test_pages_reference_fingerprinted_names(site):
+    versioned = site.manifest['css/style.css']
+    assert versioned.startswith('css/style.') and versioned != 'css/style.css'
+    body = site.lookup('/').variants['identity'][0]
+    assert f'href="{versioned}"'.encode() in body
+    assert f'src="{site.manifest["js/app.js"]}"'.encode() in body
+    # Not CSS or JS: left alone
+    assert b'href="about.html"' in body
+    assert site.lookup('/index.html.bak') is None and site.lookup('/.hidden') is None
+
+
+def test_cache_control_and_encodings(site):
+    versioned = site.lookup(site.manifest['css/style.css'])
+    assert versioned.cache_control == static_assets.IMMUTABLE
+    assert site.lookup('/css/style.css').cache_control == static_assets.REVALIDATE
+    assert site.lookup('/').cache_control == static_assets.REVALIDATE
+
+    encoding, body, etag = versioned.select('gzip, deflate')
+    assert encoding == 'gzip' and gzip.decompress(body) == STYLE
+    assert versioned.select('gzip;q=0')[0] == 'identity'
+    assert versioned.select(None)[0] == 'identity'
+    # Too small to be worth compressing
+    assert list(site.lookup('/').variants) == ['identity']
+
+
+def test_parse_accept_encoding():
+    assert static_assets.parse_accept_encoding('gzip, br;q=0.5, *;q=0') == {'gzip': 1.0, 'br': 0.5, '*': 0.0}
+    assert static_assets.parse_accept_encoding('gzip;q=x') == {'gzip': 0.0}
+
+
+def test_wsgi_middleware_serves_and_revalidates(site):
+    client = Client(StaticMiddleware(not_found, site))
+    response = client.get('/css/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.data) == STYLE
+
+    again = client.get('/css/style.css', headers={'Accept-Encoding': 'gzip',
+                                                  'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304 and again.data == b''
+
+    # Another encoding has another ETag
+    plain = client.get('/css/style.css', headers={'If-None-Match': response.headers['ETag']})
+    assert plain.status_code == 200 and plain.data == STYLE
+
+    head = client.head('/js/app.js')
+    assert head.status_code == 200 and head.data == b''
+    assert head.headers['Content-Length'] == str(len(SCRIPT))
+
+    assert client.get('/api/anything').status_code == 404
+    assert client.post('/index.html').status_code == 404
+
+    stats = site.stats()
+    assert stats['not_modified'] == 1 and stats['gzip'] == 1 and stats['identity'] == 2
+
+
+def test_asgi_middleware(site):
+    pytest.importorskip('httpx')
+    from starlette.applications import Starlette
+    from starlette.testclient import TestClient
+
+    client = TestClient(static_assets.StaticASGIMiddleware(Starlette(), site))
+    response = client.get('/js/app.js')
+    assert response.status_code == 200
+    assert response.content == SCRIPT
+    assert response.headers['Cache-Control'] == static_assets.REVALIDATE
+
+    again = client.get('/js/app.js', headers={'If-None-Match': 'W/' + response.headers['ETag']})
+    assert again.status_code == 304
+    assert client.get('/missing.js').status_code == 404
+
+
+def test_build_writes_precompressed_siblings(site, tmp_path_factory):
+    out = tmp_path_factory.mktemp('dist')
+    assert site.write(str(out)) > 0
+    versioned = site.manifest['js/app.js']
+    assert (out / versioned).read_bytes() == SCRIPT
+    assert gzip.decompress((out / (versioned + '.gz')).read_bytes()) == SCRIPT
+    assert not (out / 'index.html.gz').exists()
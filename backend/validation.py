@@ -0,0 +1,84 @@
+# Request validation rules shared by the WSGI and ASGI handlers
+# Amounts arrive in rupees and come back as int paise (money.py).
+
+import money
+
+MAX_DEPOSIT = 1000000 * money.PAISE_PER_RUPEE
+MIN_PASSWORD_LENGTH = 6
+
+
+class ValidationError(ValueError):
+    """Request data failed validation; the message is safe to return to the client"""
+
+
+def parse_amount(data):
+    """Positive amount in paise"""
+    try:
+        amount = money.parse(data.get('amount', 0))
+    except ValueError as e:
+        raise ValidationError(f'Invalid amount ({e})')
+    if amount <= 0:
+        raise ValidationError('Amount must be positive')
+    return amount
+
+
+def validate_deposit(data):
+    amount = parse_amount(data)
+    if amount > MAX_DEPOSIT:
+        raise ValidationError('Maximum deposit amount is Rs.10,00,000')
+    return amount
+
+
+def validate_withdraw(data):
+    return parse_amount(data)
+
+
+def validate_transfer(data):
+    """Return (to_account_number, amount)"""
+    to_account_number = (data.get('to_account') or '').strip()
+    if not to_account_number:
+        raise ValidationError('Recipient account number required')
+    return to_account_number, parse_amount(data)
+
+
+def validate_registration(data):
+    """Return (name, email, phone, password)"""
+    name = (data.get('name') or data.get('full_name') or '').strip()  # Support both name and full_name
+    email = (data.get('email') or '').strip().lower()
+    phone = (data.get('phone') or '').strip()
+    password = data.get('password') or ''
+
+    if not all([name, email, phone, password]):
+        raise ValidationError('All fields are required')
+
+    if len(password) < MIN_PASSWORD_LENGTH:
+        raise ValidationError('Password must be at least 6 characters')
+
+    if len(phone) != 10 or not phone.isdigit():
+        raise ValidationError('Phone must be 10 digits')
+
+    return name, email, phone, password
+
+
+def validate_profile(data):
+    """Return (name, email, phone) for a customer imported with a password hash"""
+    name = (data.get('name') or data.get('full_name') or '').strip()
+    email = (data.get('email') or '').strip().lower()
+    phone = (data.get('phone') or '').strip()
+
+    if not all([name, email, phone]):
+        raise ValidationError('All fields are required')
+
+    if len(phone) != 10 or not phone.isdigit():
+        raise ValidationError('Phone must be 10 digits')
+
+    return name, email, phone
+
+
+def validate_login(data):
+    """Return (email, password)"""
+    email = (data.get('email') or '').strip().lower()
+    password = data.get('password') or ''
+    if not email or not password:
+        raise ValidationError('Email and password required')
+    return email, password
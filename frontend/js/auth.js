@@ -182,6 +182,28 @@ async function logout() {
     }
 }
 
+/**
+ * Logout user on every device
+ */
+async function logoutAll() {
+    try {
+        const response = await fetch(`${API_BASE_URL}/auth/logout-all`, {
+            method: 'POST',
+            credentials: 'include'
+        });
+        
+        if (response.ok) {
+            window.location.href = 'index.html';
+        } else {
+            const data = await response.json();
+            alert(data.error || 'Logout failed. Please try again.');
+        }
+    } catch (error) {
+        console.error('Logout all error:', error);
+        alert('Network error. Please try again.');
+    }
+}
+
 // ==================== SESSION CHECK ====================
 
 /**
@@ -228,4 +250,14 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     }
+
+    const logoutAllBtn = document.getElementById('logoutAllBtn');
+    if (logoutAllBtn) {
+        logoutAllBtn.addEventListener('click', function(e) {
+            e.preventDefault();
+            if (confirm('Log out on all devices?')) {
+                logoutAll();
+            }
+        });
+    }
 });
@@ -8,130 +8,104 @@
 // ==================== LOAD DASHBOARD DATA ====================
 
 /**
- * Load account information
+ * Load account info, statistics and recent transactions in one request.
+ * The browser revalidates with If-None-Match, so an unchanged dashboard
+ * costs a 304.
  */
-async function loadAccountInfo() {
+async function loadDashboard() {
     try {
-        const response = await fetch(`${API_BASE_URL}/account/info`, {
+        const response = await fetch(`${API_BASE_URL}/dashboard?limit=10`, {
             method: 'GET',
             credentials: 'include'
         });
         
         const data = await response.json();
         
-        if (response.ok && data.success) {
-            // Check if user has a banking account
-            if (!data.has_account || !data.account) {
-                // No account exists - show create account modal
-                showCreateAccountModal();
-                return null;
-            }
-            
-            const account = data.account;
-            
-            // Update account number
-            const accountNumberEl = document.getElementById('accountNumber');
-            if (accountNumberEl) {
-                accountNumberEl.textContent = account.account_number;
-            }
-            
-            // Update balance
-            const balanceEl = document.getElementById('accountBalance');
-            if (balanceEl) {
-                balanceEl.textContent = account.balance.toLocaleString('en-IN', {
-                    minimumFractionDigits: 2,
-                    maximumFractionDigits: 2
-                });
-            }
-            
-            return account;
-        } else {
-            console.error('Failed to load account info');
+        if (!response.ok || !data.success) {
+            console.error('Failed to load dashboard');
+            showTransactionsMessage('Failed to load transactions', 'text-danger');
+            return null;
+        }
+        
+        // Check if user has a banking account
+        if (!data.has_account) {
+            // No account exists - show create account modal
+            showCreateAccountModal();
             return null;
         }
+        
+        displayAccountInfo(data.account);
+        displayStatistics(data.stats);
+        displayRecentTransactions(data.recent_transactions);
+        
+        return data;
     } catch (error) {
-        console.error('Error loading account info:', error);
+        console.error('Error loading dashboard:', error);
+        showTransactionsMessage('Failed to load transactions', 'text-danger');
         return null;
     }
 }
 
 /**
- * Load statistics for dashboard
+ * Show account number and balance
  */
-async function loadStatistics() {
-    try {
-        const response = await fetch(`${API_BASE_URL}/dashboard/stats`, {
-            method: 'GET',
-            credentials: 'include'
+function displayAccountInfo(account) {
+    // Update account number
+    const accountNumberEl = document.getElementById('accountNumber');
+    if (accountNumberEl) {
+        accountNumberEl.textContent = account.account_number;
+    }
+    
+    // Update balance
+    const balanceEl = document.getElementById('accountBalance');
+    if (balanceEl) {
+        balanceEl.textContent = account.balance.toLocaleString('en-IN', {
+            minimumFractionDigits: 2,
+            maximumFractionDigits: 2
         });
-        
-        const data = await response.json();
-        
-        if (response.ok && data.success) {
-            const stats = data.stats;
-            
-            // Update deposits
-            const depositsEl = document.getElementById('totalDeposits');
-            if (depositsEl) {
-                depositsEl.textContent = stats.total_deposits.toLocaleString('en-IN', {
-                    minimumFractionDigits: 2,
-                    maximumFractionDigits: 2
-                });
-            }
-            
-            // Update withdrawals
-            const withdrawalsEl = document.getElementById('totalWithdrawals');
-            if (withdrawalsEl) {
-                withdrawalsEl.textContent = stats.total_withdrawals.toLocaleString('en-IN', {
-                    minimumFractionDigits: 2,
-                    maximumFractionDigits: 2
-                });
-            }
-            
-            // Create transaction chart
-            createTransactionChart(stats);
-            
-            return stats;
-        }
-    } catch (error) {
-        console.error('Error loading statistics:', error);
     }
 }
 
 /**
- * Load recent transactions
+ * Show statistics cards and chart
  */
-async function loadRecentTransactions() {
-    try {
-        const response = await fetch(`${API_BASE_URL}/transactions/history?limit=10`, {
-            method: 'GET',
-            credentials: 'include'
+function displayStatistics(stats) {
+    // Update deposits
+    const depositsEl = document.getElementById('totalDeposits');
+    if (depositsEl) {
+        depositsEl.textContent = stats.total_deposits.toLocaleString('en-IN', {
+            minimumFractionDigits: 2,
+            maximumFractionDigits: 2
+        });
+    }
+    
+    // Update withdrawals
+    const withdrawalsEl = document.getElementById('totalWithdrawals');
+    if (withdrawalsEl) {
+        withdrawalsEl.textContent = stats.total_withdrawals.toLocaleString('en-IN', {
+            minimumFractionDigits: 2,
+            maximumFractionDigits: 2
         });
-        
-        const data = await response.json();
-        
-        if (response.ok && data.success) {
-            displayRecentTransactions(data.transactions);
-        } else {
-            document.getElementById('recentTransactions').innerHTML = `
-                <tr>
-                    <td colspan="6" class="text-center py-4 text-muted">
-                        <i class="fas fa-inbox fa-2x mb-2 d-block"></i>
-                        No transactions yet
-                    </td>
-                </tr>
-            `;
-        }
-    } catch (error) {
-        console.error('Error loading transactions:', error);
-        document.getElementById('recentTransactions').innerHTML = `
-            <tr>
-                <td colspan="6" class="text-center py-4 text-danger">
-                    Failed to load transactions
-                </td>
-            </tr>
-        `;
     }
+    
+    // Create transaction chart
+    createTransactionChart(stats);
+}
+
+/**
+ * Show a single message row in the transactions table
+ */
+function showTransactionsMessage(message, className) {
+    const tbody = document.getElementById('recentTransactions');
+    if (!tbody) return;
+    
+    tbody.innerHTML = `
+        <tr>
+            <td colspan="6" class="text-center py-4 ${className}">
+                ${message}
+            </td>
+        </tr>
+    `;
 }
 
 /**
@@ -200,7 +174,7 @@ function displayRecentTransactions(transactions) {
                 <td class="${typeClass} fw-bold">
                     ${amountPrefix}₹${txn.amount.toLocaleString('en-IN', {minimumFractionDigits: 2, maximumFractionDigits: 2})}
                 </td>
-                <td>₹${txn.balance_after.toLocaleString('en-IN', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</td>
+                <td>${txn.balance_after == null ? '—' : '₹' + txn.balance_after.toLocaleString('en-IN', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</td>
                 <td><code class="small">${txn.reference}</code></td>
             </tr>
         `;
@@ -209,6 +183,8 @@ function displayRecentTransactions(transactions) {
 
 // ==================== CREATE TRANSACTION CHART ====================
 
+let transactionChart = null;
+
 /**
  * Create Chart.js transaction overview chart
  */
@@ -218,7 +194,12 @@ function createTransactionChart(stats) {
     
     const ctx = canvas.getContext('2d');
     
-    new Chart(ctx, {
+    // Replace the chart when the dashboard is refreshed
+    if (transactionChart) {
+        transactionChart.destroy();
+    }
+    
+    transactionChart = new Chart(ctx, {
         type: 'doughnut',
         data: {
             labels: ['Deposits', 'Withdrawals', 'Transfers Out', 'Transfers In'],
@@ -350,14 +331,8 @@ document.addEventListener('DOMContentLoaded', async function() {
         userName.textContent = authData.user.name.split(' ')[0];
     }
     
-    // Load account info
-    const account = await loadAccountInfo();
-    
-    if (account) {
-        // Load statistics and transactions if account exists
-        await loadStatistics();
-        await loadRecentTransactions();
-    }
+    // Load account info, statistics and recent transactions
+    await loadDashboard();
     
     // Create account form handler
     const createAccountForm = document.getElementById('createAccountForm');
@@ -5,6 +5,31 @@
 
 // API_BASE_URL is defined in auth.js
 
+// ==================== IDEMPOTENCY KEYS ====================
+
+/**
+ * One Idempotency-Key per submitted operation. Resubmitting the same form
+ * after a network error reuses it, so the server moves the money at most once.
+ */
+const pendingKeys = {};
+
+function idempotencyKey(operation, payload) {
+    const fingerprint = JSON.stringify(payload);
+    const pending = pendingKeys[operation];
+    if (pending && pending.fingerprint === fingerprint) {
+        return pending.key;
+    }
+    const key = window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    pendingKeys[operation] = { key, fingerprint };
+    return key;
+}
+
+function clearIdempotencyKey(operation) {
+    delete pendingKeys[operation];
+}
+
 // ==================== LOAD CURRENT BALANCE ====================
 
 /**
@@ -63,18 +88,21 @@ async function deposit() {
     depositBtn.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Processing...';
     
     try {
+        const payload = {
+            amount: amount,
+            description: description
+        };
         const response = await fetch(`${API_BASE_URL}/transactions/deposit`, {
             method: 'POST',
             credentials: 'include',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Idempotency-Key': idempotencyKey('deposit', payload)
             },
-            credentials: 'include',
-            body: JSON.stringify({
-                amount: amount,
-                description: description
-            })
+            body: JSON.stringify(payload)
         });
+        // The server answered; the next submission is a new operation
+        clearIdempotencyKey('deposit');
         
         const data = await response.json();
         
@@ -131,18 +159,21 @@ async function withdraw() {
     withdrawBtn.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Processing...';
     
     try {
+        const payload = {
+            amount: amount,
+            description: description
+        };
         const response = await fetch(`${API_BASE_URL}/transactions/withdraw`, {
             method: 'POST',
             credentials: 'include',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Idempotency-Key': idempotencyKey('withdraw', payload)
             },
-            credentials: 'include',
-            body: JSON.stringify({
-                amount: amount,
-                description: description
-            })
+            body: JSON.stringify(payload)
         });
+        // The server answered; the next submission is a new operation
+        clearIdempotencyKey('withdraw');
         
         const data = await response.json();
         
@@ -206,19 +237,22 @@ async function transfer() {
     transferBtn.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Processing...';
     
     try {
+        const payload = {
+            to_account: toAccount,
+            amount: amount,
+            description: description
+        };
         const response = await fetch(`${API_BASE_URL}/transactions/transfer`, {
             method: 'POST',
             credentials: 'include',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Idempotency-Key': idempotencyKey('transfer', payload)
             },
-            credentials: 'include',
-            body: JSON.stringify({
-                to_account: toAccount,
-                amount: amount,
-                description: description
-            })
+            body: JSON.stringify(payload)
         });
+        // The server answered; the next submission is a new operation
+        clearIdempotencyKey('transfer');
         
         const data = await response.json();
         
@@ -330,7 +364,7 @@ async function loadTransactionHistory() {
 function updateTransactionSummary(transactions) {
     let totalDeposits = 0;
     let totalWithdrawals = 0;
-    let currentBalance = 0;
+    let currentBalance = null;
     
     transactions.forEach(txn => {
         if (txn.type === 'deposit' || txn.type === 'transfer_in') {
@@ -368,7 +402,8 @@ function updateTransactionSummary(transactions) {
     }
     
     const currentBalanceEl = document.getElementById('currentBalance');
-    if (currentBalanceEl) {
+    // Hot accounts' rows carry no running balance; keep the one already shown
+    if (currentBalanceEl && currentBalance != null) {
         currentBalanceEl.textContent = currentBalance.toLocaleString('en-IN', {
             minimumFractionDigits: 2,
             maximumFractionDigits: 2